@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from telegram import Update
+
+from decodificador import TIPOS_ATENDIDOS
+from envios import Cubeta
+from metricas import metricas
+
+# Control de flood antes de la conversación: un usuario que aprieta el
+# teclado sin parar o un script que repite "pagar" no llega a los handlers
+# ni gasta envíos del Bot API que necesitan los demás.
+# - se revisa al llegar, no al procesar: en el webhook antes de encolar
+#   (la cola atiende un update por chat a la vez y un spammer vería su
+#   cubeta rellenarse mientras espera) y en polling al entrar a la
+#   update_queue (ColaFrenada). Lo frenado no carga estado, no se despacha
+#   ni ocupa la cola
+# - token bucket por usuario (envios.Cubeta, la misma de los envíos):
+#   FLOOD_RAFAGA mensajes seguidos y después FLOOD_POR_SEGUNDO; y uno global
+#   para todos los usuarios
+# - el mismo texto repetido antes de FLOOD_REPETIDO segundos se descarta sin
+#   gastar fichas (doble toque en un botón)
+# - al quedarse sin fichas el usuario recibe un solo aviso; lo que siga se
+#   descarta en silencio hasta que vuelva a pasar un mensaje
+# - lo frenado por el límite global es tráfico legítimo: el webhook no lo
+#   confirma (503 con Retry-After, como con la cola llena) y Telegram lo
+#   vuelve a entregar
+# - una cubeta que ya se rellenó es igual a una nueva y se borra. Están
+#   ordenadas por último uso: solo se revisan las menos recientes (O(1)
+#   amortizado por update) y nunca hay más de FLOOD_MAX_USUARIOS
+FLOOD_CONTROL = os.getenv("FLOOD_CONTROL", "1") == "1"
+FLOOD_RAFAGA = int(os.getenv("FLOOD_RAFAGA", 5))
+FLOOD_POR_SEGUNDO = float(os.getenv("FLOOD_POR_SEGUNDO", 1))
+FLOOD_REPETIDO = float(os.getenv("FLOOD_REPETIDO", 1))
+FLOOD_GLOBAL_RAFAGA = int(os.getenv("FLOOD_GLOBAL_RAFAGA", 100))
+FLOOD_GLOBAL_POR_SEGUNDO = float(os.getenv("FLOOD_GLOBAL_POR_SEGUNDO", 50))
+FLOOD_MAX_USUARIOS = int(os.getenv("FLOOD_MAX_USUARIOS", 50000))
+
+# Motivos (etiqueta de aguas_updates_frenados_total)
+REPETIDO = "repetido"
+AVISO = "aviso"
+USUARIO = "usuario"
+GLOBAL = "global"
+
+TEXTO_AVISO = "⏳ Vas muy rápido. Espera unos segundos y vuelve a intentarlo."
+
+class CubetaUsuario(Cubeta):
+    """Cubeta de un usuario, con lo necesario para juntar repetidos y avisar una vez"""
+
+    __slots__ = ("texto", "visto", "avisado")
+
+    def __init__(self, por_segundo, rafaga, ahora):
+        super().__init__(por_segundo, rafaga)
+        self.texto = None       # último texto recibido y cuándo
+        self.visto = ahora
+        self.avisado = False
+
+class Freno:
+    def __init__(self, rafaga=FLOOD_RAFAGA, por_segundo=FLOOD_POR_SEGUNDO, repetido=FLOOD_REPETIDO,
+                 global_rafaga=FLOOD_GLOBAL_RAFAGA, global_por_segundo=FLOOD_GLOBAL_POR_SEGUNDO,
+                 max_usuarios=FLOOD_MAX_USUARIOS):
+        self.rafaga = rafaga
+        self.por_segundo = por_segundo
+        self.repetido = repetido
+        self.max_usuarios = max_usuarios
+        self.cubetas = OrderedDict()    # user_id -> CubetaUsuario, de la menos a la más reciente
+        self.global_ = Cubeta(global_por_segundo, global_rafaga)
+
+    def revisar(self, user_id, texto, ahora=None):
+        """None si el mensaje pasa; si no, el motivo por el que se frena"""
+        if ahora is None:
+            ahora = time.monotonic()
+        cubetas = self.cubetas
+        self._podar(ahora)
+
+        cubeta = cubetas.get(user_id)
+        if cubeta is None:
+            cubeta = cubetas[user_id] = CubetaUsuario(self.por_segundo, self.rafaga, ahora)
+        else:
+            cubetas.move_to_end(user_id)
+            if texto is not None and texto == cubeta.texto and ahora - cubeta.visto < self.repetido:
+                cubeta.visto = ahora
+                return REPETIDO
+        cubeta.texto, cubeta.visto = texto, ahora
+
+        if not cubeta.tomar(ahora):
+            if cubeta.avisado:
+                return USUARIO
+            cubeta.avisado = True
+            return AVISO
+        if not self.global_.tomar(ahora):
+            # El turno del usuario se devuelve: no es culpa suya, y el
+            # reintento del mismo texto no cuenta como repetido
+            cubeta.turno -= cubeta.intervalo
+            cubeta.texto = None
+            return GLOBAL
+        cubeta.avisado = False
+        return None
+
+    def frenar(self, user_id, texto):
+        """revisar() con la hora actual, contando lo frenado en las métricas"""
+        motivo = self.revisar(user_id, texto)
+        if motivo is not None:
+            frenados = metricas.frenados
+            frenados[motivo] = frenados.get(motivo, 0) + 1
+        return motivo
+
+    def _podar(self, ahora):
+        """Borrar las cubetas llenas de los usuarios menos recientes"""
+        cubetas = self.cubetas
+        while cubetas:
+            user_id = next(iter(cubetas))
+            cubeta = cubetas[user_id]
+            if len(cubetas) < self.max_usuarios and (
+                cubeta.turno > ahora or ahora - cubeta.visto < self.repetido
+            ):
+                break
+            del cubetas[user_id]
+
+def revisar_entrante(freno, datos, texto):
+    """Motivo por el que se frena un update del webhook (JSON ya decodificado), o None"""
+    for tipo in TIPOS_ATENDIDOS:
+        mensaje = datos.get(tipo)
+        if mensaje is not None:
+            break
+    else:
+        return None
+    remitente = mensaje.get("from")
+    if remitente is None:
+        return None
+    return freno.frenar(remitente["id"], texto)
+
+def aviso(chat_id):
+    """El aviso como respuesta directa al webhook (ver respuesta_directa.py)"""
+    return {"method": "sendMessage", "chat_id": chat_id, "text": TEXTO_AVISO}
+
+_avisos = set()
+
+def avisar(bot, chat_id):
+    """Enviar el aviso sin demorar la respuesta al webhook"""
+    _en_segundo_plano(bot.send_message(chat_id, TEXTO_AVISO))
+
+def _en_segundo_plano(corrutina):
+    tarea = asyncio.ensure_future(corrutina)
+    _avisos.add(tarea)
+    tarea.add_done_callback(_avisos.discard)
+
+class ColaFrenada(asyncio.Queue):
+    """update_queue de la Application en polling: lo frenado no entra"""
+
+    def __init__(self, freno):
+        super().__init__()
+        self.freno = freno
+
+    async def put(self, update):
+        if isinstance(update, Update) and update.effective_user is not None:
+            mensaje = update.effective_message
+            motivo = self.freno.frenar(update.effective_user.id,
+                                       mensaje.text if mensaje is not None else None)
+            if motivo is not None:
+                if motivo == AVISO and mensaje is not None:
+                    _en_segundo_plano(mensaje.reply_text(TEXTO_AVISO))
+                return
+        await super().put(update)
+
+_freno = None
+
+def obtener_freno():
+    """El Freno del proceso, o None con FLOOD_CONTROL=0"""
+    global _freno
+    if _freno is None and FLOOD_CONTROL:
+        _freno = Freno()
+    return _freno
@@ -0,0 +1,52 @@
+import os
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Base de datos local compartida por los almacenes del bot (pedidos, ...).
+# SQLite en modo WAL: varios procesos pueden leer mientras uno escribe.
+DB_PATH = os.getenv("DB_PATH", "aguas.db")
+
+_conexiones = {}
+
+class BaseSQLite:
+    """Conexión SQLite con un hilo dedicado para no bloquear el event loop"""
+
+    def __init__(self, ruta=DB_PATH):
+        self.ruta = ruta
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        # Autocommit: cada escritura que necesite atomicidad abre su propia
+        # transacción. Las sentencias se compilan una vez y quedan en caché.
+        self.conexion = sqlite3.connect(
+            ruta, check_same_thread=False, isolation_level=None, cached_statements=256
+        )
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("PRAGMA busy_timeout=5000")
+
+    async def ejecutar(self, funcion, *args):
+        """Ejecutar funcion(conexion, *args) en el hilo de la base de datos"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, funcion, self.conexion, *args)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+        self.conexion.close()
+
+@contextmanager
+def transaccion(conexion, modo="IMMEDIATE"):
+    """BEGIN/COMMIT explícitos (la conexión está en autocommit)"""
+    conexion.execute(f"BEGIN {modo}")
+    try:
+        yield conexion
+    except BaseException:
+        conexion.execute("ROLLBACK")
+        raise
+    conexion.execute("COMMIT")
+
+def obtener_base(ruta=DB_PATH):
+    """Una conexión por archivo y proceso"""
+    if ruta not in _conexiones:
+        _conexiones[ruta] = BaseSQLite(ruta)
+    return _conexiones[ruta]
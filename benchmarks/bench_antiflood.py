@@ -0,0 +1,199 @@
+"""Control de flood: costo por update, memoria de las cubetas y efecto de un spammer.
+
+Uso: python benchmarks/bench_antiflood.py [--updates 1000000] [--usuarios 50000] [--normales 20] [--spammers 3] [--spam-por-segundo 40]
+
+1. antiflood.Freno.revisar() con --updates mensajes de --usuarios usuarios
+   (la mitad, de 10 que escriben sin parar) a 5000 updates/s simulados: ns por update,
+   cubetas residentes y cuántas quedan tras un rato sin mensajes
+2. La Application de bot.py en este proceso detrás de lo mismo que hace el
+   webhook de server_async.py (control de flood y cola.ColaActualizaciones),
+   con el limitador de envíos como en producción, contra el stub del Bot API: --normales usuarios hacen una
+   compra (un mensaje por segundo) mientras --spammers usuarios mandan
+   --spam-por-segundo mensajes por segundo ("pagar" y botones al azar). Con
+   y sin control de flood: envíos para los spammers, handlers despachados,
+   updates encolados y espera en la cola, y latencia y compras de los usuarios
+   normales
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from comun import (
+    METODOS_PAGO, actualizacion, entorno_bot, flujo_compra, percentil, puerto_libre
+)
+
+# --- Costo de revisar() ---
+
+def costo_revisar(updates, usuarios):
+    from antiflood import Freno, REPETIDO, AVISO, USUARIO, GLOBAL
+
+    aleatorio = random.Random(1)
+    # La mitad de los mensajes son de 10 usuarios que escriben sin parar
+    quienes = [
+        aleatorio.randrange(10) if aleatorio.random() < 0.5 else aleatorio.randrange(10, usuarios)
+        for _ in range(updates)
+    ]
+    textos = [aleatorio.choice(("pagar", "💧 Comprar Agua", "3", "🔙 Menú Principal")) for _ in range(updates)]
+    freno = Freno(global_por_segundo=10 ** 6, global_rafaga=10 ** 6)
+    motivos = dict.fromkeys((None, REPETIDO, AVISO, USUARIO, GLOBAL), 0)
+    maximo = 0
+    ahora = 1000.0
+    inicio = time.perf_counter()
+    for i in range(updates):
+        motivos[freno.revisar(quienes[i], textos[i], ahora + i / 5000)] += 1
+        if i % 1000 == 0:
+            maximo = max(maximo, len(freno.cubetas))
+    duracion = time.perf_counter() - inicio
+    residentes = len(freno.cubetas)
+    # Un rato después, el próximo mensaje borra las cubetas que ya se llenaron
+    freno.revisar(0, "hola", ahora + updates / 5000 + 60)
+
+    print(f"revisar(): {duracion / updates * 1e9:.0f} ns/update ({updates} updates de "
+          f"{len(set(quienes))} usuarios)")
+    print(f"  pasaron {motivos[None]}, repetidos {motivos[REPETIDO]}, avisos {motivos[AVISO]}, "
+          f"frenados {motivos[USUARIO]}")
+    print(f"  cubetas: máx {maximo}, al final {residentes}, tras 60 s sin mensajes {len(freno.cubetas)}")
+
+# --- Spammer contra la Application ---
+
+BOTONES = ["/start", "pagar", "💧 Comprar Agua", "🎯 Promociones", "🔙 Menú Principal", "🕐 Horarios", "3"]
+
+async def escenario(con_freno, productos, args, directorio, base_chat):
+    import bot
+    import stub_bot_api
+    from antiflood import AVISO, GLOBAL, Freno, avisar, revisar_entrante
+    from basedatos import BaseSQLite
+    from cola import ColaActualizaciones
+    from metricas import metricas
+    from persistencia import PersistenciaSQLite
+
+    # Una base por escenario
+    bot._persistencia = PersistenciaSQLite(BaseSQLite(os.path.join(directorio, f"flood{base_chat}.db")))
+    app = bot.construir_aplicacion()
+    bot.registrar_handlers(app)
+    await app.initialize()
+    await app.start()
+    # Como el webhook de server_async.py: control de flood y cola acotada, en orden por chat
+    cola = ColaActualizaciones(app)
+    await cola.iniciar()
+    freno = Freno() if con_freno else None
+
+    despachados_antes = sum(h.total for h in metricas.handlers.values())
+    # Mismos usuarios y tiempos en los dos escenarios
+    aleatorio = random.Random(1)
+    update_id = base_chat * 100
+    latencias = []
+    conversaciones = stub_bot_api.conversaciones
+
+    def recibir(chat, texto):
+        """Lo que hace el webhook con un update; False si respondería 503 (cola llena o
+        límite global)"""
+        nonlocal update_id
+        update_id += 1
+        datos = actualizacion(update_id, chat, texto)
+        if freno is not None:
+            motivo = revisar_entrante(freno, datos, texto)
+            if motivo == GLOBAL:
+                return False
+            if motivo is not None:
+                if motivo == AVISO:
+                    avisar(app.bot, chat)
+                return True
+        return cola.encolar(datos, chat_id=chat)
+
+    async def normal(chat):
+        textos = flujo_compra(chat, aleatorio.choice(productos), aleatorio.randint(1, 24),
+                              aleatorio.choice(METODOS_PAGO))
+        # Cada uno empieza en un momento distinto
+        await asyncio.sleep(aleatorio.random() * args.pausa)
+        for texto in textos:
+            inicio = time.perf_counter()
+            previas = len(conversaciones.get(str(chat), ()))
+            # Con la cola llena (503) Telegram reintenta
+            while not recibir(chat, texto):
+                await asyncio.sleep(0.5)
+            while len(conversaciones.get(str(chat), ())) == previas:
+                if time.perf_counter() - inicio > args.timeout:
+                    return
+                await asyncio.sleep(0.005)
+            latencias.append(time.perf_counter() - inicio)
+            await asyncio.sleep(max(0.0, args.pausa - (time.perf_counter() - inicio)))
+
+    enviados_spam = 0
+    activo = True
+
+    async def spammer(chat):
+        nonlocal enviados_spam
+        recibir(chat, "/start")
+        while activo:
+            recibir(chat, aleatorio.choice(BOTONES))
+            enviados_spam += 1
+            await asyncio.sleep(1 / args.spam_por_segundo)
+
+    normales = [base_chat + i for i in range(args.normales)]
+    spammers = [base_chat + 50000 + i for i in range(args.spammers)]
+    tareas_spam = [asyncio.create_task(spammer(chat)) for chat in spammers]
+    inicio = time.perf_counter()
+    await asyncio.gather(*(normal(chat) for chat in normales))
+    duracion = time.perf_counter() - inicio
+    activo = False
+    await asyncio.gather(*tareas_spam)
+    # Lo que sigue en la cola ya no se mide
+    estado = cola.metricas()
+    await cola.detener()
+    despachados = sum(h.total for h in metricas.handlers.values()) - despachados_antes
+
+    envios_spam = sum(len(conversaciones.get(str(chat), ())) for chat in spammers)
+    confirmadas = sum(
+        any("PEDIDO CONFIRMADO" in t for t in conversaciones.get(str(chat), ())) for chat in normales
+    )
+    await app.stop()
+    await app.shutdown()
+
+    nombre = "con control de flood" if con_freno else "sin control de flood"
+    encolados = estado["procesadas"] + estado["en_proceso"] + estado["profundidad"]
+    print(f"{nombre:<22} spam: {enviados_spam} mensajes, {envios_spam} envíos a spammers; "
+          f"{despachados} handlers despachados en total")
+    print(f"{'':<22} cola: {encolados} encolados, {estado['profundidad']} en espera al final, "
+          f"{estado['rechazadas']} rechazados (503), espera máx {estado['espera_max_ms']:.0f} ms")
+    print(f"{'':<22} normales: {confirmadas}/{len(normales)} compras en {duracion:.1f} s, "
+          f"p50 {percentil(latencias, 50) * 1000:.1f} ms, p99 {percentil(latencias, 99) * 1000:.1f} ms")
+
+async def con_spammers(productos, args, directorio, stub_port):
+    from tornado.httpserver import HTTPServer
+    import stub_bot_api
+
+    HTTPServer(stub_bot_api.crear_stub(args.latencia_api)).listen(stub_port, address="127.0.0.1")
+    await escenario(False, productos, args, directorio, 100000)
+    await escenario(True, productos, args, directorio, 200000)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=50000)
+    parser.add_argument("--normales", type=int, default=20)
+    parser.add_argument("--spammers", type=int, default=3)
+    parser.add_argument("--spam-por-segundo", type=float, default=40)
+    parser.add_argument("--pausa", type=float, default=1.0, help="segundos entre mensajes de un usuario normal")
+    parser.add_argument("--latencia-api", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=30.0, help="segundos para esperar cada respuesta")
+    args = parser.parse_args()
+
+    costo_revisar(args.updates, args.usuarios)
+
+    from bench_flujos import preparar_entorno
+    with tempfile.TemporaryDirectory() as tmp:
+        productos, entorno = preparar_entorno(tmp)
+        stub_port = puerto_libre()
+        os.environ.update(entorno_bot(stub_port, 0), **entorno)
+        # Limitador de envíos como en producción
+        os.environ["ENVIOS_LIMITADOR"] = "1"
+        print(f"\n{args.normales} usuarios normales, {args.spammers} spammers a "
+              f"{args.spam_por_segundo:.0f} mensajes/s, Bot API con {args.latencia_api * 1000:.0f} ms")
+        asyncio.run(con_spammers(productos, args, tmp, stub_port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Arranque en frío: tiempo de import (-X importtime) y hasta la primera respuesta.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones 5] [--latencia-api 0.1] [--presupuesto-ms 0]
+
+Corre sobre una copia del bot en un directorio temporal, dos veces: sin
+.pyc (como en Render, donde lo escrito en tiempo de ejecución no sobrevive a
+que el servicio se duerma) y precompilada con compileall (en el build).
+
+1. `python -X importtime -c "import <servidor>"`: total y los módulos de
+   primer nivel que más pesan (el "propio" del servidor incluye armar la
+   Application)
+2. Para server.py y server_async.py: lanzar el proceso, enviar /start apenas
+   abre el puerto y medir cuándo le llega el primer sendMessage al stub del
+   Bot API, que responde con --latencia-api (como getMe contra Telegram)
+
+Con --presupuesto-ms > 0 termina con error si la mediana hasta la primera
+respuesta de algún servidor (precompilado) lo supera (prueba de regresión).
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import socket
+import compileall
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+import httpx
+
+from comun import RAIZ, TOKEN_PRUEBA, actualizacion, entorno_bot, lanzar, puerto_libre
+
+SERVIDORES = (("Flask (server.py)", "server"), ("Tornado (server_async.py)", "server_async"))
+
+def copiar_bot(destino):
+    """Copia del bot sin __pycache__"""
+    for ruta in glob.glob(os.path.join(RAIZ, "*.py")) + [os.path.join(RAIZ, "productos.json")]:
+        shutil.copy(ruta, destino)
+
+def importtime(modulo, env, directorio):
+    """{nombre: (propio, acumulado, nivel)} en µs según -X importtime"""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=directorio, env=env, capture_output=True, text=True,
+    ).stderr
+    modulos = {}
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        _, propio, acumulado, nombre = (campo for campo in linea.replace("import time:", "|").split("|"))
+        espacios = len(nombre) - len(nombre.lstrip())
+        modulos[nombre.strip()] = (int(propio), int(acumulado), (espacios - 1) // 2)
+    return modulos
+
+def informe_importtime(nombre, modulo, env, directorio, top=8):
+    modulos = importtime(modulo, env, directorio)
+    propio, total, _ = modulos[modulo]
+    primer_nivel = sorted(
+        ((acumulado, m) for m, (_, acumulado, nivel) in modulos.items() if nivel == 1),
+        reverse=True,
+    )
+    print(f"{nombre:<26} import {total / 1000:>4.0f} ms (propio {propio / 1000:.0f} ms)")
+    print("      " + ", ".join(f"{m} {acumulado / 1000:.0f}" for acumulado, m in primer_nivel[:top]))
+
+def esperar_puerto(port, inicio, timeout=30.0):
+    while time.time() - inicio < timeout:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return time.time()
+        except OSError:
+            time.sleep(0.002)
+    raise RuntimeError(f"El puerto {port} no respondió en {timeout}s")
+
+def primera_respuesta(script, env, directorio, stub_port, chat_id):
+    """(puerto abierto, primera respuesta) en segundos desde que se lanza el proceso"""
+    port = puerto_libre()
+    env = dict(env, PORT=str(port))
+    inicio = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, script], cwd=directorio, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        abierto = esperar_puerto(port, inicio)
+        httpx.post(f"http://127.0.0.1:{port}/{TOKEN_PRUEBA}",
+                   json=actualizacion(chat_id, chat_id, "/start"), timeout=30)
+        while True:
+            llegada = httpx.get(f"http://127.0.0.1:{stub_port}/llegadas").json().get(str(chat_id))
+            if llegada is not None:
+                return abierto - inicio, llegada - inicio
+            if time.time() - inicio > 30:
+                raise RuntimeError(f"{script} no respondió el /start")
+            time.sleep(0.002)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--latencia-api", type=float, default=0.1)
+    parser.add_argument("--presupuesto-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    stub_port = puerto_libre()
+    stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port),
+                   "--latencia", str(args.latencia_api)], stub_port)
+    excedidos = []
+    chat_id = 1000
+    try:
+        for precompilado in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                copiar_bot(tmp)
+                env = dict(os.environ, PYTHONUNBUFFERED="1", DB_PATH=os.path.join(tmp, "arranque.db"),
+                           **entorno_bot(stub_port, 0))
+                if precompilado:
+                    compileall.compile_dir(tmp, quiet=1)
+                    print(f"\n== Precompilado (compileall), Bot API con {args.latencia_api * 1000:.0f} ms, "
+                          f"mediana de {args.repeticiones}")
+                else:
+                    env["PYTHONDONTWRITEBYTECODE"] = "1"
+                    print(f"== Sin .pyc, Bot API con {args.latencia_api * 1000:.0f} ms, "
+                          f"mediana de {args.repeticiones}")
+
+                for nombre, modulo in SERVIDORES:
+                    informe_importtime(nombre, modulo, env, tmp)
+                    puertos, respuestas = [], []
+                    for _ in range(args.repeticiones):
+                        chat_id += 1
+                        abierto, respuesta = primera_respuesta(f"{modulo}.py", env, tmp, stub_port, chat_id)
+                        puertos.append(abierto)
+                        respuestas.append(respuesta)
+                    mediana = statistics.median(respuestas) * 1000
+                    print(f"      puerto abierto {statistics.median(puertos) * 1000:>4.0f} ms "
+                          f"(mín {min(puertos) * 1000:.0f})   "
+                          f"primera respuesta {mediana:>4.0f} ms (mín {min(respuestas) * 1000:.0f})")
+                    if precompilado and args.presupuesto_ms and mediana > args.presupuesto_ms:
+                        excedidos.append(nombre)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if excedidos:
+        print(f"\n❌ Sobre el presupuesto de {args.presupuesto_ms:.0f} ms: {', '.join(excedidos)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Carrito: lista de ítems con float y resumen con += vs. carrito.py.
+
+Uso: python benchmarks/bench_carrito.py [--agregados 2000] [--productos 50] [--repeticiones 20]
+
+Arma carritos grandes (--agregados veces "agregar producto" sobre
+--productos productos distintos, con precios de centavos) como lo hacía
+handle_cantidad, y mide agregar (con el JSON que la persistencia guarda tras
+cada agregado) y armar el resumen de handle_metodo_pago. También muestra la
+diferencia del total en float contra el exacto en centavos.
+"""
+import json
+import time
+import random
+import argparse
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+from carrito import Carrito, a_centavos, formato
+
+def productos_sinteticos(n):
+    aleatorio = random.Random(1)
+    productos = [{"id": "2", "nombre": "Agua Mineral 600ml", "precio": 15.0}]
+    productos += [
+        {"id": str(100 + i), "nombre": f"Agua Sabor {i} 1L", "precio": aleatorio.randint(500, 4999) / 100}
+        for i in range(n - 1)
+    ]
+    return productos
+
+def agregados(productos, n):
+    aleatorio = random.Random(2)
+    return [(aleatorio.choice(productos), aleatorio.randint(1, 24)) for _ in range(n)]
+
+def anterior(pasos):
+    """Como era: una línea por agregado, total con float, resumen con +="""
+    carrito = {"productos": [], "total": 0.0}
+    guardado = 0
+    for producto, cantidad in pasos:
+        item = {
+            "producto_id": producto["id"],
+            "nombre": producto["nombre"],
+            "precio_unitario": producto["precio"],
+            "cantidad": cantidad,
+            "subtotal": producto["precio"] * cantidad,
+        }
+        carrito["productos"].append(item)
+        carrito["total"] += item["subtotal"]
+        guardado += len(json.dumps(carrito))
+
+    resumen = "🛒 **RESUMEN DE TU PEDIDO**\n\n"
+    for item in carrito["productos"]:
+        resumen += f"• {item['cantidad']}x {item['nombre']} - ${item['subtotal']:.2f}\n"
+    resumen += f"\n💰 **Total: ${carrito['total']:.2f}**\n"
+    return carrito["total"], resumen, guardado
+
+def nuevo(pasos):
+    carrito = Carrito()
+    guardado = 0
+    for producto, cantidad in pasos:
+        carrito.agregar_producto(producto, cantidad)
+        guardado += len(json.dumps(carrito.a_dict()))
+    resumen = "".join((
+        "🛒 **RESUMEN DE TU PEDIDO**\n\n",
+        *carrito.renglones(),
+        f"\n💰 **Total: {formato(carrito.total)}**\n",
+    ))
+    return carrito, resumen, guardado
+
+def cronometrar(funcion, pasos, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(pasos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agregados", type=int, default=2000)
+    parser.add_argument("--productos", type=int, default=50)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    productos = productos_sinteticos(args.productos)
+    pasos = agregados(productos, args.agregados)
+
+    t_anterior, (total_float, resumen_anterior, guardado_anterior) = cronometrar(anterior, pasos, args.repeticiones)
+    t_nuevo, (carrito, resumen_nuevo, guardado_nuevo) = cronometrar(nuevo, pasos, args.repeticiones)
+
+    exacto = sum(a_centavos(p["precio"]) * c for p, c in pasos)
+    print(f"{args.agregados} agregados sobre {args.productos} productos")
+    for nombre, duracion, resumen, guardado in (
+        ("lista + float + '+='", t_anterior, resumen_anterior, guardado_anterior),
+        ("carrito.py", t_nuevo, resumen_nuevo, guardado_nuevo),
+    ):
+        print(f"{nombre:<21} {duracion * 1000:>8.2f} ms   resumen de {len(resumen.splitlines()):>5} renglones "
+              f"({len(resumen.encode()) / 1024:>5.1f} KiB)   JSON guardado {guardado / args.agregados / 1024:>6.1f} KiB/agregado")
+    print(f"por agregado:          {t_anterior / args.agregados * 1e6:>8.2f} µs vs {t_nuevo / args.agregados * 1e6:.2f} µs")
+    print(f"total float {total_float!r} vs exacto {formato(exacto)} (error {total_float - exacto / 100:+.2e})")
+    print(f"descuento 12x600ml: {formato(carrito.descuento)}, total con descuento {formato(carrito.total)}")
+
+if __name__ == "__main__":
+    main()
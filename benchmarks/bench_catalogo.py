@@ -0,0 +1,79 @@
+"""Selección de producto con catálogos grandes: búsqueda lineal original vs. índices del catálogo.
+
+Uso: python benchmarks/bench_catalogo.py [--productos 10000] [--consultas 2000]
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+from catalogo import Catalogo, CatalogoArchivo, etiqueta
+
+def busqueda_lineal(productos, text):
+    for id, prod in productos.items():
+        if prod['nombre'] in text:
+            return prod
+    return None
+
+def medir(nombre, funcion, consultas):
+    inicio = time.perf_counter()
+    for texto in consultas:
+        funcion(texto)
+    print(f"{nombre:<26} {(time.perf_counter() - inicio) / len(consultas) * 1e6:>10.2f} µs/consulta")
+
+def texto_libre():
+    """Un nombre dentro de una frase se reconoce, como en la búsqueda original"""
+    catalogo = Catalogo({p["id"]: p for p in (
+        {"id": "1", "nombre": "Agua Mineral 600ml", "precio": 15.0, "stock": 80},
+        {"id": "2", "nombre": "Garrafón", "precio": 40.0, "stock": 20},
+        {"id": "3", "nombre": "Garrafón Retornable", "precio": 35.0, "stock": 20},
+    )})
+    casos = {
+        "quiero garrafón por favor": "2",
+        "Quiero un GARRAFON retornable, gracias": "3",
+        "me das agua mineral 600ml?": "1",
+        "quiero agua por favor": None,
+    }
+    for texto, esperado in casos.items():
+        producto = catalogo.buscar(texto)
+        if (producto and producto["id"]) != esperado:
+            raise SystemExit(f"❌ {texto!r}: {producto!r}, se esperaba {esperado!r}")
+    print(f"✅ {len(casos)} textos libres reconocidos como la búsqueda original\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=10000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    args = parser.parse_args()
+
+    texto_libre()
+    productos = [
+        {"id": str(i), "nombre": f"Agua Sabor {i:05d} {random.choice(['355ml', '600ml', '1L'])}",
+         "precio": 10.0 + i % 20, "stock": 100, "descripcion": ""}
+        for i in range(args.productos)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "productos.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(productos, f)
+        inicio = time.perf_counter()
+        catalogo = CatalogoArchivo(ruta).catalogo
+        print(f"Carga e indexado de {args.productos} productos: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    muestra = random.choices(list(catalogo.productos.values()), k=args.consultas)
+    botones = [etiqueta(p) for p in muestra]
+    escritos = [p["nombre"].upper() for p in muestra]
+    con_errores = [p["nombre"].replace("Sabor", "Sabr") for p in muestra[:50]]
+    en_frase = [f"quiero {p['nombre'].lower()} por favor" for p in muestra]
+
+    medir("lineal (botón)", lambda t: busqueda_lineal(catalogo.productos, t), botones)
+    medir("índice botón exacto", catalogo.buscar, botones)
+    medir("índice nombre normalizado", catalogo.buscar, escritos)
+    medir("nombre dentro del texto", catalogo.buscar, en_frase)
+    medir("aproximada (difflib)", catalogo.buscar, con_errores)
+
+if __name__ == "__main__":
+    main()
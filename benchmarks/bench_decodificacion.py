@@ -0,0 +1,56 @@
+"""Costo de decodificar un update del webhook: camino anterior vs. decodificador.py.
+
+Uso: python benchmarks/bench_decodificacion.py [--repeticiones 20000]
+
+- anterior: json.loads + Update.de_json en el webhook
+- rápido: decodificador.decodificar (orjson, solo chat y texto); el
+  Update.de_json se paga después en el trabajador de la cola
+- descartado: un update que el bot no atiende (callback_query, sticker)
+"""
+import json
+import time
+import argparse
+
+from comun import TOKEN_PRUEBA, actualizacion
+from telegram import Bot, Update
+from decodificador import decodificar
+
+def por_update(funcion, cuerpos):
+    inicio = time.perf_counter()
+    for cuerpo in cuerpos:
+        funcion(cuerpo)
+    return (time.perf_counter() - inicio) / len(cuerpos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(TOKEN_PRUEBA)
+    texto = [json.dumps(actualizacion(i, 1000 + i % 500, "Agua Mineral 600ml - $15.0")).encode()
+             for i in range(args.repeticiones)]
+    sticker = dict(actualizacion(1, 1000, ""))
+    del sticker["message"]["text"]
+    sticker["message"]["sticker"] = {"file_id": "x", "file_unique_id": "y", "width": 512,
+                                     "height": 512, "is_animated": False, "is_video": False,
+                                     "type": "regular"}
+    callback = {"update_id": 2, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": "x",
+        "from": {"id": 1000, "is_bot": False, "first_name": "Usuario"}}}
+    descartables = [json.dumps(sticker).encode(), json.dumps(callback).encode()] * (args.repeticiones // 2)
+
+    anterior = lambda cuerpo: Update.de_json(json.loads(cuerpo), bot)
+    completo = lambda cuerpo: Update.de_json(decodificar(cuerpo)[0], bot)
+
+    filas = [
+        ("texto, anterior (webhook)", por_update(anterior, texto)),
+        ("texto, rápido (webhook)", por_update(decodificar, texto)),
+        ("texto, rápido + de_json", por_update(completo, texto)),
+        ("descartado, anterior", por_update(anterior, descartables)),
+        ("descartado, rápido", por_update(decodificar, descartables)),
+    ]
+    for nombre, segundos in filas:
+        print(f"{nombre:<28} {segundos * 1e6:>8.2f} µs/update")
+
+if __name__ == "__main__":
+    main()
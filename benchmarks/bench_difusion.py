@@ -0,0 +1,171 @@
+"""Difusión masiva: ritmo del motor, reanudación tras un corte y bloqueados.
+
+Uso: python benchmarks/bench_difusion.py [--usuarios 20000] [--bloqueados 50] [--lote 200] [--pasajeros 20] [--latencia-api 0.02]
+
+Siembra --usuarios user_id en una base temporal (carritos, pedidos y
+datos_usuario, con repetidos entre tablas, como una base de antes de la
+tabla usuarios), vacía carritos y datos_usuario como lo hace la limpieza de
+sesiones y difunde contra el stub del Bot API (en otro proceso), que
+responde 403 a uno de cada --bloqueados chats.
+
+1. Motor sin limitador: mensajes/s y cuánto tardaría al ritmo de Telegram
+2. Corte a mitad de la difusión y reanudación desde el último lote guardado
+3. Segunda difusión: los que bloquearon al bot ya no se intentan
+4. Dos procesos (dos motores con distinto dueño) arrancan la misma
+   difusión a la vez: solo uno la envía, cada destinatario una vez
+5. Uno de cada --pasajeros envíos falla la primera vez con un error de red:
+   se reintentan al final y no queda ninguno fallido
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+import httpx
+
+from comun import TOKEN_PRUEBA, lanzar, puerto_libre
+
+class BotInestable:
+    """Falla con un error de red el primer envío a uno de cada `cada` chats"""
+
+    def __init__(self, bot, cada):
+        self.bot = bot
+        self.cada = cada
+        self.fallados = set()
+
+    async def send_message(self, chat_id, texto, **extra):
+        from telegram.error import NetworkError
+        if chat_id % self.cada == 0 and chat_id not in self.fallados:
+            self.fallados.add(chat_id)
+            raise NetworkError("corte simulado")
+        return await self.bot.send_message(chat_id, texto, **extra)
+
+def sembrar(base, usuarios):
+    conexion = base.conexion
+    conexion.executescript("""
+        CREATE TABLE IF NOT EXISTS carritos (user_id INTEGER PRIMARY KEY, datos TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS datos_usuario (user_id INTEGER PRIMARY KEY, datos TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS pedidos (id TEXT PRIMARY KEY, user_id INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_pedidos_usuario ON pedidos (user_id);
+    """)
+    ids = range(1000, 1000 + usuarios)
+    with conexion:
+        conexion.executemany("INSERT INTO datos_usuario VALUES (?, '{}')", ((u,) for u in ids))
+        conexion.executemany("INSERT INTO carritos VALUES (?, '{}')", ((u,) for u in ids[::3]))
+        conexion.executemany("INSERT INTO pedidos VALUES (?, ?)", ((f"P{u}", u) for u in ids[::2]))
+
+def procesados(difusion):
+    return difusion["enviados"] + difusion["bloqueados"] + difusion["fallidos"]
+
+def informe(nombre, difusion, duracion, previos=0):
+    """`previos`: destinatarios ya procesados antes de esta corrida"""
+    total = procesados(difusion) - previos
+    print(
+        f"{nombre:<24} {total:>7} destinatarios en {duracion:>6.2f} s ({total / duracion:>6.0f} msg/s)   "
+        f"{difusion['enviados']} enviados, {difusion['bloqueados']} bloqueados, {difusion['fallidos']} fallidos"
+    )
+
+def envios_stub(port):
+    contador = httpx.get(f"http://127.0.0.1:{port}/contador").json()
+    return contador["metodos"].get("sendMessage", 0)
+
+async def medir(base, args, port):
+    from telegram.ext import ExtBot
+    from envios import ENVIOS_POR_SEGUNDO, crear_peticion
+    from difusion import Difusion
+
+    bot = ExtBot(TOKEN_PRUEBA, base_url=f"http://127.0.0.1:{port}/bot", request=crear_peticion())
+    await bot.initialize()
+    motor = Difusion(bot, base, lote=args.lote)
+    # La limpieza de sesiones borra carritos y user_data; los usuarios quedan
+    with base.conexion:
+        base.conexion.execute("DELETE FROM carritos")
+        base.conexion.execute("DELETE FROM datos_usuario")
+    (conocidos,) = base.conexion.execute("SELECT COUNT(*) FROM usuarios").fetchone()
+    print(f"{conocidos} usuarios conocidos tras la limpieza")
+
+    # 1. Ritmo del motor (sin limitador: lo que tarda en sí recorrer y enviar)
+    difusion_id = await motor.crear("🎉 Promo: 2x1 en bidones de 20L")
+    inicio = time.perf_counter()
+    difusion = await motor.ejecutar(difusion_id)
+    duracion = time.perf_counter() - inicio
+    informe("motor (sin limitador)", difusion, duracion)
+    total = difusion["enviados"] + difusion["bloqueados"]
+    print(f"  al ritmo de Telegram ({ENVIOS_POR_SEGUNDO:.0f}/s): {total / ENVIOS_POR_SEGUNDO / 60:.1f} min; "
+          f"con allow_paid_broadcast (1000/s): {total / 1000:.0f} s")
+
+    # 2. Corte a mitad y reanudación
+    difusion_id = await motor.crear("📦 Envío gratis este fin de semana")
+    previos = envios_stub(port)
+    tarea = asyncio.create_task(motor.ejecutar(difusion_id))
+    await asyncio.sleep(duracion / 2)
+    tarea.cancel()
+    try:
+        await tarea
+    except asyncio.CancelledError:
+        pass
+    cortada = await motor.obtener(difusion_id)
+    print(f"\ncorte: checkpoint en user_id {cortada['ultimo_user_id']}, "
+          f"{cortada['enviados']} enviados guardados, pendiente={cortada['terminada'] is None}")
+    inicio = time.perf_counter()
+    difusion = await motor.ejecutar(difusion_id)
+    informe("reanudada", difusion, time.perf_counter() - inicio, procesados(cortada))
+    intentos = envios_stub(port) - previos
+    print(f"  {intentos} envíos para {difusion['enviados']} destinatarios "
+          f"({intentos - difusion['enviados']} repetidos, como mucho un lote de {motor.lote})")
+
+    # 3. Los bloqueados no se vuelven a intentar
+    difusion_id = await motor.crear("💧 Nuevos precios")
+    inicio = time.perf_counter()
+    informe("\nsin bloqueados", await motor.ejecutar(difusion_id), time.perf_counter() - inicio)
+
+    # 4. Dos procesos con la misma difusión pendiente (como reanudar_pendientes en cada worker)
+    otro = Difusion(bot, base, lote=args.lote, dueno="otro-worker")
+    difusion_id = await motor.crear("🚚 Reparto extra el domingo")
+    previos = envios_stub(port)
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(motor.ejecutar(difusion_id), otro.ejecutar(difusion_id))
+    duracion = time.perf_counter() - inicio
+    (difusion,) = [r for r in resultados if r is not None]
+    informe("\ndos procesos", difusion, duracion)
+    intentos = envios_stub(port) - previos
+    print(f"  la tomó {sum(r is not None for r in resultados)} de 2; {intentos} envíos para "
+          f"{difusion['enviados']} destinatarios")
+
+    # 5. Errores pasajeros
+    inestable = Difusion(BotInestable(bot, args.pasajeros), base, lote=args.lote, espera_reintento=0.1)
+    difusion_id = await inestable.crear("💧 Garrafón a mitad de precio")
+    previos = envios_stub(port)
+    inicio = time.perf_counter()
+    difusion = await inestable.ejecutar(difusion_id)
+    informe("\nerrores pasajeros", difusion, time.perf_counter() - inicio)
+    print(f"  {len(inestable.bot.fallados)} fallaron la primera vez; "
+          f"{envios_stub(port) - previos} envíos al stub para {difusion['enviados']} destinatarios")
+    await bot.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=20000)
+    parser.add_argument("--bloqueados", type=int, default=50)
+    parser.add_argument("--lote", type=int, default=200)
+    parser.add_argument("--pasajeros", type=int, default=20)
+    parser.add_argument("--latencia-api", type=float, default=0.02)
+    args = parser.parse_args()
+
+    from basedatos import BaseSQLite
+    port = puerto_libre()
+    stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(port), "--latencia", str(args.latencia_api),
+                   "--bloqueados", str(args.bloqueados)], port)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "bench.db"))
+        try:
+            sembrar(base, args.usuarios)
+            asyncio.run(medir(base, args, port))
+        finally:
+            base.cerrar()
+            stub.terminate()
+            stub.wait()
+
+if __name__ == "__main__":
+    main()
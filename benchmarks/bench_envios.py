@@ -0,0 +1,81 @@
+"""Envíos al Bot API: tamaño del pool y limitador frente a los 429 de Telegram.
+
+Uso: python benchmarks/bench_envios.py [--mensajes 150] [--chats 50] [--latencia-api 0.02]
+
+1. Sin límite en el stub: throughput con pool de 1 conexión vs. el pool de envios.py
+2. Stub que responde 429 pasados 30 envíos/s: ráfaga sin limitador vs. con LimitadorEnvios
+"""
+import time
+import asyncio
+import logging
+import argparse
+
+from comun import TOKEN_PRUEBA, percentil, puerto_libre
+
+async def rafaga(bot, mensajes, chats):
+    latencias = []
+    errores = 0
+
+    async def enviar(i):
+        nonlocal errores
+        inicio = time.perf_counter()
+        try:
+            await bot.send_message(chat_id=1000 + i % chats, text=f"Mensaje {i}")
+        except Exception:
+            errores += 1
+        latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(enviar(i) for i in range(mensajes)))
+    return latencias, errores, time.perf_counter() - inicio
+
+async def escenario(nombre, stub_port, args, pool, limitador=None):
+    from telegram.ext import ExtBot
+    import stub_bot_api
+    from envios import crear_peticion
+
+    bot = ExtBot(
+        TOKEN_PRUEBA, base_url=f"http://127.0.0.1:{stub_port}/bot",
+        request=crear_peticion(pool=pool), rate_limiter=limitador,
+    )
+    await bot.initialize()
+    previos = stub_bot_api.contador["rechazos_429"]
+    latencias, errores, duracion = await rafaga(bot, args.mensajes, args.chats)
+    await bot.shutdown()
+    print(
+        f"{nombre:<28} {args.mensajes / duracion:>7.0f} msg/s   "
+        f"p50 {percentil(latencias, 50) * 1000:>7.1f} ms   p99 {percentil(latencias, 99) * 1000:>7.1f} ms   "
+        f"{errores} fallidos, {stub_bot_api.contador['rechazos_429'] - previos} respuestas 429"
+    )
+
+async def medir(args):
+    from tornado.httpserver import HTTPServer
+    import stub_bot_api
+    from envios import BOT_POOL, LimitadorEnvios
+
+    libre = puerto_libre()
+    HTTPServer(stub_bot_api.crear_stub(args.latencia_api)).listen(libre, address="127.0.0.1")
+    print(f"Stub sin límite, {args.latencia_api * 1000:.0f} ms por llamada")
+    await escenario("pool de 1 conexión", libre, args, pool=1)
+    await escenario(f"pool de {BOT_POOL} (envios.py)", libre, args, pool=BOT_POOL)
+
+    # Segundo stub: mismo proceso, límite global de 30/s
+    limitado = puerto_libre()
+    app = stub_bot_api.crear_stub(args.latencia_api, limite=30)
+    HTTPServer(app).listen(limitado, address="127.0.0.1")
+    print("\nStub con 429 pasados 30 envíos/s")
+    await escenario("sin limitador", limitado, args, pool=BOT_POOL)
+    await asyncio.sleep(1.1)
+    await escenario("LimitadorEnvios", limitado, args, pool=BOT_POOL, limitador=LimitadorEnvios())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mensajes", type=int, default=150)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--latencia-api", type=float, default=0.02)
+    args = parser.parse_args()
+    logging.getLogger("tornado.access").setLevel(logging.ERROR)
+    asyncio.run(medir(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Consultas de estado de pedido: directo a SQLite vs. caché de lectura.
+
+Uso: python benchmarks/bench_estados.py [--pedidos 100000] [--activos 2000] [--consultas 20000]
+
+Simula clientes que consultan una y otra vez sus pedidos recientes (--activos
+pedidos distintos) mientras algunos avanzan de estado. Crea una base temporal.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from bench_pedidos import pedido_sintetico, informe
+from basedatos import BaseSQLite
+from repositorio_pedidos import RepositorioSQLite, RepositorioCacheado
+
+async def consultar(repo, ids, consultas, aleatorio):
+    latencias = []
+    for j in range(consultas):
+        pedido_id = aleatorio.choice(ids)
+        t = time.perf_counter()
+        pedido = await repo.obtener(pedido_id)
+        latencias.append(time.perf_counter() - t)
+        # De vez en cuando un pedido avanza (invalida su entrada)
+        if j % 100 == 0:
+            await repo.actualizar_estado(pedido_id, pedido["estado"], pedido["estado"])
+    return latencias
+
+async def medir(base, args):
+    repo = RepositorioSQLite(base)
+    lote = 10000
+    for desde in range(0, args.pedidos, lote):
+        await repo.guardar_lote([pedido_sintetico(i) for i in range(desde, min(args.pedidos, desde + lote))])
+
+    aleatorio = random.Random(1)
+    ids = [f"P{i:012d}" for i in aleatorio.sample(range(args.pedidos), args.activos)]
+
+    informe("sin caché", await consultar(repo, ids, args.consultas, random.Random(2)))
+    cacheado = RepositorioCacheado(repo)
+    informe("con caché", await consultar(cacheado, ids, args.consultas, random.Random(2)))
+    total = cacheado.aciertos + cacheado.fallos
+    print(f"aciertos {cacheado.aciertos / total:.1%} ({cacheado.fallos} lecturas a SQLite de {total})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pedidos", type=int, default=100_000)
+    parser.add_argument("--activos", type=int, default=2000)
+    parser.add_argument("--consultas", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "bench.db"))
+        try:
+            asyncio.run(medir(base, args))
+        finally:
+            base.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Carga con compras completas simuladas, del /start a la confirmación del pedido.
+
+Uso: python benchmarks/bench_flujos.py [--usuarios 300] [--concurrencia 50] [--modo todos]
+
+Cada usuario sintético recorre start -> Comprar -> producto -> cantidad ->
+pagar -> envío -> pago -> confirmar, con producto, cantidad y método de pago
+al azar (reproducible con --semilla). Modos:
+- application: los updates pasan directo por la Application de bot.py en este
+  proceso; se mide la latencia de cada handler
+- webhook: se envían por HTTP a server.py (Flask) y server_async.py (Tornado)
+  y se mide hasta que la cola termina de procesarlos
+
+Sin red: el Bot API es benchmarks/stub_bot_api.py y la base y el catálogo son
+temporales (stock de sobra para que no se agote durante la prueba).
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+import httpx
+
+from comun import (
+    RAIZ, TOKEN_PRUEBA, METODOS_PAGO, actualizacion, entorno_bot, flujo_compra,
+    lanzar, memoria_rss, percentil, puerto_libre, reporte
+)
+
+BASE_USUARIO = 100000
+
+def preparar_entorno(directorio):
+    """Catálogo con stock ilimitado y base vacía en `directorio`"""
+    with open(os.path.join(RAIZ, "productos.json"), encoding="utf-8") as f:
+        productos = json.load(f)
+    for p in productos:
+        p["stock"] = 10 ** 9
+    catalogo = os.path.join(directorio, "productos.json")
+    with open(catalogo, "w", encoding="utf-8") as f:
+        json.dump(productos, f, ensure_ascii=False)
+    return productos, {
+        "CATALOGO_PATH": catalogo,
+        "DB_PATH": os.path.join(directorio, "bench.db"),
+    }
+
+def generar_flujos(productos, usuarios, semilla):
+    """Lista de flujos; cada flujo es la lista de updates (JSON) de un usuario"""
+    aleatorio = random.Random(semilla)
+    update_id = 0
+    flujos = []
+    for user_id in range(BASE_USUARIO, BASE_USUARIO + usuarios):
+        textos = flujo_compra(
+            user_id, aleatorio.choice(productos), aleatorio.randint(1, 24),
+            aleatorio.choice(METODOS_PAGO),
+        )
+        updates = []
+        for texto in textos:
+            update_id += 1
+            updates.append(actualizacion(update_id, user_id, texto))
+        flujos.append(updates)
+    return flujos
+
+def informe_handlers(latencias):
+    print(f"  {'handler':<28} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for nombre, tiempos in sorted(latencias.items(), key=lambda x: -sum(x[1])):
+        if tiempos:
+            print(
+                f"  {nombre:<28} {len(tiempos):>6} "
+                f"{percentil(tiempos, 50) * 1000:>8.2f} "
+                f"{percentil(tiempos, 95) * 1000:>8.2f} "
+                f"{percentil(tiempos, 99) * 1000:>8.2f}"
+            )
+
+# --- Application en proceso ---
+
+def cronometrar(handler, latencias):
+    """Reemplazar el callback del handler por uno que mide su duración"""
+    callback = handler.callback
+    tiempos = latencias.setdefault(callback.__name__, [])
+
+    async def medido(update, context):
+        inicio = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            tiempos.append(time.perf_counter() - inicio)
+
+    handler.callback = medido
+
+def cronometrar_handlers(application):
+    from telegram.ext import ConversationHandler
+
+    latencias = {}
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                internos = [*handler.entry_points, *handler.fallbacks]
+                for estado in handler.states.values():
+                    internos.extend(estado)
+                for interno in internos:
+                    cronometrar(interno, latencias)
+            else:
+                cronometrar(handler, latencias)
+    return latencias
+
+async def modo_application(flujos, args, stub_port):
+    from tornado.httpserver import HTTPServer
+    from telegram import Update
+    from telegram.ext import ConversationHandler
+    import stub_bot_api
+    import bot
+
+    HTTPServer(stub_bot_api.crear_stub(args.latencia_api)).listen(stub_port, address="127.0.0.1")
+
+    # Los mismos handlers que bot.main()
+    app = bot.construir_aplicacion()
+    conversacion = bot.registrar_handlers(app)
+    latencias = cronometrar_handlers(app)
+
+    await app.initialize()
+    await app.start()
+
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    por_update = []
+
+    async def usuario(updates):
+        async with semaforo:
+            for datos in updates:
+                inicio = time.perf_counter()
+                await app.process_update(Update.de_json(datos, app.bot))
+                por_update.append(time.perf_counter() - inicio)
+
+    rss_inicial = memoria_rss()
+    inicio = time.perf_counter()
+    await asyncio.gather(*(usuario(updates) for updates in flujos))
+    duracion = time.perf_counter() - inicio
+    rss_final = memoria_rss()
+
+    reporte("Application (bot.py)", por_update, duracion)
+    informe_handlers(latencias)
+    print(f"  memoria: {rss_final / 2**20:.1f} MiB residentes "
+          f"(+{(rss_final - rss_inicial) / 2**20:.1f} MiB, "
+          f"{(rss_final - rss_inicial) / len(flujos) / 1024:.1f} KiB por usuario)")
+
+    nombres = bot.NOMBRES_ESTADOS
+    finales = Counter(
+        nombres.get(estado, str(estado)) if estado is not ConversationHandler.END else "END"
+        for estado in conversacion._conversations.values()
+    )
+    print("  estado final: " + ", ".join(f"{n} {c}" for n, c in finales.most_common()))
+
+    await app.stop()
+    await app.shutdown()
+
+# --- Webhooks (procesos aparte) ---
+
+async def enviar_flujos(url, flujos, concurrencia):
+    latencias = []
+    rechazadas = 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def usuario(http, updates):
+        nonlocal rechazadas
+        async with semaforo:
+            for datos in updates:
+                while True:
+                    inicio = time.perf_counter()
+                    r = await http.post(url, json=datos)
+                    latencias.append(time.perf_counter() - inicio)
+                    if r.status_code != 503:
+                        r.raise_for_status()
+                        break
+                    rechazadas += 1
+                    await asyncio.sleep(float(r.headers.get("Retry-After", 1)))
+
+    limites = httpx.Limits(max_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=30) as http:
+        await asyncio.gather(*(usuario(http, updates) for updates in flujos))
+    return latencias, rechazadas
+
+async def esperar_cola(url, total, timeout=300.0):
+    """Esperar a que la cola del servidor haya procesado `total` updates"""
+    limite = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5) as http:
+        while time.monotonic() < limite:
+            metricas = (await http.get(url)).json()
+            if metricas["procesadas"] >= total:
+                return metricas
+            await asyncio.sleep(0.02)
+    raise RuntimeError(f"La cola no terminó en {timeout}s")
+
+async def cargar_webhook(port, flujos, concurrencia):
+    base = f"http://127.0.0.1:{port}"
+    total = sum(len(updates) for updates in flujos)
+    inicio = time.perf_counter()
+    latencias, rechazadas = await enviar_flujos(f"{base}/{TOKEN_PRUEBA}", flujos, concurrencia)
+    metricas = await esperar_cola(f"{base}/cola", total)
+    return latencias, rechazadas, metricas, time.perf_counter() - inicio
+
+def modo_webhook(nombre, script, flujos, args, stub_port, entorno):
+    port = puerto_libre()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cada servidor con su propia base
+        env = dict(entorno_bot(stub_port, port), **entorno)
+        env["DB_PATH"] = os.path.join(tmp, "bench.db")
+        proc = lanzar([script], port, env)
+        try:
+            rss_inicial = memoria_rss(proc.pid)
+            latencias, rechazadas, metricas, duracion = asyncio.run(
+                cargar_webhook(port, flujos, args.concurrencia)
+            )
+            rss_final = memoria_rss(proc.pid)
+            # Throughput de punta a punta: hasta que la cola procesó todo
+            total = sum(len(updates) for updates in flujos)
+            print(f"{nombre:<22} {total / duracion:>9.0f} updates/s procesados   "
+                  f"POST p50 {percentil(latencias, 50) * 1000:.2f} ms   "
+                  f"p99 {percentil(latencias, 99) * 1000:.2f} ms")
+            print(f"  cola: espera promedio {metricas['espera_promedio_ms']:.1f} ms, "
+                  f"máx {metricas['espera_max_ms']:.1f} ms, {metricas['fallidas']} fallidas, "
+                  f"{rechazadas} rechazadas con 503")
+            print(f"  memoria: {rss_final / 2**20:.1f} MiB residentes "
+                  f"(+{(rss_final - rss_inicial) / 2**20:.1f} MiB)")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=300)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia-api", type=float, default=0.02,
+                        help="latencia simulada del Bot API en segundos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--modo", choices=["todos", "application", "webhook"], default="todos")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        productos, entorno = preparar_entorno(tmp)
+        flujos = generar_flujos(productos, args.usuarios, args.semilla)
+        total = sum(len(updates) for updates in flujos)
+        print(f"{args.usuarios} compras, {total} updates, concurrencia {args.concurrencia}, "
+              f"Bot API con {args.latencia_api * 1000:.0f} ms")
+
+        if args.modo in ("todos", "webhook"):
+            stub_port = puerto_libre()
+            stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port),
+                           "--latencia", str(args.latencia_api)], stub_port)
+            try:
+                modo_webhook("Flask + thread", "server.py", flujos, args, stub_port, entorno)
+                modo_webhook("Tornado nativo", "server_async.py", flujos, args, stub_port, entorno)
+            finally:
+                stub.terminate()
+                stub.wait()
+
+        if args.modo in ("todos", "application"):
+            # Al final: importa bot.py en este proceso con el entorno de prueba
+            stub_port = puerto_libre()
+            os.environ.update(entorno_bot(stub_port, 0), **entorno)
+            asyncio.run(modo_application(flujos, args, stub_port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Descarte de updates repetidos: costo por update_id y memoria con millones de ids.
+
+Uso: python benchmarks/bench_idempotencia.py [--ids 3000000] [--ventana 1048576] [--compartidos 20000] [--webhook 200]
+
+1. Un flujo de --ids update_id consecutivos con 1% de reintentos (un id
+   reciente otra vez) y 1% de desorden, contra:
+   - set sin límite (todo lo visto)
+   - set + deque con los últimos --ventana ids
+   - idempotencia.UpdatesVistos (bitmap circular de --ventana bits)
+   ns por consulta, memoria al final (tracemalloc, en una pasada aparte) y
+   cuántos descartó cada uno (tienen que coincidir)
+2. UpdatesVistosCompartidos (bitmap + tabla en SQLite) con --compartidos ids
+3. server_async.py contra el stub del Bot API: cada update se envía dos
+   veces a la vez (como un reintento de Telegram) y se cuenta cuántos
+   sendMessage salieron
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from collections import deque
+
+import httpx
+
+from comun import TOKEN_PRUEBA, actualizacion, entorno_bot, lanzar, puerto_libre
+from idempotencia import UpdatesVistos, UpdatesVistosCompartidos
+
+BASE_ID = 700000000
+
+def generar_ids(n, semilla=1):
+    aleatorio = random.Random(semilla)
+    ids = []
+    siguiente = BASE_ID
+    for _ in range(n):
+        r = aleatorio.random()
+        if r < 0.01 and ids:
+            ids.append(ids[-aleatorio.randint(1, min(len(ids), 100))])
+        elif r < 0.02:
+            # Llega el siguiente antes que este
+            ids.append(siguiente + 1)
+            ids.append(siguiente)
+            siguiente += 2
+        else:
+            ids.append(siguiente)
+            siguiente += 1
+    return ids
+
+class SetSinLimite:
+    def __init__(self, ventana):
+        self.vistos = set()
+
+    def registrar(self, update_id):
+        if update_id in self.vistos:
+            return False
+        self.vistos.add(update_id)
+        return True
+
+class SetConDeque:
+    def __init__(self, ventana):
+        self.vistos = set()
+        self.orden = deque()
+        self.ventana = ventana
+
+    def registrar(self, update_id):
+        if update_id in self.vistos:
+            return False
+        self.vistos.add(update_id)
+        self.orden.append(update_id)
+        if len(self.orden) > self.ventana:
+            self.vistos.discard(self.orden.popleft())
+        return True
+
+def cronometrar(clase, ids, ventana):
+    estructura = clase(ventana)
+    registrar = estructura.registrar
+    inicio = time.perf_counter()
+    descartados = 0
+    for update_id in ids:
+        if not registrar(update_id):
+            descartados += 1
+    return time.perf_counter() - inicio, descartados
+
+def memoria(clase, ids, ventana):
+    tracemalloc.start()
+    estructura = clase(ventana)
+    for update_id in ids:
+        estructura.registrar(update_id)
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return actual
+
+async def compartidos(n, ventana):
+    from basedatos import BaseSQLite
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "vistos.db"))
+        try:
+            vistos = UpdatesVistosCompartidos(base, ventana)
+            ids = generar_ids(n, semilla=2)
+            inicio = time.perf_counter()
+            for update_id in ids:
+                await vistos.es_nuevo(update_id)
+            duracion = time.perf_counter() - inicio
+            # Otro proceso con la misma base: los que ya vio este los descarta por la tabla
+            otro = UpdatesVistosCompartidos(base, ventana)
+            muestra = ids[-1000:]
+            repetidos = 0
+            for update_id in muestra:
+                repetidos += not await otro.es_nuevo(update_id)
+        finally:
+            base.cerrar()
+    print(f"\ncompartido (SQLite)   {duracion / len(ids) * 1e6:>7.1f} µs/id ({len(ids)} ids, "
+          f"{vistos.repetidos} descartados); otro proceso descartó {repetidos}/{len(muestra)} ya vistos")
+
+async def reenviar(port, stub_port, n):
+    async with httpx.AsyncClient(timeout=30) as http:
+        url = f"http://127.0.0.1:{port}/{TOKEN_PRUEBA}"
+        for i in range(n):
+            datos = actualizacion(BASE_ID + i, 900000 + i, "/start")
+            await asyncio.gather(http.post(url, json=datos), http.post(url, json=datos))
+        limite = time.monotonic() + 30
+        while (await http.get(f"http://127.0.0.1:{port}/cola")).json()["procesadas"] < n:
+            if time.monotonic() > limite:
+                break
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        cola = (await http.get(f"http://127.0.0.1:{port}/cola")).json()
+        enviados = (await http.get(f"http://127.0.0.1:{stub_port}/contador")).json()["metodos"].get("sendMessage", 0)
+    print(f"\nwebhook (server_async.py): {n} updates enviados dos veces -> {cola['procesadas']} procesados, "
+          f"{cola['repetidas']} repetidos descartados, {enviados} sendMessage")
+    return enviados == n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ids", type=int, default=3_000_000)
+    parser.add_argument("--ventana", type=int, default=1 << 20)
+    parser.add_argument("--compartidos", type=int, default=20000)
+    parser.add_argument("--webhook", type=int, default=200)
+    args = parser.parse_args()
+
+    ids = generar_ids(args.ids)
+    print(f"{len(ids)} update_id, ventana de {args.ventana}")
+    for nombre, clase in (("set sin límite", SetSinLimite), ("set + deque", SetConDeque),
+                          ("bitmap (UpdatesVistos)", UpdatesVistos)):
+        duracion, descartados = cronometrar(clase, ids, args.ventana)
+        ocupada = memoria(clase, ids, args.ventana)
+        print(f"{nombre:<24} {duracion / len(ids) * 1e9:>6.0f} ns/id   "
+              f"{ocupada / 2**20:>8.2f} MiB   {descartados} descartados")
+
+    asyncio.run(compartidos(args.compartidos, args.ventana))
+
+    if args.webhook:
+        stub_port, port = puerto_libre(), puerto_libre()
+        stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port)], stub_port)
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(entorno_bot(stub_port, port), DB_PATH=os.path.join(tmp, "bench.db"))
+            proc = lanzar(["server_async.py"], port, env)
+            try:
+                correcto = asyncio.run(reenviar(port, stub_port, args.webhook))
+            finally:
+                proc.terminate()
+                proc.wait()
+                stub.terminate()
+                stub.wait()
+        print("✅ una respuesta por update" if correcto else "❌ hubo updates procesados dos veces")
+
+if __name__ == "__main__":
+    main()
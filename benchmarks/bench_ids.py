@@ -0,0 +1,61 @@
+"""Prueba de estrés del generador de IDs de pedido con varios procesos.
+
+Uso: python benchmarks/bench_ids.py [--procesos 4] [--tasa 100000] [--segundos 3]
+
+Cada proceso genera su parte de `tasa` IDs por segundo; al final se verifica
+que no haya colisiones y que cada proceso produzca IDs crecientes.
+"""
+import time
+import argparse
+import multiprocessing
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+from generador_ids import GeneradorIds, codificar, decodificar
+
+def trabajador(args):
+    tasa, segundos = args
+    generador = GeneradorIds()
+    ids = []
+    inicio = time.perf_counter()
+    for tick in range(segundos * 100):
+        # Ráfagas cada 10 ms para sostener la tasa pedida
+        for _ in range(tasa // 100):
+            ids.append(generador.siguiente())
+        espera = inicio + (tick + 1) / 100 - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+    return generador.nodo, time.perf_counter() - inicio, ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--tasa", type=int, default=100_000, help="IDs/s entre todos los procesos")
+    parser.add_argument("--segundos", type=int, default=3)
+    args = parser.parse_args()
+
+    generador = GeneradorIds()
+    n = 200_000
+    inicio = time.perf_counter()
+    for _ in range(n):
+        generador.nuevo_id()
+    print(f"Un proceso: {n / (time.perf_counter() - inicio):,.0f} IDs/s (codificados)")
+
+    por_proceso = args.tasa // args.procesos
+    with multiprocessing.Pool(args.procesos) as pool:
+        resultados = pool.map(trabajador, [(por_proceso, args.segundos)] * args.procesos)
+
+    total = 0
+    unicos = set()
+    for nodo, duracion, ids in resultados:
+        total += len(ids)
+        unicos.update(ids)
+        assert all(a < b for a, b in zip(ids, ids[1:])), f"nodo {nodo}: IDs no crecientes"
+        print(f"  nodo {nodo:>4}: {len(ids):,} IDs en {duracion:.2f} s")
+    assert all(decodificar(codificar(i)) == i for i in list(unicos)[:10000])
+
+    print(f"Total: {total:,} IDs, {total / args.segundos:,.0f} IDs/s, colisiones: {total - len(unicos)}")
+    if total != len(unicos):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
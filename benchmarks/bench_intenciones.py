@@ -0,0 +1,75 @@
+"""Detección de intenciones: cadena de `in text.lower()` original vs. expresión compilada.
+
+Uso: python benchmarks/bench_intenciones.py [--mensajes 100000]
+
+Además verifica que ambas versiones tomen la misma decisión en todo el corpus.
+"""
+import time
+import random
+import argparse
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+import intenciones as it
+
+CORPUS = [
+    "💧 Comprar Agua", "🎯 Promociones", "📦 Estado de Pedido", "🕐 Horarios",
+    "⚙️ Configuración", "❓ Preguntas Frecuentes", "👨‍💼 Contacto Humano",
+    "🔙 Menú Principal", "🔙 Atrás", "Agua Mineral 600ml - $15.0",
+    "Agua Mineral 355ml - $10.0", "Agua Mineral de Vidrio - $25.0", "3", "12", "pagar",
+    "quiero pagar", "Juan Pérez\nCalle Principal #123\n555-123-4567",
+    "💳 Tarjeta de Crédito/Débito", "💰 Pago contra Entrega", "🏦 Transferencia Bancaria",
+    "✅ Sí, confirmar pedido", "❌ No, cancelar compra", "hola", "menu",
+    "P0A8W7THY00000", "¿a qué hora abren?", "quiero hablar con alguien",
+]
+
+def menu_original(text):
+    text_l = text.lower()
+    if any(p in text_l for p in it.PALABRAS[it.VOLVER]):
+        return it.VOLVER
+    if "comprar" in text.lower():
+        return it.COMPRAR
+    elif "estado" in text.lower():
+        return it.ESTADO
+    elif "horarios" in text.lower():
+        return it.HORARIOS
+    elif "preguntas" in text.lower():
+        return it.PREGUNTAS
+    elif "contacto" in text.lower():
+        return it.CONTACTO
+    elif "configuración" in text.lower() or "configuracion" in text.lower():
+        return it.CONFIGURACION
+    elif "promociones" in text.lower():
+        return it.PROMOCIONES
+    return None
+
+def menu_compilado(text):
+    if it.VOLVER in it.intenciones(text):
+        return it.VOLVER
+    return it.intencion_menu(text)
+
+def medir(nombre, funcion, mensajes):
+    inicio = time.perf_counter()
+    for m in mensajes:
+        funcion(m)
+    print(f"{nombre:<34} {(time.perf_counter() - inicio) / len(mensajes) * 1e9:>8.0f} ns/mensaje")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mensajes", type=int, default=100000)
+    args = parser.parse_args()
+
+    for m in CORPUS:
+        assert menu_original(m) == menu_compilado(m), m
+
+    mensajes = random.choices(CORPUS, k=args.mensajes)
+    # Texto libre que no se repite (no aprovecha la caché)
+    unicos = [f"{m} {i}" for i, m in enumerate(mensajes)]
+
+    medir("original", menu_original, mensajes)
+    medir("compilada (repetidos, en caché)", menu_compilado, mensajes)
+    it.intenciones.cache_clear()
+    medir("original (únicos)", menu_original, unicos)
+    medir("compilada (únicos, sin caché)", menu_compilado, unicos)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Reservas concurrentes sobre un mismo producto (SKU caliente), con tareas asyncio y varios procesos.
+
+Uso: python benchmarks/bench_inventario.py [--stock 5000] [--procesos 4] [--tareas 32]
+
+Todos compiten por 1 unidad a la vez hasta agotar el stock; al final se
+verifica que no se haya vendido de más.
+
+Después, con la Application de bot.py y el stub del Bot API en este
+proceso: un usuario aparta unidades y abandona la compra con /cancel y con
+"menu"; el stock tiene que volver sin esperar a que venza la reserva.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from comun import actualizacion, entorno_bot, puerto_libre
+from basedatos import BaseSQLite
+from inventario import Inventario, _sembrar, _disponible
+
+SKU = "caliente"
+
+async def competir(ruta, tareas, proceso):
+    base = BaseSQLite(ruta)
+    inventario = Inventario(base)
+    exitos = 0
+
+    async def comprador(n):
+        nonlocal exitos
+        user_id = proceso * 100000 + n
+        while True:
+            reservado, disponible = await inventario.reservar(user_id, SKU, 1)
+            if reservado:
+                exitos += 1
+            elif disponible == 0:
+                return
+
+    await asyncio.gather(*(comprador(n) for n in range(tareas)))
+    base.cerrar()
+    return exitos
+
+def proceso(args):
+    ruta, tareas, numero = args
+    inicio = time.perf_counter()
+    exitos = asyncio.run(competir(ruta, tareas, numero))
+    return exitos, time.perf_counter() - inicio
+
+async def compra_abandonada(productos, stub_port):
+    from tornado.httpserver import HTTPServer
+    from telegram import Update
+    import stub_bot_api
+    import bot
+
+    HTTPServer(stub_bot_api.crear_stub()).listen(stub_port, address="127.0.0.1")
+    app = bot.construir_aplicacion()
+    bot.registrar_handlers(app)
+    await app.initialize()
+    await app.start()
+
+    inventario = bot.obtener_inventario()
+    producto = productos[0]
+    update_id = 0
+    fallas = 0
+    for salida in ("/cancel", "menu"):
+        antes = await inventario.disponible(producto["id"])
+        textos = ["/start", "💧 Comprar Agua", f"{producto['nombre']} - ${producto['precio']}", "10"]
+        for texto in textos:
+            update_id += 1
+            await app.process_update(Update.de_json(actualizacion(update_id, 4242, texto), app.bot))
+        apartado = await inventario.disponible(producto["id"])
+        update_id += 1
+        await app.process_update(Update.de_json(actualizacion(update_id, 4242, salida), app.bot))
+        despues = await inventario.disponible(producto["id"])
+        print(f"{salida!r:>9}: disponible {antes} -> {apartado} al apartar -> {despues} al salir")
+        fallas += despues != antes or apartado != antes - 10
+        # Fuera de la conversación para que el próximo /start la empiece
+        update_id += 1
+        await app.process_update(Update.de_json(actualizacion(update_id, 4242, "/cancel"), app.bot))
+
+    await app.stop()
+    await app.shutdown()
+    if fallas:
+        raise SystemExit("¡La compra abandonada no devolvió el stock!")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--tareas", type=int, default=32, help="tareas asyncio por proceso")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "bench.db")
+        base = BaseSQLite(ruta)
+        Inventario(base)  # crea las tablas
+        _sembrar(base.conexion, [(SKU, args.stock)])
+
+        inicio = time.perf_counter()
+        with multiprocessing.Pool(args.procesos) as pool:
+            resultados = pool.map(proceso, [(ruta, args.tareas, i) for i in range(args.procesos)])
+        duracion = time.perf_counter() - inicio
+
+        vendidas = sum(e for e, _ in resultados)
+        restante = _disponible(base.conexion, SKU)
+        base.cerrar()
+
+    print(f"{args.procesos} procesos x {args.tareas} tareas, stock {args.stock}")
+    print(f"Reservas exitosas: {vendidas} (restante {restante}) en {duracion:.2f} s "
+          f"-> {vendidas / duracion:,.0f} reservas/s")
+    if vendidas + restante != args.stock or restante != 0:
+        raise SystemExit("¡Inconsistencia de inventario!")
+
+    from bench_flujos import preparar_entorno
+    with tempfile.TemporaryDirectory() as tmp:
+        productos, entorno = preparar_entorno(tmp)
+        stub_port = puerto_libre()
+        os.environ.update(entorno_bot(stub_port, 0), **entorno)
+        print("\nCompra abandonada:")
+        asyncio.run(compra_abandonada(productos, stub_port))
+
+if __name__ == "__main__":
+    main()
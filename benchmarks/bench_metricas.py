@@ -0,0 +1,64 @@
+"""Costo de la instrumentación: handler medido vs. sin medir, y render de /metrics.
+
+Los handlers medidos salen de flujo.compilar, igual que en el bot: /start
+(solo la medición) y el despachador de un estado (intenciones + medición).
+
+Uso: python benchmarks/bench_metricas.py [--llamadas 200000]
+"""
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+from comun import percentil
+import intenciones as it
+from flujo import Paso, compilar
+from metricas import metricas
+
+MENU, COMPRA = 0, 1
+
+async def handler_vacio(update, context):
+    return COMPRA
+
+async def por_llamada(callback, update, llamadas):
+    tiempos = []
+    for _ in range(llamadas):
+        inicio = time.perf_counter()
+        await callback(update, None)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def mostrar(nombre, tiempos):
+    print(f"{nombre:<11} p50 {percentil(tiempos, 50) * 1e6:6.2f} µs   p99 {percentil(tiempos, 99) * 1e6:6.2f} µs")
+
+async def medir(llamadas):
+    conversacion = compilar(
+        {MENU: Paso(handler_vacio, [(it.COMPRAR, handler_vacio)])},
+        {MENU: "MENU", COMPRA: "COMPRA"},
+        handler_vacio, handler_vacio,
+    )
+    inicio_medido = conversacion.entry_points[0].callback
+    despachar = conversacion.states[MENU][0].callback
+    update = SimpleNamespace(message=SimpleNamespace(text="Comprar"))
+
+    sin = await por_llamada(handler_vacio, update, llamadas)
+    con = await por_llamada(inicio_medido, update, llamadas)
+    despacho = await por_llamada(despachar, update, llamadas)
+    extra = [(percentil(con, p) - percentil(sin, p)) * 1e6 for p in (50, 99)]
+    mostrar("sin medir", sin)
+    mostrar("medido", con)
+    mostrar("despacho", despacho)
+    print(f"sobrecosto  p50 {extra[0]:6.2f} µs   p99 {extra[1]:6.2f} µs")
+
+    inicio = time.perf_counter()
+    texto = metricas.exportar()
+    print(f"/metrics    {(time.perf_counter() - inicio) * 1e3:.2f} ms ({len(texto)} bytes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--llamadas", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(medir(args.llamadas))
+
+if __name__ == "__main__":
+    main()
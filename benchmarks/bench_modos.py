@@ -0,0 +1,235 @@
+"""Polling y webhooks con el mismo flujo: mismas respuestas y costo del despacho.
+
+Uso: python benchmarks/bench_modos.py [--repeticiones 2000] [--latencia-api 0]
+
+1. Corre los mismos guiones de conversación por bot.py (polling, getUpdates
+   contra el stub), server.py (Flask) y server_async.py (Tornado), cada uno
+   con su base: compra completa con "pagar" y la dirección en "Calle
+   Principal", consulta del pedido, volver al menú desde cada estado, atrás
+   en el método de pago, cantidades inválidas, pagar con el carrito vacío y
+   /cancel. Las respuestas a cada chat tienen que ser idénticas en los tres
+   modos (con números de pedido, fechas y horas estimadas de entrega
+   normalizados); si no, termina con error.
+2. Costo del despacho por estado en este proceso: check_update del
+   ConversationHandler compilado de bot.FLUJO más la elección de la ruta,
+   con handlers que no hacen nada (es el mismo grafo en los tres modos)
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import tempfile
+
+import httpx
+
+from comun import (
+    RAIZ, TOKEN_PRUEBA, METODOS_PAGO, actualizacion, entorno_bot, flujo_compra,
+    lanzar, percentil, puerto_libre
+)
+from bench_flujos import preparar_entorno
+
+BASE_CHAT = 500000
+PEDIDO = "{pedido}"
+_PEDIDO_ID = re.compile(r"\bP[0-9A-Z]{13}\b")
+_FECHA = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_ETA = re.compile(r"~[^\n]*\(hacia las \d{2}:\d{2}\)")
+
+def guiones(productos):
+    """Listas de textos, una por chat; {pedido} es el último número de pedido recibido"""
+    from catalogo import etiqueta
+    producto = etiqueta(productos[1])
+    compra = flujo_compra(BASE_CHAT, productos[1], 12, METODOS_PAGO[1])
+    return [
+        compra + ["📦 Estado de Pedido", PEDIDO, "#" + PEDIDO, "🔙 Menú Principal"],
+        ["/start", "💧 Comprar Agua", "pagar"],
+        ["/start", "💧 Comprar Agua", producto, "abc", "0", "🔙 Menú Principal", "🕐 Horarios"],
+        ["/start", "💧 Comprar Agua", producto, "2", "pagar", "🔙 Menú Principal"],
+        ["/start", "💧 Comprar Agua", producto, "5", "pagar", "Ana\nAv. Principal 10", "🔙 Atrás",
+         "Ana\nAv. Principal 12", METODOS_PAGO[0], "quizás", "❌ No, cancelar compra"],
+        ["/start", "📦 Estado de Pedido", "P0000000000000", "Calle Principal 5", "volver al menú"],
+        ["/start", "👨‍💼 Contacto Humano", "Hola, mi pedido no llegó a la calle Principal", "menu"],
+        ["/start", "⚙️ Configuración", "algo", "volver", "🎯 Promociones", "❓ Preguntas Frecuentes"],
+        ["/start", "💧 Comprar Agua", "/cancel", "hola"],
+    ]
+
+def normalizar(texto):
+    return _ETA.sub("<eta>", _FECHA.sub("<fecha>", _PEDIDO_ID.sub("<pedido>", texto)))
+
+async def conversar(enviar, stub, guiones_chats, timeout=30.0):
+    """Enviar cada guion esperando la respuesta a cada mensaje.
+
+    Devuelve la espera de cada respuesta, en segundos. "hola" tras /cancel no
+    tiene respuesta (la conversación terminó): no se espera.
+    """
+    esperas = []
+    update_id = 0
+    async with httpx.AsyncClient(timeout=timeout) as http:
+        for i, guion in enumerate(guiones_chats):
+            chat = str(BASE_CHAT + i)
+            pedido = None
+            terminada = False
+            for texto in guion:
+                if PEDIDO in texto:
+                    texto = texto.replace(PEDIDO, pedido)
+                update_id += 1
+                previas = len((await http.get(f"{stub}/conversaciones")).json().get(chat, []))
+                inicio = time.perf_counter()
+                await enviar(http, actualizacion(update_id, BASE_CHAT + i, texto))
+                if terminada:
+                    continue
+                while True:
+                    respuestas = (await http.get(f"{stub}/conversaciones")).json().get(chat, [])
+                    if len(respuestas) > previas:
+                        break
+                    if time.perf_counter() - inicio > timeout:
+                        raise RuntimeError(f"Sin respuesta a {texto!r} en el chat {chat}")
+                    await asyncio.sleep(0.001)
+                esperas.append(time.perf_counter() - inicio)
+                encontrado = _PEDIDO_ID.search(respuestas[-1])
+                if encontrado and "CONFIRMADO" in respuestas[-1]:
+                    pedido = encontrado.group()
+                terminada = texto == "/cancel"
+        # Por si algún update produjo más de un mensaje
+        await asyncio.sleep(0.2)
+        return esperas, (await http.get(f"{stub}/conversaciones")).json()
+
+def correr_modo(script, guiones_chats, args, entorno):
+    stub_port = puerto_libre()
+    stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port),
+                   "--latencia", str(args.latencia_api)], stub_port)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    port = puerto_libre()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cada modo con su propia base
+        env = dict(entorno_bot(stub_port, port), **entorno)
+        env["DB_PATH"] = os.path.join(tmp, "modos.db")
+        try:
+            if script == "bot.py":
+                proc = subprocess.Popen(
+                    [sys.executable, script], cwd=RAIZ, env=dict(os.environ, PYTHONUNBUFFERED="1", **env),
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                # Listo cuando hace el primer getUpdates
+                limite = time.monotonic() + 30
+                while not httpx.get(f"{stub_url}/contador").json()["metodos"].get("getUpdates"):
+                    if time.monotonic() > limite or proc.poll() is not None:
+                        raise RuntimeError("bot.py no empezó a hacer polling")
+                    time.sleep(0.01)
+
+                async def enviar(http, datos):
+                    (await http.post(f"{stub_url}/actualizaciones", json=[datos])).raise_for_status()
+            else:
+                proc = lanzar([script], port, env)
+
+                async def enviar(http, datos):
+                    (await http.post(f"http://127.0.0.1:{port}/{TOKEN_PRUEBA}", json=datos)).raise_for_status()
+
+            inicio = time.perf_counter()
+            esperas, conversaciones = asyncio.run(conversar(enviar, stub_url, guiones_chats))
+            duracion = time.perf_counter() - inicio
+        finally:
+            proc.terminate()
+            proc.wait()
+            stub.terminate()
+            stub.wait()
+    transcripciones = {chat: [normalizar(t) for t in textos] for chat, textos in conversaciones.items()}
+    return transcripciones, esperas, duracion
+
+def comparar(referencia, nombre_ref, otra, nombre):
+    """Primera diferencia entre dos transcripciones, o None"""
+    for chat in sorted(set(referencia) | set(otra)):
+        a, b = referencia.get(chat, []), otra.get(chat, [])
+        for i in range(max(len(a), len(b))):
+            ta = a[i] if i < len(a) else "(nada)"
+            tb = b[i] if i < len(b) else "(nada)"
+            if ta != tb:
+                return f"chat {chat}, respuesta {i + 1}:\n  {nombre_ref}: {ta[:120]!r}\n  {nombre}: {tb[:120]!r}"
+    return None
+
+# --- Costo del despacho ---
+
+def textos_por_estado(productos):
+    from catalogo import etiqueta
+    return {
+        "MENU": ["💧 Comprar Agua", "🕐 Horarios", "🔙 Menú Principal"],
+        "SELECCION_PRODUCTO": [etiqueta(productos[0]), "pagar", "🔙 Menú Principal"],
+        "CANTIDAD": ["3", "🔙 Menú Principal"],
+        "DATOS_ENVIO": ["Juan Pérez\nCalle Principal #123\n555-123-4567", "🔙 Menú Principal"],
+        "METODO_PAGO": [METODOS_PAGO[0], "🔙 Atrás", "menu"],
+        "CONFIRMACION": ["✅ Sí, confirmar pedido", "❌ No, cancelar compra"],
+        "ESTADO_PEDIDO": ["P0A8WJS4XR0000", "menu"],
+        "CONTACTO": ["Hola, necesito ayuda con mi pedido", "menu"],
+        "CONFIGURACION": ["algo", "volver"],
+    }
+
+async def costo_despacho(productos, repeticiones):
+    os.environ.setdefault("BOT_TOKEN", TOKEN_PRUEBA)
+    from telegram import Update
+    import bot
+    from flujo import Paso, compilar
+
+    async def nada(update, context):
+        return None
+
+    vacio = {
+        estado: Paso(nada, [(intencion, nada) for intencion, _ in paso.rutas], paso.texto_libre)
+        for estado, paso in bot.FLUJO.items()
+    }
+    conversacion = compilar(vacio, bot.NOMBRES_ESTADOS, nada, nada)
+    estados = {nombre: estado for estado, nombre in bot.NOMBRES_ESTADOS.items()}
+
+    print(f"\n{'estado':<20} {'rutas':>5} {'µs/update':>10}")
+    for nombre, textos in textos_por_estado(productos).items():
+        estado = estados[nombre]
+        updates = [Update.de_json(actualizacion(i, 1, t), None) for i, t in enumerate(textos)]
+        conversacion._conversations[(1, 1)] = estado
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for update in updates:
+                _, _, handler, _ = conversacion.check_update(update)
+                await handler.callback(update, None)
+        duracion = time.perf_counter() - inicio
+        print(f"{nombre:<20} {len(bot.FLUJO[estado].rutas):>5} "
+              f"{duracion / (repeticiones * len(updates)) * 1e6:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    parser.add_argument("--latencia-api", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        productos, entorno = preparar_entorno(tmp)
+        guiones_chats = guiones(productos)
+        total = sum(len(g) for g in guiones_chats)
+        print(f"{len(guiones_chats)} guiones, {total} mensajes")
+
+        resultados = []
+        for nombre, script in (("polling (bot.py)", "bot.py"), ("Flask (server.py)", "server.py"),
+                               ("Tornado (server_async.py)", "server_async.py")):
+            transcripciones, esperas, duracion = correr_modo(script, guiones_chats, args, entorno)
+            confirmados = sum(t.count("🎉 **¡PEDIDO CONFIRMADO!**") for textos in transcripciones.values()
+                              for t in textos)
+            print(f"{nombre:<26} {len(esperas):>4} respuestas en {duracion:>5.2f} s   "
+                  f"p50 {percentil(esperas, 50) * 1000:>6.2f} ms   p99 {percentil(esperas, 99) * 1000:>6.2f} ms   "
+                  f"{confirmados} pedido(s) confirmado(s)")
+            resultados.append((nombre, transcripciones))
+
+    nombre_ref, referencia = resultados[0]
+    diferencias = [comparar(referencia, nombre_ref, t, n) for n, t in resultados[1:]]
+    diferencias = [d for d in diferencias if d]
+    if diferencias:
+        print("\n❌ Las respuestas difieren entre modos:\n" + "\n".join(diferencias))
+    else:
+        respuestas = sum(len(textos) for textos in referencia.values())
+        print(f"✅ {respuestas} respuestas idénticas en los tres modos")
+
+    asyncio.run(costo_despacho(productos, args.repeticiones))
+    if diferencias:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Latencia de inserción y consulta del repositorio de pedidos con N pedidos guardados.
+
+Uso: python benchmarks/bench_pedidos.py [--pedidos 1000000] [--muestras 2000]
+
+Crea una base temporal; no toca DB_PATH.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from comun import percentil
+from basedatos import BaseSQLite
+from repositorio_pedidos import RepositorioSQLite
+
+ESTADOS = ["pendiente", "preparación", "en ruta", "entregado"]
+
+def pedido_sintetico(i):
+    return {
+        "id": f"P{i:012d}",
+        "user_id": 1000 + i % 50000,
+        "productos": [{"producto_id": "2", "nombre": "Agua Mineral 600ml",
+                       "precio_unitario": 15.0, "cantidad": 3, "subtotal": 45.0}],
+        "total": 45.0,
+        "datos_envio": "Juan Pérez\nCalle Principal #123\n555-123-4567",
+        "metodo_pago": "💰 Pago contra Entrega",
+        "estado": ESTADOS[i % len(ESTADOS)],
+        "fecha": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00",
+        "tiempo_entrega": "2-3 horas",
+    }
+
+def informe(nombre, latencias):
+    print(
+        f"{nombre:<14} p50 {percentil(latencias, 50) * 1e6:>8.1f} µs   "
+        f"p99 {percentil(latencias, 99) * 1e6:>8.1f} µs"
+    )
+
+async def medir(repo, n, muestras):
+    inicio = time.perf_counter()
+    lote = 10000
+    for desde in range(0, n, lote):
+        await repo.guardar_lote([pedido_sintetico(i) for i in range(desde, min(n, desde + lote))])
+    print(f"Carga inicial de {n} pedidos: {time.perf_counter() - inicio:.1f} s")
+
+    insercion, consulta, usuario = [], [], []
+    for j in range(muestras):
+        pedido = pedido_sintetico(n + j)
+        t = time.perf_counter()
+        await repo.guardar(pedido)
+        insercion.append(time.perf_counter() - t)
+
+        pedido_id = f"P{random.randrange(n):012d}"
+        t = time.perf_counter()
+        assert await repo.obtener(pedido_id)
+        consulta.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        await repo.por_usuario(1000 + random.randrange(50000))
+        usuario.append(time.perf_counter() - t)
+
+    informe("guardar", insercion)
+    informe("obtener(id)", consulta)
+    informe("por_usuario", usuario)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pedidos", type=int, default=1_000_000)
+    parser.add_argument("--muestras", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "bench.db"))
+        try:
+            asyncio.run(medir(RepositorioSQLite(base), args.pedidos, args.muestras))
+        finally:
+            base.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Costo de volcado por update de la persistencia SQLite: agrupado vs. uno por update.
+
+Uso: python benchmarks/bench_persistencia.py [--updates 20000] [--lote 200]
+
+Cada update simulado cambia user_data, el estado de la conversación y el
+carrito de un usuario, como un paso del flujo de compra.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+from basedatos import BaseSQLite
+from persistencia import PersistenciaSQLite
+from carrito import Carrito
+
+def datos(i):
+    return (
+        {"producto_actual": {"id": "2", "nombre": "Agua Mineral 600ml", "precio": 15.0},
+         "datos_envio": f"Usuario {i}\nCalle {i}\n555-{i:04d}"},
+        Carrito.desde_dict({"lineas": [["2", "Agua Mineral 600ml", 1500, 3]]}),
+    )
+
+async def un_update(p, i):
+    user_data, carrito = datos(i)
+    await asyncio.gather(
+        p.update_user_data(i, user_data),
+        p.update_conversation("conversacion", (i, i), 3),
+    )
+    await p.carritos.guardar(i, carrito)
+
+async def medir(ruta, updates, lote):
+    base = BaseSQLite(ruta)
+    p = PersistenciaSQLite(base)
+    try:
+        inicio = time.perf_counter()
+        for i in range(updates):
+            await un_update(p, i)
+            await p.escribir()
+        individual = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for desde in range(0, updates, lote):
+            await asyncio.gather(*(un_update(p, i) for i in range(desde, desde + lote)))
+        await p.escribir()
+        agrupado = time.perf_counter() - inicio
+    finally:
+        base.cerrar()
+
+    print(f"Volcado por update:        {individual / updates * 1e6:>8.1f} µs/update")
+    print(f"Volcado agrupado (x{lote}): {agrupado / updates * 1e6:>8.1f} µs/update")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--lote", type=int, default=200)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(medir(os.path.join(tmp, "bench.db"), args.updates, args.lote))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Reparto: parseo de direcciones, armado de lotes y precisión de la hora estimada.
+
+Uso: python benchmarks/bench_reparto.py [--direcciones 20000] [--pendientes 1000,5000,20000] [--zonas 200] [--por-hora 12] [--zonas-dia 4] [--horas 8]
+
+Todo con datos locales en una base temporal; no toca DB_PATH.
+
+1. reparto.parsear_envio() con --direcciones direcciones sintéticas en
+   formatos variados: µs por dirección y cuántas caen en la zona correcta
+2. Para cada cantidad de --pendientes pedidos sin lote repartidos en
+   --zonas zonas: ms de Reparto.agrupar() (un tick de la JobQueue), lotes
+   armados, µs de registrar() (la estimación al confirmar) y minutos hasta
+   la entrega estimada de todos
+3. Un día simulado de --horas horas a --por-hora pedidos por hora en
+   --zonas-dia zonas con un tick cada REPARTO_INTERVALO y los parámetros
+   REPARTO_*: cuánto tarda la entrega, cuántas caen en "2-3 horas" y la
+   hora prometida al confirmar contra la que queda al armar el lote
+4. Una zona con más de REPARTO_CAPACIDAD pedidos seguidos (un pedido por
+   minuto): la hora estimada al confirmar de cada lote; el segundo lote
+   empieza su propio recorrido en vez de encadenarse detrás del primero
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from comun import percentil
+from basedatos import BaseSQLite
+from reparto import ESQUEMA, Parametros, Reparto, parsear_envio, zona
+
+NOMBRES = ["Juan Pérez", "María López", "Ana Torres", "Luis Hernández", "Sofía Martínez", "Carlos Ruiz"]
+CALLES = ["Av. Carranza", "Calle Hidalgo", "Himno Nacional", "Av. Salvador Nava", "Calle 5 de Mayo", "Av. Universidad"]
+COLONIAS = ["Centro", "Tequisquiapan", "Jardín", "Lomas", "San Sebastián", "Las Águilas", "Del Valle", "Polanco"]
+
+def direccion_sintetica(aleatorio, zonas):
+    """(texto, zona esperada): la mitad con código postal (a veces después de
+    un número de casa de cinco cifras), un cuarto solo con colonia y un
+    cuarto sin ninguno de los dos"""
+    codigo_postal = f"{78000 + aleatorio.randrange(zonas) * 10:05d}"
+    colonia = aleatorio.choice(COLONIAS)
+    forma = aleatorio.randrange(4)
+    calle = f"{aleatorio.choice(CALLES)} {aleatorio.randint(1, 30000 if forma < 2 else 3000)}"
+    telefono = aleatorio.choice(["444-{}-{}", "444 {} {}", "(444) {}-{}", "+52 444 {} {}", "444{}{}"]).format(
+        aleatorio.randint(100, 999), aleatorio.randint(1000, 9999))
+    nombre = aleatorio.choice(NOMBRES)
+    if forma == 0:
+        return f"{nombre}\n{calle}, Col. {colonia}, C.P. {codigo_postal}\nTel: {telefono}", codigo_postal
+    if forma == 1:
+        return f"{nombre}\n{calle} {codigo_postal}\n{telefono}", codigo_postal
+    if forma == 2:
+        return f"{calle} colonia {colonia} {telefono}", zona({"codigo_postal": None, "colonia": colonia})
+    return f"{nombre}\n{calle}\n{telefono}", "sin zona"
+
+def parseo(n):
+    aleatorio = random.Random(1)
+    direcciones = [direccion_sintetica(aleatorio, 500) for _ in range(n)]
+    inicio = time.perf_counter()
+    zonas = [zona(parsear_envio(texto)) for texto, _ in direcciones]
+    duracion = time.perf_counter() - inicio
+    correctas = sum(z == esperada for z, (_, esperada) in zip(zonas, direcciones))
+    print(f"parsear_envio: {duracion / n * 1e6:.1f} µs/dirección, zona correcta en {correctas}/{n}")
+
+def sembrar(base, pendientes, zonas, ahora, aleatorio):
+    """Pedidos sin lote, con la zona ya resuelta (sin pasar por registrar)"""
+    filas = [
+        (f"P{i:013d}", f"{78000 + aleatorio.randrange(zonas) * 10:05d}", ahora - aleatorio.uniform(0, 3600), ahora)
+        for i in range(pendientes)
+    ]
+    base.conexion.executescript(ESQUEMA)
+    with base.conexion:
+        base.conexion.execute("DELETE FROM entregas")
+        base.conexion.execute("DELETE FROM lotes")
+        base.conexion.executemany(
+            "INSERT INTO entregas (pedido_id, zona, creada, eta) VALUES (?, ?, ?, ?)", filas
+        )
+
+async def lotes(base, cantidades, zonas):
+    aleatorio = random.Random(2)
+    print(f"\n{'pendientes':>10} {'agrupar ms':>11} {'lotes':>6} {'registrar µs p50':>17} {'p99':>8} "
+          f"{'entrega min p50':>16} {'p90':>6} {'máx':>6}")
+    for pendientes in cantidades:
+        ahora = time.time()
+        sembrar(base, pendientes, zonas, ahora, aleatorio)
+        reparto = Reparto(base)
+        inicio = time.perf_counter()
+        armados, _ = await reparto.agrupar(ahora)
+        duracion = time.perf_counter() - inicio
+
+        # La estimación al confirmar, con lo que dejó el tick
+        latencias = []
+        for i in range(200):
+            texto, _ = direccion_sintetica(aleatorio, zonas)
+            inicio = time.perf_counter()
+            await reparto.registrar({"id": f"Q{i:013d}", "datos_envio": texto}, ahora)
+            latencias.append(time.perf_counter() - inicio)
+        minutos = [(eta - ahora) / 60 for (eta,) in base.conexion.execute(
+            "SELECT eta FROM entregas")]
+        print(f"{pendientes:>10} {duracion * 1000:>11.1f} {armados:>6} "
+              f"{percentil(latencias, 50) * 1e6:>17.0f} {percentil(latencias, 99) * 1e6:>8.0f} "
+              f"{percentil(minutos, 50):>16.0f} {percentil(minutos, 90):>6.0f} {max(minutos):>6.0f}")
+
+async def dia(base, por_hora, horas, zonas):
+    """Pedidos llegando al azar, ticks cada intervalo, en tiempo simulado"""
+    parametros = Parametros()
+    reparto = Reparto(base, parametros)
+    with base.conexion:
+        base.conexion.execute("DELETE FROM entregas")
+        base.conexion.execute("DELETE FROM lotes")
+    aleatorio = random.Random(3)
+    inicio = 1760000000.0
+    ahora = inicio
+    siguiente_tick = inicio + parametros.intervalo
+    prometidas = {}
+    i = 0
+    while ahora < inicio + horas * 3600:
+        ahora += aleatorio.expovariate(por_hora / 3600)
+        while siguiente_tick <= ahora:
+            await reparto.agrupar(siguiente_tick)
+            siguiente_tick += parametros.intervalo
+        texto, _ = direccion_sintetica(aleatorio, zonas)
+        pedido_id = f"P{i:013d}"
+        prometidas[pedido_id] = (ahora, await reparto.registrar({"id": pedido_id, "datos_envio": texto}, ahora))
+        i += 1
+    # Sin pedidos nuevos, hasta que salgan todos los lotes
+    while base.conexion.execute("SELECT 1 FROM entregas WHERE lote IS NULL LIMIT 1").fetchone():
+        await reparto.agrupar(siguiente_tick)
+        siguiente_tick += parametros.intervalo
+
+    errores, demoras, dentro = [], [], 0
+    for pedido_id, eta in base.conexion.execute("SELECT pedido_id, eta FROM entregas WHERE lote IS NOT NULL"):
+        confirmado, prometida = prometidas[pedido_id]
+        errores.append(abs(eta - prometida) / 60)
+        demora = (eta - confirmado) / 60
+        demoras.append(demora)
+        dentro += 120 <= demora <= 180
+    lotes_dia, por_lote = base.conexion.execute("SELECT COUNT(*), AVG(pedidos) FROM lotes").fetchone()
+    print(f"\nDía simulado: {len(prometidas)} pedidos en {horas} h, {zonas} zonas, "
+          f"{parametros.vehiculos} vehículos de {parametros.capacidad}: {lotes_dia} lotes de {por_lote:.1f} pedidos")
+    print(f"  entrega tras confirmar: p50 {percentil(demoras, 50):.0f} min, p90 {percentil(demoras, 90):.0f} min, "
+          f"máx {max(demoras):.0f} min; dentro de \"2-3 horas\": {dentro}/{len(demoras)}")
+    print(f"  hora prometida al confirmar vs la del lote: error p50 {percentil(errores, 50):.0f} min, "
+          f"p90 {percentil(errores, 90):.0f} min")
+
+async def zona_llena(base):
+    parametros = Parametros()
+    reparto = Reparto(base, parametros)
+    with base.conexion:
+        base.conexion.execute("DELETE FROM entregas")
+        base.conexion.execute("DELETE FROM lotes")
+    inicio = 1760000000.0
+    texto = "Juan Pérez\nCalle Hidalgo 12, Col. Centro, C.P. 78000\n444-123-4567"
+    pedidos = 2 * parametros.capacidad + 3
+    etas = [await reparto.registrar({"id": f"Z{i:013d}", "datos_envio": texto}, inicio + 60 * i)
+            for i in range(pedidos)]
+    print(f"\nUna zona, {pedidos} pedidos en lotes de {parametros.capacidad}:")
+    for n, i in enumerate(range(0, pedidos, parametros.capacidad), 1):
+        lote = etas[i:i + parametros.capacidad]
+        print(f"  lote {n}: entrega a los {(lote[0] - inicio) / 60:.0f}-{(lote[-1] - inicio) / 60:.0f} min")
+    for i in range(parametros.capacidad, pedidos, parametros.capacidad):
+        if etas[i] == etas[i - 1] + parametros.parada:
+            raise SystemExit(f"❌ el pedido {i + 1} abre lote pero se encadenó al lote anterior")
+        if etas[i + 1] != etas[i] + parametros.parada:
+            raise SystemExit(f"❌ el pedido {i + 2} no sigue al primero de su lote")
+    print("  ✅ cada lote nuevo estima desde su propia salida")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--direcciones", type=int, default=20000)
+    parser.add_argument("--pendientes", default="1000,5000,20000")
+    parser.add_argument("--zonas", type=int, default=200)
+    parser.add_argument("--por-hora", type=float, default=12)
+    parser.add_argument("--zonas-dia", type=int, default=4)
+    parser.add_argument("--horas", type=float, default=8)
+    args = parser.parse_args()
+
+    parseo(args.direcciones)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "reparto.db"))
+        try:
+            asyncio.run(lotes(base, [int(n) for n in args.pendientes.split(",")], args.zonas))
+            asyncio.run(dia(base, args.por_hora, args.horas, args.zonas_dia))
+            asyncio.run(zona_llena(base))
+        finally:
+            base.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Reporte de ventas y exportación: pedidos/s y memoria recorriendo millones de pedidos.
+
+Uso: python benchmarks/bench_reportes.py [--pedidos 10000000] [--ingenuo 200000] [--exportar csv.gz,csv,parquet]
+
+Carga --pedidos pedidos sintéticos (1 a 3 líneas, un año de fechas) en una
+base temporal; no toca DB_PATH.
+
+1. reportes.calcular_ventas() sobre todos: segundos, pedidos/s y pico de
+   memoria (tracemalloc, en una pasada aparte), contra cargar todos los
+   pedidos en una lista y sumar después (solo con los primeros --ingenuo,
+   la memoria crece con cada pedido). Los ingresos, y la suma de lo de
+   cada producto (con el descuento de las promociones), tienen que
+   coincidir con SUM(total) de SQLite
+2. La misma pasada exportando cada formato de --exportar (parquet solo
+   con pyarrow instalado): segundos, tamaño y filas
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+from basedatos import BaseSQLite
+from repositorio_pedidos import RepositorioSQLite
+from carrito import promocion_de
+import reportes
+
+PRODUCTOS = [("1", "Agua Mineral 355ml", 10.0), ("2", "Agua Mineral 600ml", 15.0),
+             ("3", "Agua Mineral 1.5L", 25.0), ("4", "Garrafón 20L", 45.0)]
+METODOS = ["💳 Tarjeta de Crédito/Débito", "💰 Pago contra Entrega", "🏦 Transferencia Bancaria"]
+ESTADOS = ["pendiente", "preparación", "en ruta", "entregado"]
+
+def pedido_sintetico(i, n, aleatorio):
+    lineas = []
+    for producto_id, nombre, precio in aleatorio.sample(PRODUCTOS, aleatorio.randint(1, 3)):
+        cantidad = aleatorio.randint(1, 24)
+        promocion = promocion_de(nombre)
+        descuento = promocion.descuento(round(precio * 100), cantidad) / 100 if promocion else 0.0
+        lineas.append({"producto_id": producto_id, "nombre": nombre, "precio_unitario": precio,
+                       "cantidad": cantidad, "subtotal": precio * cantidad, "descuento": descuento})
+    # Los n pedidos repartidos en 2025
+    segundo = i * 365 * 86400 // n
+    return {
+        "id": f"P{i:013d}",
+        "user_id": 1000 + aleatorio.randrange(200000),
+        "productos": lineas,
+        "total": sum(l["subtotal"] - l["descuento"] for l in lineas),
+        "datos_envio": "Juan Pérez\nCalle Principal #123\n555-123-4567",
+        "metodo_pago": aleatorio.choice(METODOS),
+        "estado": ESTADOS[i % len(ESTADOS)],
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1735689600 + segundo)),
+        "tiempo_entrega": "2-3 horas",
+    }
+
+async def cargar(repositorio, n):
+    aleatorio = random.Random(1)
+    lote = 20000
+    for desde in range(0, n, lote):
+        await repositorio.guardar_lote([pedido_sintetico(i, n, aleatorio) for i in range(desde, min(n, desde + lote))])
+
+class Limitado:
+    """Los primeros `maximo` pedidos de otro repositorio"""
+
+    def __init__(self, repositorio, maximo):
+        self.repositorio = repositorio
+        self.maximo = maximo
+
+    async def recorrer(self, desde, hasta):
+        vistos = 0
+        async for pedidos in self.repositorio.recorrer(desde, hasta):
+            yield pedidos[:self.maximo - vistos]
+            vistos += len(pedidos)
+            if vistos >= self.maximo:
+                return
+
+async def ingenuo(repositorio):
+    """Todo a una lista y después sumar"""
+    todos = []
+    async for pedidos in repositorio.recorrer(reportes.DESDE_SIEMPRE, reportes.HASTA_SIEMPRE):
+        todos.extend(pedidos)
+    ventas = reportes.Ventas()
+    ventas.agregar(todos)
+    return ventas
+
+def pico(corrutina):
+    tracemalloc.start()
+    try:
+        asyncio.run(corrutina)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pedidos", type=int, default=10_000_000)
+    parser.add_argument("--ingenuo", type=int, default=200_000)
+    parser.add_argument("--exportar", default="csv.gz,csv,parquet")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = BaseSQLite(os.path.join(tmp, "reportes.db"))
+        repositorio = RepositorioSQLite(base)
+        inicio = time.perf_counter()
+        asyncio.run(cargar(repositorio, args.pedidos))
+        print(f"Carga de {args.pedidos} pedidos: {time.perf_counter() - inicio:.1f} s, "
+              f"{os.path.getsize(base.ruta) / 2**20:.0f} MiB")
+
+        inicio = time.perf_counter()
+        ventas = asyncio.run(reportes.calcular_ventas(repositorio=repositorio))
+        duracion = time.perf_counter() - inicio
+        (esperado,) = base.conexion.execute("SELECT SUM(CAST(ROUND(total * 100) AS INTEGER)) FROM pedidos").fetchone()
+        print(f"\n{'':<30} {'s':>7} {'pedidos/s':>10} {'pico MiB':>9}")
+        print(f"{'calcular_ventas (por lotes)':<30} {duracion:>7.1f} {ventas.pedidos / duracion:>10.0f} "
+              f"{pico(reportes.calcular_ventas(repositorio=repositorio)) / 2**20:>9.1f}")
+
+        limitado = Limitado(repositorio, args.ingenuo)
+        inicio = time.perf_counter()
+        asyncio.run(ingenuo(limitado))
+        duracion_ingenuo = time.perf_counter() - inicio
+        memoria = pico(ingenuo(limitado))
+        print(f"{'lista completa':<30} {duracion_ingenuo:>7.1f} {args.ingenuo / duracion_ingenuo:>10.0f} "
+              f"{memoria / 2**20:>9.1f}   (solo {args.ingenuo} pedidos; con {args.pedidos}: "
+              f"~{memoria / args.ingenuo * args.pedidos / 2**30:.1f} GiB)")
+        print(f"ingresos {reportes.formato(ventas.ingresos)} "
+              f"{'✅ igual' if ventas.ingresos == esperado else '❌ distinto'} que SUM(total) en SQLite; "
+              f"{len(ventas.por_dia)} días, {len(ventas.por_producto)} productos, {len(ventas.por_metodo)} métodos")
+        por_producto = sum(centavos for _, centavos, _ in ventas.por_producto.values())
+        print(f"suma por producto {reportes.formato(por_producto)} "
+              f"{'✅ igual' if por_producto == esperado else '❌ distinta'} (con "
+              f"{sum(1 for p in PRODUCTOS if promocion_de(p[1]))} producto(s) en promoción)")
+
+        print(f"\n{'exportar':<30} {'s':>7} {'pedidos/s':>10} {'MiB':>9}")
+        for extension in filter(None, args.exportar.split(",")):
+            ruta = os.path.join(tmp, f"pedidos.{extension}")
+            inicio = time.perf_counter()
+            try:
+                asyncio.run(reportes.calcular_ventas(ruta=ruta, repositorio=repositorio))
+            except ValueError as e:
+                print(f"{extension:<30} {e}")
+                continue
+            duracion = time.perf_counter() - inicio
+            print(f"{extension:<30} {duracion:>7.1f} {args.pedidos / duracion:>10.0f} "
+                  f"{os.path.getsize(ruta) / 2**20:>9.1f}")
+            os.remove(ruta)
+        base.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Respuesta directa en el webhook vs. envío aparte: tiempo hasta que la respuesta sale.
+
+Uso: python benchmarks/bench_respuesta_directa.py [--peticiones 1000] [--tasa 100] [--concurrencia 20] [--latencia-api 0.05]
+
+Cada petición es un /start de un usuario nuevo (handler de una sola respuesta).
+La respuesta "sale" cuando el stub recibe el sendMessage o, en modo directo,
+cuando el webhook devuelve el sendMessage en su cuerpo. --latencia-api simula
+la ida y vuelta a api.telegram.org.
+
+Los dos modos reciben la misma carga: una petición cada 1/--tasa segundos
+sin esperar respuestas (como los updates que llegan de Telegram), con a lo
+sumo --concurrencia conexiones abiertas; la latencia cuenta desde que la
+petición "llega", incluida la espera por una conexión. El ahorro de la
+respuesta directa se compara con la ida y vuelta de un sendMessage al stub,
+medida aparte.
+"""
+import time
+import asyncio
+import argparse
+import httpx
+
+from comun import (
+    TOKEN_PRUEBA, actualizacion, entorno_bot, lanzar, percentil, puerto_libre
+)
+
+async def ida_y_vuelta(stub, veces=50):
+    """p50 de un sendMessage al stub (lo que ahorra no hacerlo desde el bot)"""
+    async with httpx.AsyncClient(timeout=60) as http:
+        tiempos = []
+        for _ in range(veces):
+            inicio = time.perf_counter()
+            r = await http.post(f"{stub}/bot{TOKEN_PRUEBA}/sendMessage", json={"chat_id": 0, "text": "ping"})
+            r.raise_for_status()
+            tiempos.append(time.perf_counter() - inicio)
+    return percentil(tiempos, 50)
+
+async def cargar(url, stub, peticiones, tasa, concurrencia, primer_usuario):
+    inicios = {}
+    directas = {}
+
+    async def enviar(http, i, user_id):
+        r = await http.post(url, json=actualizacion(i + 1, user_id, "/start"))
+        r.raise_for_status()
+        if r.headers.get("Content-Type", "").startswith("application/json"):
+            if r.json().get("method") == "sendMessage":
+                directas[user_id] = time.time()
+
+    limites = httpx.Limits(max_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=60) as http:
+        antes = (await http.get(f"{stub}/contador")).json()["metodos"].get("sendMessage", 0)
+        inicio = time.perf_counter()
+        tareas = []
+        # Llegadas a ritmo fijo, sin esperar respuestas: la misma carga en los dos modos
+        for i in range(peticiones):
+            espera = inicio + i / tasa - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            user_id = primer_usuario + i
+            inicios[user_id] = time.time()
+            tareas.append(asyncio.create_task(enviar(http, i, user_id)))
+        await asyncio.gather(*tareas)
+
+        # Esperar a que lleguen al stub las respuestas que no fueron directas
+        llegadas = {}
+        while len(directas) + len(llegadas) < peticiones:
+            await asyncio.sleep(0.05)
+            todas = (await http.get(f"{stub}/llegadas")).json()
+            llegadas = {int(c): t for c, t in todas.items() if int(c) in inicios and int(c) not in directas}
+        duracion = time.perf_counter() - inicio
+        despues = (await http.get(f"{stub}/contador")).json()["metodos"].get("sendMessage", 0)
+
+    entregas = {**llegadas, **directas}
+    latencias = [entregas[u] - inicios[u] for u in inicios]
+    return latencias, duracion, len(directas), despues - antes
+
+def medir(nombre, script, stub_port, args, directa, primer_usuario):
+    port = puerto_libre()
+    env = entorno_bot(stub_port, port)
+    env["WEBHOOK_RESPUESTA_DIRECTA"] = "1" if directa else "0"
+    proc = lanzar([script], port, env)
+    try:
+        url = f"http://127.0.0.1:{port}/{TOKEN_PRUEBA}"
+        stub = f"http://127.0.0.1:{stub_port}"
+        latencias, duracion, directas, salientes = asyncio.run(
+            cargar(url, stub, args.peticiones, args.tasa, args.concurrencia, primer_usuario)
+        )
+        print(
+            f"{nombre:<32} {args.peticiones / duracion:>6.0f} upd/s   "
+            f"respuesta p50 {percentil(latencias, 50) * 1000:>7.1f} ms   "
+            f"p99 {percentil(latencias, 99) * 1000:>7.1f} ms   "
+            f"{directas} directas, {salientes} sendMessage al Bot API"
+        )
+        return percentil(latencias, 50)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--peticiones", type=int, default=1000)
+    parser.add_argument("--tasa", type=float, default=100, help="peticiones por segundo")
+    parser.add_argument("--concurrencia", type=int, default=20, help="conexiones abiertas a lo sumo")
+    parser.add_argument("--latencia-api", type=float, default=0.05,
+                        help="latencia simulada del Bot API en segundos")
+    args = parser.parse_args()
+
+    stub_port = puerto_libre()
+    stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port),
+                   "--latencia", str(args.latencia_api)], stub_port)
+    try:
+        rtt = asyncio.run(ida_y_vuelta(f"http://127.0.0.1:{stub_port}"))
+        print(f"{args.peticiones} peticiones a {args.tasa:.0f}/s, hasta {args.concurrencia} conexiones; "
+              f"sendMessage al stub: p50 {rtt * 1000:.1f} ms\n")
+        servidores = [("Flask", "server.py"), ("Tornado", "server_async.py")]
+        for n, (nombre, script) in enumerate(servidores):
+            # Usuarios distintos en cada corrida (el stub guarda la primera llegada por chat)
+            aparte = medir(f"{nombre}, envío aparte", script, stub_port, args, False, 100000 * (2 * n + 1))
+            directa = medir(f"{nombre}, respuesta directa", script, stub_port, args, True, 100000 * (2 * n + 2))
+            print(f"{'':<32} ahorro p50 {(aparte - directa) * 1000:.1f} ms "
+                  f"({(aparte - directa) / rtt:.1f} veces la ida y vuelta al stub)")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Memoria residente por usuario activo, antes y después de la limpieza de sesiones.
+
+Uso: python benchmarks/bench_sesiones.py [--usuarios 1000] [--maximo 500]
+
+Cada usuario recorre /start -> Comprar -> producto -> cantidad contra un Bot
+API local; luego se ejecuta la limpieza con SESIONES_EN_MEMORIA=--maximo.
+"""
+import os
+import gc
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+from comun import TOKEN_PRUEBA, actualizacion, puerto_libre
+
+FLUJO = ["/start", "💧 Comprar Agua", "Agua Mineral 600ml - $15.0", "3"]
+
+async def medir(args, stub_port):
+    from tornado.httpserver import HTTPServer
+    from telegram import Update
+    import stub_bot_api
+    import sesiones
+
+    HTTPServer(stub_bot_api.crear_stub()).listen(stub_port, address="127.0.0.1")
+    import server_async
+    app = server_async.application
+    await app.initialize()
+
+    def residente():
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.start()
+    base = residente()
+    update_id = 0
+    for paso in FLUJO:
+        for user_id in range(1, args.usuarios + 1):
+            update_id += 1
+            await app.process_update(Update.de_json(actualizacion(update_id, user_id, paso), app.bot))
+    await app.update_persistence()
+    await app.persistence.escribir()
+    antes = residente() - base
+    residentes_antes = len(app.user_data)
+
+    sesiones.SESIONES_EN_MEMORIA = args.maximo
+    await sesiones.limpiar_sesiones(SimpleNamespace(application=app))
+    despues = residente() - base
+    tracemalloc.stop()
+    await app.shutdown()
+
+    print(f"{args.usuarios} usuarios con carrito")
+    print(f"Antes de limpiar:   {antes / 1024:>8.0f} KiB  ({antes / args.usuarios:>6.0f} B/usuario), "
+          f"{residentes_antes} user_data en memoria")
+    print(f"Después (máx {args.maximo}): {despues / 1024:>8.0f} KiB  ({despues / args.usuarios:>6.0f} B/usuario), "
+          f"{len(app.user_data)} user_data en memoria")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--maximo", type=int, default=500)
+    args = parser.parse_args()
+
+    stub_port = puerto_libre()
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "BOT_TOKEN": TOKEN_PRUEBA,
+        "BOT_API_URL": f"http://127.0.0.1:{stub_port}/bot",
+        "ENVIOS_LIMITADOR": "0",
+        "DB_PATH": os.path.join(tmp, "bench.db"),
+        "SESIONES_EN_MEMORIA": str(args.maximo),
+    })
+    asyncio.run(medir(args, stub_port))
+
+if __name__ == "__main__":
+    main()
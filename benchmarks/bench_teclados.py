@@ -0,0 +1,63 @@
+"""Costo por respuesta de construir y serializar el reply_markup: sin caché vs. registro de teclados.
+
+Uso: python benchmarks/bench_teclados.py [--repeticiones 20000]
+
+"Serializar" replica lo que hace la librería al enviar: to_dict() del
+teclado y json.dumps del parámetro reply_markup.
+"""
+import json
+import time
+import argparse
+import tracemalloc
+from telegram import ReplyKeyboardMarkup
+
+import comun  # noqa: F401  (agrega la raíz del repo al path)
+import bot
+from catalogo import obtener_catalogo
+
+def productos_sin_cache():
+    keyboard = []
+    for id, prod in obtener_catalogo().productos.items():
+        keyboard.append([f"{prod['nombre']} - ${prod['precio']}"])
+    keyboard.append(["🔙 Menú Principal"])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+def principal_sin_cache():
+    return ReplyKeyboardMarkup([
+        ["💧 Comprar Agua", "🎯 Promociones"],
+        ["📦 Estado de Pedido", "🕐 Horarios"],
+        ["⚙️ Configuración", "❓ Preguntas Frecuentes"],
+        ["👨‍💼 Contacto Humano"]
+    ], resize_keyboard=True)
+
+def respuesta(teclado):
+    return json.dumps(teclado().to_dict())
+
+def medir(nombre, teclado, n):
+    respuesta(teclado)
+    inicio = time.perf_counter()
+    for _ in range(n):
+        respuesta(teclado)
+    duracion = (time.perf_counter() - inicio) / n
+
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    conservados = [teclado() for _ in range(100)]
+    despues = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    memoria = sum(s.size_diff for s in despues.compare_to(antes, "filename")) / len(conservados)
+
+    print(f"{nombre:<28} {duracion * 1e6:>7.2f} µs/respuesta   {memoria:>7.0f} B retenidos/respuesta")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=20000)
+    args = parser.parse_args()
+
+    medir("principal sin caché", principal_sin_cache, args.repeticiones)
+    medir("principal registro", bot.main_keyboard, args.repeticiones)
+    medir("productos sin caché", productos_sin_cache, args.repeticiones)
+    medir("productos registro", bot.productos_keyboard, args.repeticiones)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Carga sobre el webhook: Flask + thread (server.py) vs. Tornado nativo (server_async.py).
+
+Uso: python benchmarks/bench_webhook.py [--peticiones 5000] [--concurrencia 50]
+
+Todo corre en local: el Bot API se reemplaza por benchmarks/stub_bot_api.py.
+"""
+import time
+import asyncio
+import argparse
+import httpx
+
+from comun import (
+    TOKEN_PRUEBA, actualizacion, entorno_bot, lanzar, puerto_libre, reporte
+)
+
+async def cargar(url, peticiones, concurrencia):
+    latencias = []
+    rechazadas = 0
+    siguiente = iter(range(peticiones))
+
+    async def cliente(http):
+        nonlocal rechazadas
+        for i in siguiente:
+            cuerpo = actualizacion(i + 1, 1000 + i % 500, "/start")
+            inicio = time.perf_counter()
+            r = await http.post(url, json=cuerpo)
+            latencias.append(time.perf_counter() - inicio)
+            if r.status_code == 503:
+                rechazadas += 1
+            else:
+                r.raise_for_status()
+
+    limites = httpx.Limits(max_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=30) as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concurrencia)))
+        return latencias, time.perf_counter() - inicio, rechazadas
+
+def medir(nombre, script, stub_port, args):
+    port = puerto_libre()
+    proc = lanzar([script], port, entorno_bot(stub_port, port))
+    try:
+        url = f"http://127.0.0.1:{port}/{TOKEN_PRUEBA}"
+        asyncio.run(cargar(url, args.peticiones // 10, args.concurrencia))  # calentamiento
+        latencias, duracion, rechazadas = asyncio.run(
+            cargar(url, args.peticiones, args.concurrencia)
+        )
+        reporte(nombre, latencias, duracion)
+        if rechazadas:
+            print(f"{'':<22} {rechazadas} rechazadas con 503 (cola llena)")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--peticiones", type=int, default=5000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia-api", type=float, default=0.02,
+                        help="latencia simulada del Bot API en segundos")
+    args = parser.parse_args()
+
+    stub_port = puerto_libre()
+    stub = lanzar(["benchmarks/stub_bot_api.py", "--port", str(stub_port),
+                   "--latencia", str(args.latencia_api)], stub_port)
+    try:
+        medir("Flask + thread", "server.py", stub_port, args)
+        medir("Tornado nativo", "server_async.py", stub_port, args)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+if __name__ == "__main__":
+    main()
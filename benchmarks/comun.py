@@ -0,0 +1,106 @@
+"""Utilidades compartidas por los benchmarks."""
+import os
+import sys
+import time
+import socket
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_PRUEBA = "123456:PRUEBA"
+
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+def actualizacion(update_id, user_id, text):
+    """JSON de un Update de texto en chat privado, como lo envía Telegram"""
+    usuario = {"id": user_id, "is_bot": False, "first_name": f"Usuario{user_id}"}
+    mensaje = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": usuario["first_name"]},
+        "from": usuario,
+        "text": text,
+    }
+    if text.startswith("/"):
+        comando = text.split()[0]
+        mensaje["entities"] = [{"type": "bot_command", "offset": 0, "length": len(comando)}]
+    return {"update_id": update_id, "message": mensaje}
+
+METODOS_PAGO = ["💳 Tarjeta de Crédito/Débito", "💰 Pago contra Entrega", "🏦 Transferencia Bancaria"]
+
+def flujo_compra(user_id, producto, cantidad, metodo_pago):
+    """Textos de una compra completa, de /start a la confirmación"""
+    return [
+        "/start",
+        "💧 Comprar Agua",
+        f"{producto['nombre']} - ${producto['precio']}",
+        str(cantidad),
+        "pagar",
+        f"Usuario {user_id}\nCalle Principal #{user_id}\n555-{user_id % 10000:04d}",
+        metodo_pago,
+        "✅ Sí, confirmar pedido",
+    ]
+
+def memoria_rss(pid="self"):
+    """Memoria residente actual del proceso en bytes (Linux)"""
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) * 1024
+    return 0
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def esperar_puerto(port, timeout=20.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"El puerto {port} no respondió en {timeout}s")
+
+def lanzar(args, port, env=None):
+    """Arrancar un proceso Python del repo y esperar a que abra su puerto"""
+    entorno = dict(os.environ, PYTHONUNBUFFERED="1", **(env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, *args], cwd=RAIZ, env=entorno,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_puerto(port)
+    except RuntimeError:
+        proc.kill()
+        raise
+    return proc
+
+def entorno_bot(stub_port, port):
+    return {
+        "BOT_TOKEN": TOKEN_PRUEBA,
+        "BOT_API_URL": f"http://127.0.0.1:{stub_port}/bot",
+        "PORT": str(port),
+        # El stub no impone los límites de Telegram: medir la capacidad del bot
+        "ENVIOS_LIMITADOR": "0",
+        # Los usuarios sintéticos escriben mucho más rápido que una persona
+        "FLOOD_CONTROL": "0",
+    }
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+def reporte(nombre, latencias, duracion):
+    """Imprimir throughput y percentiles (latencias en segundos)"""
+    n = len(latencias)
+    print(
+        f"{nombre:<22} {n / duracion:>9.0f} req/s   "
+        f"p50 {percentil(latencias, 50) * 1000:>7.2f} ms   "
+        f"p99 {percentil(latencias, 99) * 1000:>7.2f} ms"
+    )
@@ -0,0 +1,171 @@
+"""Bot API de Telegram falso para pruebas de carga sin red.
+
+Uso: python benchmarks/stub_bot_api.py --port 8081 [--latencia 0.05] [--limite 30] [--bloqueados 10]
+
+Los bots deben usar BOT_API_URL=http://127.0.0.1:8081/bot
+
+Para polling, getUpdates entrega lo que se cargue con POST /actualizaciones
+(una lista de Updates en JSON). GET /conversaciones devuelve los textos
+enviados a cada chat, en orden.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from tornado.web import Application as TornadoApp, RequestHandler
+from tornado.httpserver import HTTPServer
+
+BOT_INFO = {
+    "id": 1, "is_bot": True, "first_name": "Stub",
+    "username": "stub_bot", "can_join_groups": False,
+    "can_read_all_group_messages": False, "supports_inline_queries": False,
+}
+
+contador = {"total": 0, "metodos": {}, "rechazos_429": 0}
+# chat_id -> instante (time.time) del primer envío recibido para ese chat
+llegadas = {}
+# chat_id -> textos enviados a ese chat
+conversaciones = {}
+# Updates pendientes de entregar por getUpdates
+pendientes = []
+hay_pendientes = asyncio.Event()
+
+def _parametros(request):
+    if not request.body:
+        return {}
+    tipo = request.headers.get("Content-Type", "")
+    if tipo.startswith("application/json"):
+        return json.loads(request.body)
+    return {k: v[-1].decode() for k, v in request.body_arguments.items()}
+
+def _mensaje(params):
+    chat_id = int(params.get("chat_id", 0) or 0)
+    return {
+        "message_id": contador["total"],
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": BOT_INFO,
+        "text": params.get("text", ""),
+    }
+
+class MetodoHandler(RequestHandler):
+    latencia = 0.0
+    limite = 0          # envíos por segundo antes de responder 429 (0 = sin límite)
+    bloqueados = 0      # los chats con id múltiplo de este número bloquearon al bot (403)
+    _segundo = 0
+    _en_segundo = 0
+
+    def _excede_limite(self):
+        segundo = int(time.monotonic())
+        if segundo != MetodoHandler._segundo:
+            MetodoHandler._segundo = segundo
+            MetodoHandler._en_segundo = 0
+        MetodoHandler._en_segundo += 1
+        return MetodoHandler._en_segundo > self.limite
+
+    async def post(self, token, metodo):
+        contador["total"] += 1
+        contador["metodos"][metodo] = contador["metodos"].get(metodo, 0) + 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+
+        if self.bloqueados and metodo.startswith("send"):
+            chat_id = int(_parametros(self.request).get("chat_id", 0) or 0)
+            if chat_id % self.bloqueados == 0:
+                self.set_status(403)
+                self.set_header("Content-Type", "application/json")
+                self.write(json.dumps({
+                    "ok": False, "error_code": 403,
+                    "description": "Forbidden: bot was blocked by the user",
+                }))
+                return
+
+        if self.limite and metodo.startswith("send") and self._excede_limite():
+            # Como Telegram: 429 con el tiempo a esperar
+            contador["rechazos_429"] += 1
+            self.set_status(429)
+            self.set_header("Content-Type", "application/json")
+            self.write(json.dumps({
+                "ok": False, "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            }))
+            return
+
+        if metodo == "getMe":
+            resultado = BOT_INFO
+        elif metodo == "getUpdates":
+            resultado = await _get_updates(_parametros(self.request))
+        elif metodo.startswith("send"):
+            resultado = _mensaje(_parametros(self.request))
+            chat = str(resultado["chat"]["id"])
+            llegadas.setdefault(chat, time.time())
+            conversaciones.setdefault(chat, []).append(resultado["text"])
+        else:
+            resultado = True
+
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({"ok": True, "result": resultado}))
+
+    get = post
+
+async def _get_updates(params):
+    """Como getUpdates: descarta lo anterior a offset y espera (long polling)
+    hasta que haya updates, como mucho un segundo"""
+    offset = int(params.get("offset", 0) or 0)
+    pendientes[:] = [u for u in pendientes if u["update_id"] >= offset]
+    if not pendientes:
+        hay_pendientes.clear()
+        try:
+            await asyncio.wait_for(hay_pendientes.wait(), min(float(params.get("timeout", 0) or 0), 1.0))
+        except asyncio.TimeoutError:
+            pass
+    return list(pendientes)
+
+class ContadorHandler(RequestHandler):
+    def get(self):
+        self.write(contador)
+
+class LlegadasHandler(RequestHandler):
+    def get(self):
+        self.write(llegadas)
+
+class ActualizacionesHandler(RequestHandler):
+    def post(self):
+        pendientes.extend(json.loads(self.request.body))
+        hay_pendientes.set()
+
+class ConversacionesHandler(RequestHandler):
+    def get(self):
+        self.write(conversaciones)
+
+def crear_stub(latencia=0.0, limite=0, bloqueados=0):
+    MetodoHandler.latencia = latencia
+    MetodoHandler.limite = limite
+    MetodoHandler.bloqueados = bloqueados
+    return TornadoApp([
+        (r"/bot([^/]+)/(\w+)", MetodoHandler),
+        (r"/contador", ContadorHandler),
+        (r"/llegadas", LlegadasHandler),
+        (r"/actualizaciones", ActualizacionesHandler),
+        (r"/conversaciones", ConversacionesHandler),
+    ])
+
+async def main(port, latencia, limite, bloqueados):
+    HTTPServer(crear_stub(latencia, limite, bloqueados)).listen(port, address="127.0.0.1")
+    print(f"Stub Bot API en http://127.0.0.1:{port}/bot", flush=True)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por llamada")
+    parser.add_argument("--limite", type=int, default=0, help="envíos por segundo antes de responder 429")
+    parser.add_argument("--bloqueados", type=int, default=0,
+                        help="responder 403 a los chats con id múltiplo de este número")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.port, args.latencia, args.limite, args.bloqueados))
+    except KeyboardInterrupt:
+        sys.exit(0)
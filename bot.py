@@ -1,11 +1,30 @@
 import os
-import json
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
-from dotenv import load_dotenv
-
-# Cargar variables de entorno
-load_dotenv()
+import asyncio
+from telegram import Update, ReplyKeyboardRemove
+from telegram.ext import Application, ContextTypes, ConversationHandler
+from repositorio_pedidos import obtener_repositorio
+import intenciones as it
+from catalogo import obtener_catalogo, etiqueta
+from inventario import obtener_inventario
+from carrito import Carrito, formato
+from teclados import TecladoCacheado, cacheado
+from persistencia import PersistenciaSQLite, sincronizar_conversacion
+from sesiones import SESION_TTL, registrar_limpieza
+from estados_pedido import registrar_estados
+from difusion import registrar_difusion
+from reportes import registrar_reportes
+from reparto import describir_eta, obtener_reparto, registrar_reparto
+from antiflood import ColaFrenada, obtener_freno
+from generador_ids import nuevo_id_pedido, normalizar as normalizar_id_pedido
+from flujo import Paso, compilar
+from cola import ProcesadorPorChat
+from envios import ENVIOS_LIMITADOR, LimitadorEnvios, crear_peticion, crear_peticion_updates
+
+# Cargar variables de entorno (.env en desarrollo; en Render vienen del
+# entorno y python-dotenv ni se importa)
+if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")):
+    from dotenv import load_dotenv
+    load_dotenv()
 TOKEN = os.getenv('BOT_TOKEN')
 
 # Estados de conversación
@@ -15,116 +34,116 @@ TOKEN = os.getenv('BOT_TOKEN')
     ESTADO_PEDIDO, CONTACTO, CONFIGURACION
 ) = range(10)
 
-# Simulación de productos (mientras creamos los archivos)
-PRODUCTOS = {
-    "1": {
-        "id": "1",
-        "nombre": "Agua Mineral 355ml",
-        "precio": 10.00,
-        "stock": 100,
-        "descripcion": "Botella PET 355ml"
-    },
-    "2": {
-        "id": "2", 
-        "nombre": "Agua Mineral 600ml",
-        "precio": 15.00,
-        "stock": 80,
-        "descripcion": "Botella PET 600ml"
-    },
-    "3": {
-        "id": "3",
-        "nombre": "Agua Mineral de Vidrio",
-        "precio": 25.00,
-        "stock": 50,
-        "descripcion": "Botella de vidrio 500ml"
-    }
+# Etiquetas de los estados en /metrics
+NOMBRES_ESTADOS = {
+    MENU: "MENU", COMPRA: "COMPRA", SELECCION_PRODUCTO: "SELECCION_PRODUCTO",
+    CANTIDAD: "CANTIDAD", DATOS_ENVIO: "DATOS_ENVIO", METODO_PAGO: "METODO_PAGO",
+    CONFIRMACION: "CONFIRMACION", ESTADO_PEDIDO: "ESTADO_PEDIDO",
+    CONTACTO: "CONTACTO", CONFIGURACION: "CONFIGURACION"
 }
 
-# Simulación de base de datos
-carritos = {}
-pedidos = {}
+# Persistencia de conversaciones, user_data y carritos (los pedidos viven
+# en repositorio_pedidos). Se crea al construir la Application.
+_persistencia = None
+
+def obtener_persistencia():
+    global _persistencia
+    if _persistencia is None:
+        _persistencia = PersistenciaSQLite()
+    return _persistencia
 
-# Teclados
+# Teclados (se construyen una vez; ver teclados.py)
+@cacheado('principal')
 def main_keyboard():
-    return ReplyKeyboardMarkup([
+    return TecladoCacheado([
         ["💧 Comprar Agua", "🎯 Promociones"],
         ["📦 Estado de Pedido", "🕐 Horarios"],
         ["⚙️ Configuración", "❓ Preguntas Frecuentes"],
         ["👨‍💼 Contacto Humano"]
     ], resize_keyboard=True)
 
+@cacheado('atras')
 def back_keyboard():
-    return ReplyKeyboardMarkup([["🔙 Menú Principal"]], resize_keyboard=True)
+    return TecladoCacheado([["🔙 Menú Principal"]], resize_keyboard=True)
 
 def productos_keyboard():
+    # Revisar si el catálogo cambió (al recargarse invalida el teclado)
+    obtener_catalogo()
+    return _productos_keyboard()
+
+@cacheado('productos')
+def _productos_keyboard():
     keyboard = []
-    for id, prod in PRODUCTOS.items():
-        keyboard.append([f"{prod['nombre']} - ${prod['precio']}"])
+    for prod in obtener_catalogo().productos.values():
+        keyboard.append([etiqueta(prod)])
     keyboard.append(["🔙 Menú Principal"])
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return TecladoCacheado(keyboard, resize_keyboard=True)
 
+@cacheado('metodos_pago')
 def metodos_pago_keyboard():
-    return ReplyKeyboardMarkup([
+    return TecladoCacheado([
         ["💳 Tarjeta de Crédito/Débito"],
         ["💰 Pago contra Entrega"],
         ["🏦 Transferencia Bancaria"],
         ["🔙 Atrás"]
     ], resize_keyboard=True)
 
+@cacheado('confirmacion')
 def confirmacion_keyboard():
-    return ReplyKeyboardMarkup([
+    return TecladoCacheado([
         ["✅ Sí, confirmar pedido"],
         ["❌ No, cancelar compra"],
         ["🔙 Atrás"]
     ], resize_keyboard=True)
 
-# --- FUNCIONES DE BASE DE DATOS SIMULADAS ---
-def guardar_carrito(user_id, carrito):
-    carritos[user_id] = carrito
+# --- FUNCIONES DE BASE DE DATOS ---
+async def guardar_carrito(user_id, carrito):
+    await obtener_persistencia().carritos.guardar(user_id, carrito)
+
+async def obtener_carrito(user_id):
+    return await obtener_persistencia().carritos.obtener(user_id)
 
-def obtener_carrito(user_id):
-    return carritos.get(user_id, {"productos": [], "total": 0.0})
+async def limpiar_carrito(user_id):
+    await obtener_persistencia().carritos.limpiar(user_id)
 
-def limpiar_carrito(user_id):
-    carritos[user_id] = {"productos": [], "total": 0.0}
+async def descartar_compra(user_id, context):
+    """Compra abandonada: lo apartado vuelve al inventario y se olvidan el
+    carrito y los datos de envío y pago"""
+    await obtener_inventario().liberar(user_id)
+    await limpiar_carrito(user_id)
+    for clave in ('producto_actual', 'datos_envio', 'metodo_pago'):
+        context.user_data.pop(clave, None)
 
-def crear_pedido(user_id, carrito, datos_envio, metodo_pago):
+async def crear_pedido(user_id, carrito, datos_envio, metodo_pago):
     from datetime import datetime
-    pedido_id = f"P{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    pedido_id = nuevo_id_pedido()
     
     pedido = {
         "id": pedido_id,
         "user_id": user_id,
-        "productos": carrito["productos"],
-        "total": carrito["total"],
+        "productos": carrito.productos(),
+        "total": carrito.total / 100,
         "datos_envio": datos_envio,
         "metodo_pago": metodo_pago,
         "estado": "pendiente",
         "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "tiempo_entrega": "2-3 horas"
     }
+    # Hora estimada según la cola de reparto de su zona
+    eta = await obtener_reparto().registrar(pedido)
+    pedido["tiempo_entrega"] = describir_eta(eta)
     
-    pedidos[pedido_id] = pedido
-    return pedido_id
+    await obtener_repositorio().guardar(pedido)
+    return pedido
 
 # --- PALABRAS CLAVE UNIVERSALES ---
-async def check_volver_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Verificar si el usuario quiere volver al menú"""
-    text = update.message.text.lower()
-    
-    palabras_volver = [
-        "menu", "menú", "principal", "volver", "atrás", "atras", 
-        "inicio", "home", "regresar", "back", "cancelar"
-    ]
-    
-    if any(palabra in text for palabra in palabras_volver):
-        await update.message.reply_text(
-            "🏠 Volviendo al menú principal...",
-            reply_markup=main_keyboard()
-        )
-        return MENU
-    
-    return None
+async def volver_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Volver al menú principal (ruta VOLVER de casi todos los estados, ver FLUJO)"""
+    await descartar_compra(update.message.from_user.id, context)
+    await update.message.reply_text(
+        "🏠 Volviendo al menú principal...",
+        reply_markup=main_keyboard()
+    )
+    return MENU
 
 # --- FLUJOS PRINCIPALES ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -143,41 +162,36 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manejar selección del menú"""
-    # Primero verificar si quiere volver al menú
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-        
-    text = update.message.text
+    opcion = it.intencion_menu(update.message.text)
     
-    if "comprar" in text.lower():
+    if opcion == it.COMPRAR:
         await iniciar_compra(update, context)
         return SELECCION_PRODUCTO
         
-    elif "estado" in text.lower():
+    elif opcion == it.ESTADO:
         await update.message.reply_text(
             "📦 Por favor, ingresa tu número de pedido:\n\n💡 Escribe 'menu' para volver",
             reply_markup=back_keyboard()
         )
         return ESTADO_PEDIDO
         
-    elif "horarios" in text.lower():
+    elif opcion == it.HORARIOS:
         await show_horarios(update, context)
         return MENU
         
-    elif "preguntas" in text.lower():
+    elif opcion == it.PREGUNTAS:
         await show_faq(update, context)
         return MENU
         
-    elif "contacto" in text.lower():
+    elif opcion == it.CONTACTO:
         await show_contacto(update, context)
         return CONTACTO
         
-    elif "configuración" in text.lower() or "configuracion" in text.lower():
+    elif opcion == it.CONFIGURACION:
         await show_configuracion(update, context)
         return CONFIGURACION
         
-    elif "promociones" in text.lower():
+    elif opcion == it.PROMOCIONES:
         await show_promociones(update, context)
         return MENU
     
@@ -187,7 +201,9 @@ async def handle_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def iniciar_compra(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Iniciar flujo de compra"""
     user_id = update.message.from_user.id
-    guardar_carrito(user_id, {"productos": [], "total": 0.0})
+    # Carrito nuevo: lo apartado en uno anterior vuelve al inventario
+    await obtener_inventario().liberar(user_id)
+    await guardar_carrito(user_id, Carrito())
     
     await update.message.reply_text(
         "🛍️ **SISTEMA DE COMPRAS**\n\n💡 ¿Qué tipo de agua deseas comprar?",
@@ -197,27 +213,20 @@ async def iniciar_compra(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_seleccion_producto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manejar selección de producto"""
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-    
     text = update.message.text
     user_id = update.message.from_user.id
     
     # Buscar producto seleccionado
-    producto_seleccionado = None
-    for id, prod in PRODUCTOS.items():
-        if prod['nombre'] in text:
-            producto_seleccionado = prod
-            break
+    producto_seleccionado = obtener_catalogo().buscar(text)
     
     if producto_seleccionado:
         context.user_data['producto_actual'] = producto_seleccionado
+        stock = await obtener_inventario().disponible(producto_seleccionado['id'])
         
         await update.message.reply_text(
             f"✅ Seleccionaste: {producto_seleccionado['nombre']}\n"
             f"💰 Precio: ${producto_seleccionado['precio']}\n"
-            f"📦 Stock disponible: {producto_seleccionado['stock']} unidades\n\n"
+            f"📦 Stock disponible: {stock} unidades\n\n"
             "💡 ¿Cuántas botellas deseas agregar al carrito?",
             reply_markup=back_keyboard()
         )
@@ -231,14 +240,18 @@ async def handle_seleccion_producto(update: Update, context: ContextTypes.DEFAUL
 
 async def handle_cantidad(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manejar cantidad de producto"""
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-    
     text = update.message.text
     user_id = update.message.from_user.id
     producto = context.user_data.get('producto_actual')
     
+    if producto is None:
+        # La sesión venció mientras elegía la cantidad
+        await update.message.reply_text(
+            "💡 ¿Qué tipo de agua deseas comprar?",
+            reply_markup=productos_keyboard()
+        )
+        return SELECCION_PRODUCTO
+    
     try:
         cantidad = int(text)
         
@@ -246,31 +259,26 @@ async def handle_cantidad(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ La cantidad debe ser mayor a 0. Intenta de nuevo:", reply_markup=back_keyboard())
             return CANTIDAD
         
-        if cantidad > producto['stock']:
+        # Apartar las unidades (atómico frente a otros compradores)
+        reservado, stock = await obtener_inventario().reservar(user_id, producto['id'], cantidad)
+        if not reservado:
             await update.message.reply_text(
-                f"😔 Lo sentimos, stock insuficiente.\n📦 Stock actual: {producto['stock']} unidades\n💡 Intenta con menos:",
+                f"😔 Lo sentimos, stock insuficiente.\n📦 Stock actual: {stock} unidades\n💡 Intenta con menos:",
                 reply_markup=back_keyboard()
             )
             return CANTIDAD
         
-        # Agregar al carrito
-        carrito = obtener_carrito(user_id)
-        item_carrito = {
-            "producto_id": producto['id'],
-            "nombre": producto['nombre'],
-            "precio_unitario": producto['precio'],
-            "cantidad": cantidad,
-            "subtotal": producto['precio'] * cantidad
-        }
-        
-        carrito['productos'].append(item_carrito)
-        carrito['total'] += item_carrito['subtotal']
-        guardar_carrito(user_id, carrito)
+        # Agregar al carrito (si el producto ya estaba, se suma a su línea)
+        carrito = await obtener_carrito(user_id)
+        linea = carrito.agregar_producto(producto, cantidad)
+        await guardar_carrito(user_id, carrito)
         
+        descuento = f"🎁 {linea.promocion.nombre}: {formato(-linea.descuento)}\n" if linea.descuento else ""
         await update.message.reply_text(
             f"✅ ¡Perfecto! Agregado {cantidad} {producto['nombre']} al carrito.\n"
-            f"💰 Subtotal: ${item_carrito['subtotal']:.2f}\n"
-            f"🛒 Total carrito: ${carrito['total']:.2f}\n\n"
+            f"💰 Subtotal: {formato(linea.precio * cantidad)}\n"
+            f"{descuento}"
+            f"🛒 Total carrito: {formato(carrito.total)}\n\n"
             "💡 Escribe 'pagar' para continuar o selecciona otro producto:",
             reply_markup=productos_keyboard()
         )
@@ -281,31 +289,23 @@ async def handle_cantidad(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return CANTIDAD
 
 async def handle_pagar(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Detectar cuando el usuario escribe 'pagar'"""
-    text = update.message.text.lower()
+    """Pasar a los datos de envío cuando el usuario escribe 'pagar'"""
+    user_id = update.message.from_user.id
+    carrito = await obtener_carrito(user_id)
     
-    if "pagar" in text:
-        user_id = update.message.from_user.id
-        carrito = obtener_carrito(user_id)
-        
-        if not carrito['productos']:
-            await update.message.reply_text("🛒 Tu carrito está vacío. Agrega productos primero.", reply_markup=productos_keyboard())
-            return SELECCION_PRODUCTO
-        
-        await update.message.reply_text(
-            "📦 **DATOS DE ENVÍO**\n\nPor favor proporciona:\n• Nombre completo\n• Dirección\n• Teléfono\n• Referencias\n\n💡 Ejemplo:\nJuan Pérez\nCalle Principal #123\n555-123-4567",
-            reply_markup=back_keyboard()
-        )
-        return DATOS_ENVIO
-    else:
-        return await handle_seleccion_producto(update, context)
+    if not carrito:
+        await update.message.reply_text("🛒 Tu carrito está vacío. Agrega productos primero.", reply_markup=productos_keyboard())
+        return SELECCION_PRODUCTO
+    
+    await update.message.reply_text(
+        "📦 **DATOS DE ENVÍO**\n\nPor favor proporciona:\n• Nombre completo\n• Calle y número\n• Colonia y C.P.\n• Teléfono\n• Referencias\n\n"
+        "💡 Ejemplo:\nJuan Pérez\nCalle Principal #123\nCol. Centro, C.P. 78000\n444-123-4567",
+        reply_markup=back_keyboard()
+    )
+    return DATOS_ENVIO
 
 async def handle_datos_envio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manejar datos de envío"""
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-    
     datos_envio = update.message.text
     context.user_data['datos_envio'] = datos_envio
     
@@ -315,32 +315,42 @@ async def handle_datos_envio(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     return METODO_PAGO
 
+async def volver_datos_envio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Desde el método de pago, volver a pedir los datos de envío"""
+    await update.message.reply_text("📦 Ingresa tus datos de envío:", reply_markup=back_keyboard())
+    return DATOS_ENVIO
+
+async def carrito_vencido(update: Update):
+    """El carrito se vació a mitad de la compra (lo borró la limpieza tras
+    CARRITO_TTL, ver sesiones.py): de vuelta al menú"""
+    await update.message.reply_text(
+        "⌛ Tu carrito expiró por inactividad y se liberó el stock reservado.\n"
+        "💡 Vuelve a armarlo desde el menú.",
+        reply_markup=main_keyboard()
+    )
+    return MENU
+
 async def handle_metodo_pago(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manejar método de pago"""
     text = update.message.text
     
-    if "atrás" in text.lower():
-        await update.message.reply_text("📦 Ingresa tus datos de envío:", reply_markup=back_keyboard())
-        return DATOS_ENVIO
-    
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
+    user_id = update.message.from_user.id
+    carrito = await obtener_carrito(user_id)
+    if not carrito:
+        return await carrito_vencido(update)
     
     context.user_data['metodo_pago'] = text
-    user_id = update.message.from_user.id
-    carrito = obtener_carrito(user_id)
     datos_envio = context.user_data.get('datos_envio', '')
     
     # Mostrar resumen del pedido
-    resumen = "🛒 **RESUMEN DE TU PEDIDO**\n\n"
-    for item in carrito['productos']:
-        resumen += f"• {item['cantidad']}x {item['nombre']} - ${item['subtotal']:.2f}\n"
-    
-    resumen += f"\n💰 **Total: ${carrito['total']:.2f}**\n"
-    resumen += f"📦 **Envío a:**\n{datos_envio}\n"
-    resumen += f"💳 **Método de pago:** {text}\n\n"
-    resumen += "✅ ¿Confirmas tu pedido?"
+    resumen = "".join((
+        "🛒 **RESUMEN DE TU PEDIDO**\n\n",
+        *carrito.renglones(),
+        f"\n💰 **Total: {formato(carrito.total)}**\n",
+        f"📦 **Envío a:**\n{datos_envio}\n",
+        f"💳 **Método de pago:** {text}\n\n",
+        "✅ ¿Confirmas tu pedido?",
+    ))
     
     await update.message.reply_text(resumen, reply_markup=confirmacion_keyboard())
     return CONFIRMACION
@@ -350,28 +360,44 @@ async def handle_confirmacion(update: Update, context: ContextTypes.DEFAULT_TYPE
     text = update.message.text
     user_id = update.message.from_user.id
     
-    if "sí" in text.lower() or "confirmar" in text.lower():
-        carrito = obtener_carrito(user_id)
+    respuesta = it.intenciones(text)
+    
+    if it.CONFIRMAR in respuesta:
+        carrito = await obtener_carrito(user_id)
+        if not carrito:
+            return await carrito_vencido(update)
         datos_envio = context.user_data.get('datos_envio', '')
         metodo_pago = context.user_data.get('metodo_pago', '')
         
-        pedido_id = crear_pedido(user_id, carrito, datos_envio, metodo_pago)
-        limpiar_carrito(user_id)
+        agotado = await obtener_inventario().confirmar(user_id, carrito.cantidades())
+        if agotado is not None:
+            producto = obtener_catalogo().productos.get(agotado, {'nombre': agotado})
+            await obtener_inventario().liberar(user_id)
+            await limpiar_carrito(user_id)
+            await update.message.reply_text(
+                f"😔 Ya no hay stock suficiente de {producto['nombre']}.\n"
+                f"💡 Vuelve a armar tu carrito desde el menú.",
+                reply_markup=main_keyboard()
+            )
+            return MENU
+        
+        pedido = await crear_pedido(user_id, carrito, datos_envio, metodo_pago)
+        await limpiar_carrito(user_id)
         
         await update.message.reply_text(
             f"🎉 **¡PEDIDO CONFIRMADO!**\n\n"
-            f"📦 Número de pedido: {pedido_id}\n"
-            f"💰 Total: ${carrito['total']:.2f}\n"
-            f"⏰ Tiempo estimado: 2-3 horas\n"
-            f"🚚 Estado: En preparación\n\n"
-            f"💡 Usa /estado para consultar tu pedido\n\n"
+            f"📦 Número de pedido: {pedido['id']}\n"
+            f"💰 Total: {formato(carrito.total)}\n"
+            f"⏰ Tiempo estimado: {pedido['tiempo_entrega']}\n"
+            f"🚚 Estado: Pendiente\n\n"
+            f"🔔 Te avisaremos por aquí cada vez que cambie de estado\n\n"
             f"¡Gracias por tu compra! 😊",
             reply_markup=main_keyboard()
         )
         return MENU
         
-    elif "no" in text.lower() or "cancelar" in text.lower():
-        limpiar_carrito(user_id)
+    elif it.NEGAR in respuesta:
+        await descartar_compra(user_id, context)
         await update.message.reply_text("❌ Pedido cancelado.", reply_markup=main_keyboard())
         return MENU
     
@@ -382,18 +408,32 @@ async def handle_confirmacion(update: Update, context: ContextTypes.DEFAULT_TYPE
 # --- FLUJO ESTADO PEDIDO ---
 async def handle_estado_pedido(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Consultar estado de pedido"""
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
+    num_pedido = normalizar_id_pedido(update.message.text.strip().lstrip('#'))
+    pedido = await obtener_repositorio().obtener(num_pedido)
     
-    num_pedido = update.message.text
+    # Solo el dueño del pedido puede consultarlo
+    if pedido is None or pedido['user_id'] != update.message.from_user.id:
+        await update.message.reply_text(
+            f"❌ No encontramos el pedido #{num_pedido}.\n"
+            f"💡 Revisa el número o escribe 'menu' para volver",
+            reply_markup=back_keyboard()
+        )
+        return ESTADO_PEDIDO
+    
+    # La hora estimada se actualiza con cada tick del reparto hasta que sale su lote
+    tiempo_entrega = pedido['tiempo_entrega']
+    if pedido['estado'] != "entregado":
+        eta = await obtener_reparto().eta(pedido['id'])
+        if eta is not None:
+            tiempo_entrega = describir_eta(eta)
     
-    # Simular consulta
     await update.message.reply_text(
-        f"📦 **Pedido #{num_pedido}**\n"
-        f"✅ Estado: En proceso\n"
-        f"⏰ Tiempo estimado: 2 horas\n"
-        f"🚚 Repartidor: Juan Pérez\n\n"
+        f"📦 **Pedido #{pedido['id']}**\n"
+        f"✅ Estado: {pedido['estado'].capitalize()}\n"
+        f"💰 Total: ${pedido['total']:.2f}\n"
+        f"📅 Fecha: {pedido['fecha']}\n"
+        f"⏰ Tiempo estimado: {tiempo_entrega}\n\n"
+        f"🔔 Te avisaremos por aquí cuando cambie de estado\n"
         f"💡 Escribe 'menu' para volver",
         reply_markup=back_keyboard()
     )
@@ -413,10 +453,6 @@ async def show_contacto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(contact_text, reply_markup=back_keyboard())
 
 async def handle_contacto(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-    
     await update.message.reply_text(
         "📩 **Mensaje recibido**\n\nUn agente te contactará pronto.\n💡 Escribe 'menu' para volver",
         reply_markup=back_keyboard()
@@ -438,10 +474,6 @@ async def show_configuracion(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await update.message.reply_text(config_text, reply_markup=back_keyboard())
 
 async def handle_configuracion(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    volver = await check_volver_menu(update, context)
-    if volver is not None:
-        return volver
-    
     await update.message.reply_text(
         "🔧 **Configuración en desarrollo**\n💡 Escribe 'menu' para volver",
         reply_markup=back_keyboard()
@@ -489,40 +521,109 @@ async def show_promociones(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(promo_text, reply_markup=main_keyboard())
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await descartar_compra(update.message.from_user.id, context)
     await update.message.reply_text("👋 ¡Gracias por visitar!", reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"Error: {context.error}")
-    await update.message.reply_text("⚠️ Error. Escribe 'menu' para volver", reply_markup=main_keyboard())
+    # Los errores de tareas (avisos, limpieza) no traen un mensaje al que responder
+    if not isinstance(update, Update) or update.effective_message is None:
+        return
+    await update.effective_message.reply_text("⚠️ Error. Escribe 'menu' para volver", reply_markup=main_keyboard())
+
+def construir_aplicacion(update_queue=None, procesador=None):
+    """Crear la Application de Telegram con la configuración común"""
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .persistence(obtener_persistencia())
+        # Pool keep-alive propio y medido (ver envios.py y metricas.py)
+        .request(crear_peticion())
+        .get_updates_request(crear_peticion_updates())
+    )
+    if ENVIOS_LIMITADOR:
+        builder = builder.rate_limiter(LimitadorEnvios())
+    if update_queue is not None:
+        builder = builder.update_queue(update_queue)
+    if procesador is not None:
+        builder = builder.concurrent_updates(procesador)
+
+    # Permite apuntar a un Bot API local (pruebas de carga, servidor propio)
+    api_url = os.getenv('BOT_API_URL')
+    if api_url:
+        builder = builder.base_url(api_url)
+
+    return builder.build()
+
+def precalentar():
+    """Cargar el catálogo y construir los teclados antes del primer update"""
+    obtener_catalogo()
+    for teclado in (main_keyboard, back_keyboard, productos_keyboard,
+                    metodos_pago_keyboard, confirmacion_keyboard):
+        teclado()
+
+async def iniciar_aplicacion(application):
+    """initialize() + start() de la Application.
+
+    Los servidores webhook ya escuchan cuando se llama: el update que
+    despertó al servicio se recibe mientras tanto. Durante el getMe a
+    Telegram se precalientan catálogo y teclados.
+    """
+    inicializando = asyncio.ensure_future(application.initialize())
+    await asyncio.sleep(0)
+    precalentar()
+    await inicializando
+    await application.start()
+
+# Flujo de la conversación (ver flujo.py): qué intenciones atiende cada
+# estado y con qué handler, en orden de prioridad; el resto del texto va al
+# handler del estado. En los estados de texto libre las intenciones solo
+# cuentan si el mensaje no trae nada más.
+FLUJO = {
+    MENU: Paso(handle_menu, [(it.VOLVER, volver_menu)]),
+    SELECCION_PRODUCTO: Paso(handle_seleccion_producto, [(it.PAGAR, handle_pagar), (it.VOLVER, volver_menu)]),
+    CANTIDAD: Paso(handle_cantidad, [(it.VOLVER, volver_menu)]),
+    DATOS_ENVIO: Paso(handle_datos_envio, [(it.VOLVER, volver_menu)], texto_libre=True),
+    METODO_PAGO: Paso(handle_metodo_pago, [(it.ATRAS, volver_datos_envio), (it.VOLVER, volver_menu)]),
+    CONFIRMACION: Paso(handle_confirmacion),
+    ESTADO_PEDIDO: Paso(handle_estado_pedido, [(it.VOLVER, volver_menu)], texto_libre=True),
+    CONTACTO: Paso(handle_contacto, [(it.VOLVER, volver_menu)], texto_libre=True),
+    CONFIGURACION: Paso(handle_configuracion, [(it.VOLVER, volver_menu)]),
+}
+
+def construir_conversacion():
+    """Crear el ConversationHandler principal a partir de FLUJO"""
+    return compilar(
+        FLUJO, NOMBRES_ESTADOS, start, cancel,
+        name='conversacion',
+        persistent=True,
+        conversation_timeout=SESION_TTL
+    )
+
+def registrar_handlers(application):
+    """Todos los handlers del bot; los usan por igual polling (main) y los
+    servidores webhook"""
+    conversacion = construir_conversacion()
+    application.add_handler(conversacion)
+    sincronizar_conversacion(application, conversacion, obtener_persistencia())
+    registrar_limpieza(application)
+    registrar_estados(application)
+    registrar_difusion(application)
+    registrar_reportes(application)
+    registrar_reparto(application)
+    application.add_error_handler(error_handler)
+    return conversacion
 
 def main():
     print("🚀 Iniciando Bot de Aguas de Lourdes...")
     
-    app = Application.builder().token(TOKEN).build()
-    
-    # Conversación principal
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start)],
-        states={
-            MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu)],
-            SELECCION_PRODUCTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_seleccion_producto)],
-            CANTIDAD: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cantidad)],
-            DATOS_ENVIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_datos_envio)],
-            METODO_PAGO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_metodo_pago)],
-            CONFIRMACION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_confirmacion)],
-            ESTADO_PEDIDO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_estado_pedido)],
-            CONTACTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_contacto)],
-            CONFIGURACION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_configuracion)]
-        },
-        fallbacks=[CommandHandler('cancel', cancel)]
-    )
-    
-    app.add_handler(conv_handler)
-    app.add_error_handler(error_handler)
-    
-    # Handler para detectar "pagar"
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r'(?i)pagar'), handle_pagar))
+    # Control de flood al recibir los updates (ver antiflood.py)
+    freno = obtener_freno()
+    # Chats en paralelo (ver cola.ProcesadorPorChat): la espera por el
+    # límite de envíos de un chat no demora a los demás
+    app = construir_aplicacion(ColaFrenada(freno) if freno is not None else None, ProcesadorPorChat())
+    registrar_handlers(app)
     
     print("✅ Bot iniciado correctamente!")
     app.run_polling()
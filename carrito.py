@@ -0,0 +1,148 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from catalogo import normalizar
+
+# Carrito de compras:
+# - una línea por producto: volver a agregar el mismo producto suma cantidad
+# - importes en centavos enteros, sin los errores de redondeo de float
+# - bruto, descuentos y total se actualizan al agregar, tocando solo la línea
+#   que cambió (no se recorre el carrito)
+# - las promociones son reglas por producto; al cambiar una línea se vuelve
+#   a calcular solo su descuento
+
+def a_centavos(precio):
+    """15.5 -> 1550 (redondeo comercial)"""
+    return int((Decimal(str(precio)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def formato(centavos):
+    """1550 -> '$15.50'"""
+    signo = "-" if centavos < 0 else ""
+    centavos = abs(centavos)
+    return f"{signo}${centavos // 100}.{centavos % 100:02d}"
+
+class Promocion:
+    """Porcentaje de descuento por cada pack completo de un producto"""
+
+    __slots__ = ("nombre", "palabra", "pack", "porcentaje")
+
+    def __init__(self, nombre, palabra, pack, porcentaje):
+        self.nombre = nombre
+        self.palabra = palabra      # palabra del nombre normalizado del producto
+        self.pack = pack
+        self.porcentaje = porcentaje
+
+    def descuento(self, precio, cantidad):
+        """Centavos de descuento para `cantidad` unidades a `precio` centavos"""
+        return (cantidad // self.pack) * self.pack * precio * self.porcentaje // 100
+
+PROMOCIONES = (
+    Promocion("Pack 12 botellas 600ml", "600ml", 12, 10),
+)
+
+def promocion_de(nombre):
+    palabras = normalizar(nombre).split()
+    for promocion in PROMOCIONES:
+        if promocion.palabra in palabras:
+            return promocion
+    return None
+
+class Linea:
+    __slots__ = ("producto_id", "nombre", "precio", "cantidad", "promocion", "descuento")
+
+    def __init__(self, producto_id, nombre, precio):
+        self.producto_id = producto_id
+        self.nombre = nombre
+        self.precio = precio        # centavos por unidad
+        self.cantidad = 0
+        self.promocion = promocion_de(nombre)
+        self.descuento = 0
+
+    @property
+    def subtotal(self):
+        return self.precio * self.cantidad
+
+class Carrito:
+    __slots__ = ("lineas", "bruto", "descuento")
+
+    def __init__(self):
+        self.lineas = {}        # producto_id -> Linea, en el orden en que se agregaron
+        self.bruto = 0
+        self.descuento = 0
+
+    @property
+    def total(self):
+        return self.bruto - self.descuento
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def __iter__(self):
+        return iter(self.lineas.values())
+
+    def agregar(self, producto_id, nombre, precio, cantidad):
+        """Sumar `cantidad` unidades (precio en centavos); devuelve la línea.
+
+        Si el producto ya está en el carrito se conserva el precio con el
+        que entró.
+        """
+        linea = self.lineas.get(producto_id)
+        if linea is None:
+            linea = self.lineas[producto_id] = Linea(producto_id, nombre, precio)
+        linea.cantidad += cantidad
+        self.bruto += linea.precio * cantidad
+        if linea.promocion is not None:
+            descuento = linea.promocion.descuento(linea.precio, linea.cantidad)
+            self.descuento += descuento - linea.descuento
+            linea.descuento = descuento
+        return linea
+
+    def agregar_producto(self, producto, cantidad):
+        """Igual que agregar(), con el producto tal como viene del catálogo"""
+        linea = self.lineas.get(producto["id"])
+        precio = linea.precio if linea is not None else a_centavos(producto["precio"])
+        return self.agregar(producto["id"], producto["nombre"], precio, cantidad)
+
+    def cantidades(self):
+        """{producto_id: cantidad}, para el inventario"""
+        return {linea.producto_id: linea.cantidad for linea in self.lineas.values()}
+
+    def renglones(self):
+        """Renglones del resumen (para unir con un solo join)"""
+        for linea in self.lineas.values():
+            yield f"• {linea.cantidad}x {linea.nombre} - {formato(linea.subtotal)}\n"
+            if linea.descuento:
+                yield f"   🎁 {linea.promocion.nombre}: {formato(-linea.descuento)}\n"
+
+    def productos(self):
+        """Líneas como se guardan en el pedido (importes en pesos)"""
+        return [
+            {
+                "producto_id": linea.producto_id,
+                "nombre": linea.nombre,
+                "precio_unitario": linea.precio / 100,
+                "cantidad": linea.cantidad,
+                "subtotal": linea.subtotal / 100,
+                "descuento": linea.descuento / 100,
+            }
+            for linea in self.lineas.values()
+        ]
+
+    # --- Persistencia (persistencia.AlmacenCarritos) ---
+    def a_dict(self):
+        return {"lineas": [[l.producto_id, l.nombre, l.precio, l.cantidad] for l in self.lineas.values()]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Carrito guardado; también lee el formato anterior (lista de productos en pesos)"""
+        carrito = cls()
+        if not datos:
+            return carrito
+        if "lineas" in datos:
+            for producto_id, nombre, precio, cantidad in datos["lineas"]:
+                carrito.agregar(producto_id, nombre, precio, cantidad)
+        else:
+            for item in datos.get("productos", ()):
+                carrito.agregar(
+                    item["producto_id"], item["nombre"], a_centavos(item["precio_unitario"]), item["cantidad"]
+                )
+        return carrito
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import teclados
+
+# Catálogo de productos cargado desde un archivo externo (JSON o CSV según la
+# extensión). Se recarga solo cuando el archivo cambia; la revisión se hace
+# como mucho cada CATALOGO_REVISION segundos.
+CATALOGO_PATH = os.getenv(
+    "CATALOGO_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "productos.json")
+)
+CATALOGO_REVISION = float(os.getenv("CATALOGO_REVISION", 5))
+
+# Búsqueda aproximada: se compara contra a lo sumo MAX_CANDIDATOS nombres
+MAX_CANDIDATOS = 50
+MIN_FRECUENCIA = 100
+# ...y solo se acepta un nombre parecido en al menos SIMILITUD_MINIMA y que
+# le saque MARGEN_SIMILITUD al siguiente: "agua mineral" se parece igual a
+# la de 355ml que a la de 600ml y no elige ninguna
+SIMILITUD_MINIMA = 0.8
+MARGEN_SIMILITUD = 0.05
+
+def normalizar(texto):
+    """Minúsculas, sin acentos, emojis ni signos: 'Agua  Mineral 600ML' -> 'agua mineral 600ml'"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    limpio = "".join(c if c.isalnum() else " " for c in texto if not unicodedata.combining(c))
+    return " ".join(limpio.split())
+
+def etiqueta(producto):
+    """Texto del botón del producto en el teclado"""
+    return f"{producto['nombre']} - ${producto['precio']}"
+
+def _leer_archivo(ruta):
+    if ruta.endswith(".csv"):
+        import csv
+        with open(ruta, newline="", encoding="utf-8") as f:
+            productos = list(csv.DictReader(f))
+        for p in productos:
+            p["precio"] = float(p["precio"])
+            p["stock"] = int(p["stock"])
+    else:
+        with open(ruta, encoding="utf-8") as f:
+            productos = json.load(f)
+    return {str(p["id"]): dict(p, id=str(p["id"])) for p in productos}
+
+class Catalogo:
+    def __init__(self, productos):
+        self.productos = productos
+        self.por_etiqueta = {etiqueta(p): p for p in productos.values()}
+        self.por_nombre = {normalizar(p["nombre"]): p for p in productos.values()}
+        self._nombres = list(self.por_nombre)
+        # Largos (en palabras) de los nombres, de mayor a menor, para buscar
+        # un nombre dentro de un texto más largo
+        self._largos = sorted({len(n.split()) for n in self._nombres}, reverse=True)
+
+        # Índice invertido palabra -> nombres, para acotar la búsqueda aproximada
+        self._por_palabra = defaultdict(list)
+        for nombre in self._nombres:
+            for palabra in set(nombre.split()):
+                self._por_palabra[palabra].append(nombre)
+        self._max_frecuencia = max(MIN_FRECUENCIA, len(self._nombres) // 10)
+
+    def _candidatos(self, nombre):
+        """Nombres que comparten más palabras poco comunes con el texto"""
+        if len(self._nombres) <= MAX_CANDIDATOS:
+            return self._nombres
+        votos = Counter()
+        for palabra in set(nombre.split()):
+            nombres = self._por_palabra.get(palabra, ())
+            if len(nombres) <= self._max_frecuencia:
+                votos.update(nombres)
+        return [n for n, _ in votos.most_common(MAX_CANDIDATOS)]
+
+    def _contenido(self, nombre):
+        """Nombre del catálogo que aparece entero dentro del texto, o None
+
+        Como la búsqueda original por subcadena: "quiero agua mineral 600ml
+        por favor" elige la de 600ml. Si hay varios, el de más palabras.
+        """
+        palabras = nombre.split()
+        for largo in self._largos:
+            for inicio in range(len(palabras) - largo + 1):
+                candidato = " ".join(palabras[inicio:inicio + largo])
+                if candidato in self.por_nombre:
+                    return candidato
+        return None
+
+    def buscar(self, texto):
+        """Producto que corresponde al texto del usuario, o None.
+
+        Primero el botón exacto, luego el nombre normalizado (con o sin el
+        precio del botón), después un nombre que aparezca dentro del texto
+        y por último el nombre más parecido, si no hay otro casi igual de
+        parecido.
+        """
+        producto = self.por_etiqueta.get(texto)
+        if producto is not None:
+            return producto
+
+        nombre = normalizar(texto.rsplit(" - $", 1)[0])
+        producto = self.por_nombre.get(nombre)
+        if producto is not None:
+            return producto
+        contenido = self._contenido(nombre)
+        if contenido is not None:
+            return self.por_nombre[contenido]
+
+        import difflib
+        comparador = difflib.SequenceMatcher()
+        comparador.set_seq2(nombre)
+        mejor, segundo, elegido = 0.0, 0.0, None
+        for candidato in self._candidatos(nombre):
+            comparador.set_seq1(candidato)
+            # Las cotas rápidas descartan sin calcular la similitud exacta
+            if comparador.real_quick_ratio() < SIMILITUD_MINIMA - MARGEN_SIMILITUD \
+                    or comparador.quick_ratio() < SIMILITUD_MINIMA - MARGEN_SIMILITUD:
+                continue
+            similitud = comparador.ratio()
+            if similitud > mejor:
+                mejor, segundo, elegido = similitud, mejor, candidato
+            elif similitud > segundo:
+                segundo = similitud
+        if mejor < SIMILITUD_MINIMA or mejor - segundo < MARGEN_SIMILITUD:
+            return None
+        return self.por_nombre[elegido]
+
+class CatalogoArchivo:
+    """Catálogo respaldado por un archivo, con recarga en caliente"""
+
+    def __init__(self, ruta=CATALOGO_PATH, revision=CATALOGO_REVISION):
+        self.ruta = ruta
+        self.revision = revision
+        self._mtime = None
+        self._revisado = 0.0
+        self.catalogo = None
+        self.recargar()
+
+    def recargar(self):
+        mtime = os.stat(self.ruta).st_mtime_ns
+        self.catalogo = Catalogo(_leer_archivo(self.ruta))
+        self._mtime = mtime
+        teclados.invalidar("productos")
+
+    def actual(self):
+        ahora = time.monotonic()
+        if ahora - self._revisado >= self.revision:
+            self._revisado = ahora
+            try:
+                if os.stat(self.ruta).st_mtime_ns != self._mtime:
+                    self.recargar()
+            except (OSError, ValueError) as e:
+                # Archivo a medio escribir o inválido: seguimos con el anterior
+                print(f"Error recargando catálogo: {e!r}")
+        return self.catalogo
+
+_catalogo = None
+
+def obtener_catalogo():
+    global _catalogo
+    if _catalogo is None:
+        _catalogo = CatalogoArchivo()
+    return _catalogo.actual()
@@ -0,0 +1,178 @@
+import os
+import time
+import asyncio
+from collections import deque
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from respuesta_directa import capturando
+
+# Cola de ingesta entre el webhook y la Application:
+# - acotada: si está llena el webhook responde 503 y Telegram reintenta
+# - N trabajadores concurrentes
+# - orden secuencial por chat: las respuestas de un mismo usuario se
+#   procesan en el orden en que llegaron (CANTIDAD no adelanta a
+#   SELECCION_PRODUCTO)
+# En polling hace lo mismo ProcesadorPorChat (concurrent_updates de la
+# Application): un chat que espera su turno de envío (LimitadorEnvios) no
+# frena a los demás.
+
+COLA_MAXIMO = int(os.getenv("COLA_MAXIMO", 1000))
+COLA_TRABAJADORES = int(os.getenv("COLA_TRABAJADORES", 8))
+
+class ColaActualizaciones:
+    def __init__(self, application, maximo=COLA_MAXIMO, trabajadores=COLA_TRABAJADORES):
+        self.application = application
+        self.maximo = maximo
+        self.num_trabajadores = trabajadores
+
+        self._cola = asyncio.Queue()
+        self._chats_activos = {}   # chat_id -> deque de pendientes de ese chat
+        self._trabajadores = []
+
+        # Métricas
+        self.en_espera = 0
+        self.en_proceso = 0
+        self.procesadas = 0
+        self.rechazadas = 0
+        self.descartadas = 0
+        self.repetidas = 0
+        self.fallidas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def encolar(self, update, captura=None, chat_id=None):
+        """Encolar un update; devuelve False si la cola está llena.
+
+        `update` puede ser el JSON ya decodificado (ver decodificador.py) junto
+        con su `chat_id`: el Update se construye recién al procesarlo.
+        `captura` (respuesta_directa.Captura) queda activa mientras se procesa
+        el update y se termina al final.
+        """
+        if self.en_espera >= self.maximo:
+            self.rechazadas += 1
+            return False
+
+        if chat_id is None:
+            if isinstance(update, dict):
+                chat_id = ("update", update["update_id"])
+            else:
+                chat = update.effective_chat
+                chat_id = chat.id if chat else ("update", update.update_id)
+
+        self.en_espera += 1
+        self._cola.put_nowait((update, chat_id, time.perf_counter(), captura))
+        return True
+
+    def descartar(self):
+        """Contar un update que el webhook no encoló porque el bot no lo atiende"""
+        self.descartadas += 1
+
+    def repetida(self):
+        """Contar un update que el webhook ya había recibido (ver idempotencia.py)"""
+        self.repetidas += 1
+
+    async def iniciar(self):
+        for _ in range(self.num_trabajadores):
+            self._trabajadores.append(asyncio.create_task(self._trabajador()))
+
+    async def detener(self):
+        for tarea in self._trabajadores:
+            tarea.cancel()
+        await asyncio.gather(*self._trabajadores, return_exceptions=True)
+        self._trabajadores.clear()
+
+    async def _trabajador(self):
+        while True:
+            update, clave, encolado, captura = await self._cola.get()
+
+            # Si otro trabajador ya atiende este chat, se lo dejamos a él
+            # para conservar el orden.
+            pendientes = self._chats_activos.get(clave)
+            if pendientes is not None:
+                pendientes.append((update, encolado, captura))
+                continue
+
+            pendientes = self._chats_activos[clave] = deque()
+            try:
+                await self._procesar(update, encolado, captura)
+                while pendientes:
+                    await self._procesar(*pendientes.popleft())
+            finally:
+                del self._chats_activos[clave]
+
+    async def _procesar(self, update, encolado, captura=None):
+        espera = time.perf_counter() - encolado
+        self.en_espera -= 1
+        self.espera_total += espera
+        self.espera_max = max(self.espera_max, espera)
+
+        self.en_proceso += 1
+        try:
+            if isinstance(update, dict):
+                update = Update.de_json(update, self.application.bot)
+            with capturando(captura):
+                await self.application.process_update(update)
+        except Exception as e:
+            self.fallidas += 1
+            update_id = update["update_id"] if isinstance(update, dict) else update.update_id
+            print(f"Error procesando update {update_id}: {e!r}")
+        finally:
+            self.en_proceso -= 1
+            self.procesadas += 1
+            if captura is not None:
+                await captura.terminar()
+
+    def metricas(self):
+        iniciadas = self.procesadas + self.en_proceso
+        return {
+            "profundidad": self.en_espera,
+            "maximo": self.maximo,
+            "trabajadores": self.num_trabajadores,
+            "en_proceso": self.en_proceso,
+            "procesadas": self.procesadas,
+            "rechazadas": self.rechazadas,
+            "descartadas": self.descartadas,
+            "repetidas": self.repetidas,
+            "fallidas": self.fallidas,
+            "espera_promedio_ms": self.espera_total / iniciadas * 1000 if iniciadas else 0.0,
+            "espera_max_ms": self.espera_max * 1000,
+        }
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """Updates de polling en paralelo entre chats y en orden dentro de cada
+    chat, con hasta `trabajadores` procesándose a la vez.
+
+    Se espera el turno del chat antes de ocupar un trabajador: los updates
+    encolados de un chat no le quitan lugar a los demás.
+    """
+
+    def __init__(self, trabajadores=COLA_TRABAJADORES, maximo=COLA_MAXIMO):
+        super().__init__(maximo)
+        self._trabajadores = asyncio.Semaphore(trabajadores)
+        self._chats = {}   # chat_id -> [Lock, updates del chat en proceso o esperando]
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._trabajadores:
+                await coroutine
+            return
+
+        turno = self._chats.get(chat.id)
+        if turno is None:
+            turno = self._chats[chat.id] = [asyncio.Lock(), 0]
+        turno[1] += 1
+        try:
+            async with turno[0], self._trabajadores:
+                await coroutine
+        finally:
+            turno[1] -= 1
+            if not turno[1]:
+                del self._chats[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
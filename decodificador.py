@@ -0,0 +1,44 @@
+import json
+
+try:
+    import orjson
+    _cargar = orjson.loads
+except ImportError:  # orjson es opcional: mismo resultado, más lento
+    _cargar = json.loads
+
+# Decodificación rápida del cuerpo del webhook. Solo se parsea el JSON (con
+# orjson si está instalado) y se leen chat y texto: eso alcanza para
+# descartar lo que el bot no atiende y para ordenar por chat en la cola.
+# El Update completo (Update.de_json) se arma después, en el trabajador que
+# lo procesa.
+
+# Los handlers del bot solo reaccionan a mensajes de texto nuevos (y
+# comandos): una edición no repite el paso de la compra, se descarta.
+TIPOS_ATENDIDOS = ("message",)
+
+def decodificar(cuerpo):
+    """(datos, chat_id, texto) de un update de texto, o None si se descarta.
+
+    `cuerpo` son los bytes del POST; lanza ValueError si no es JSON válido o
+    no tiene la forma de un update (sin update_id, mensaje sin chat).
+    """
+    datos = _cargar(cuerpo)
+    if not isinstance(datos, dict) or not isinstance(datos.get("update_id"), int):
+        raise ValueError("No es un update de Telegram")
+    for tipo in TIPOS_ATENDIDOS:
+        mensaje = datos.get(tipo)
+        if mensaje is not None:
+            break
+    else:
+        return None
+    if not isinstance(mensaje, dict):
+        raise ValueError(f"{tipo} mal formado")
+
+    texto = mensaje.get("text")
+    if texto is None:
+        return None
+    chat = mensaje.get("chat")
+    chat_id = chat.get("id") if isinstance(chat, dict) else None
+    if chat_id is None:
+        raise ValueError(f"{tipo} sin chat")
+    return datos, chat_id, texto
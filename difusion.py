@@ -0,0 +1,365 @@
+import os
+import time
+import socket
+import asyncio
+from telegram import Update
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.ext import CommandHandler, ContextTypes
+
+from basedatos import obtener_base, transaccion
+from estados_pedido import ADMIN_IDS
+from sesiones import ESQUEMA as ESQUEMA_USUARIOS
+
+# Difusión de promociones a todos los usuarios que alguna vez escribieron
+# (tabla usuarios, ver sesiones.py), con el ritmo que marca LimitadorEnvios (envios.py):
+# - se recorren los user_id en orden, de a DIFUSION_LOTE por consulta, con
+#   hasta DIFUSION_CONCURRENCIA envíos en vuelo; pocos en vuelo = poca
+#   espera para las respuestas normales, que comparten el límite global
+# - al terminar cada lote se guarda el avance: si el proceso se reinicia la
+#   difusión sigue desde ahí (a lo sumo se repite un lote)
+# - una difusión la envía un solo proceso: la toma con un UPDATE en la base
+#   (dueno) y renueva el plazo con cada lote; con varios workers o réplicas
+#   los demás no la reanudan mientras el plazo (DIFUSION_PLAZO) no venza. Cada
+#   DIFUSION_PLAZO se buscan difusiones a medias sin dueño vigente (la de un
+#   proceso que murió)
+# - quien bloqueó al bot queda en usuarios_bloqueados y no se le vuelve a enviar
+# - los envíos que fallan por un error pasajero (red, 429, 5xx) quedan en
+#   difusion_reintentos y se reintentan al final, hasta DIFUSION_REINTENTOS
+#   veces con DIFUSION_ESPERA_REINTENTO segundos (crecientes) entre vueltas
+# Con DIFUSION_PAGADA=1 se usa allow_paid_broadcast de Telegram (hasta 1000
+# mensajes/s, con costo en Stars).
+DIFUSION_LOTE = int(os.getenv("DIFUSION_LOTE", 500))
+DIFUSION_CONCURRENCIA = int(os.getenv("DIFUSION_CONCURRENCIA", 30))
+DIFUSION_PAGADA = os.getenv("DIFUSION_PAGADA", "0") == "1"
+DIFUSION_PLAZO = float(os.getenv("DIFUSION_PLAZO", 5 * 60))
+DIFUSION_REINTENTOS = int(os.getenv("DIFUSION_REINTENTOS", 3))
+DIFUSION_ESPERA_REINTENTO = float(os.getenv("DIFUSION_ESPERA_REINTENTO", 30))
+
+# Este proceso, para el campo dueno
+PROCESO = f"{socket.gethostname()}:{os.getpid()}"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS difusiones (
+    id INTEGER PRIMARY KEY,
+    texto TEXT NOT NULL,
+    creada REAL NOT NULL,
+    terminada REAL,
+    ultimo_user_id INTEGER NOT NULL DEFAULT 0,
+    enviados INTEGER NOT NULL DEFAULT 0,
+    bloqueados INTEGER NOT NULL DEFAULT 0,
+    fallidos INTEGER NOT NULL DEFAULT 0,
+    dueno TEXT,
+    vence REAL
+);
+CREATE TABLE IF NOT EXISTS usuarios_bloqueados (
+    user_id INTEGER PRIMARY KEY,
+    desde REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS difusion_reintentos (
+    difusion_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (difusion_id, user_id)
+) WITHOUT ROWID;
+"""
+
+# Tablas de donde se adoptan los usuarios de antes de la tabla usuarios
+FUENTES = ("carritos", "pedidos", "datos_usuario")
+COLUMNAS = ("id", "texto", "creada", "terminada", "ultimo_user_id", "enviados", "bloqueados", "fallidos")
+
+# PASAJERO: falló por algo que puede andar en otro intento (red, 429, 5xx)
+ENVIADO, BLOQUEADO, FALLIDO, PASAJERO = "enviado", "bloqueado", "fallido", "pasajero"
+
+def _migrar(conexion):
+    columnas = {c[1] for c in conexion.execute("PRAGMA table_info(difusiones)")}
+    if "dueno" not in columnas:
+        conexion.execute("ALTER TABLE difusiones ADD COLUMN dueno TEXT")
+        conexion.execute("ALTER TABLE difusiones ADD COLUMN vence REAL")
+
+def _adoptar_usuarios(conexion):
+    """Con la tabla usuarios recién creada, llenarla con los user_id que ya
+    estaban en la base (una sola vez)"""
+    if conexion.execute("SELECT 1 FROM usuarios LIMIT 1").fetchone():
+        return
+    existentes = {n for (n,) in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    with transaccion(conexion):
+        for tabla in FUENTES:
+            if tabla in existentes:
+                conexion.execute(
+                    f"INSERT OR IGNORE INTO usuarios (user_id, desde) SELECT user_id, ? FROM {tabla}",
+                    (time.time(),),
+                )
+
+SQL_DESTINATARIOS = (
+    "SELECT user_id FROM usuarios WHERE user_id > ? "
+    "AND user_id NOT IN (SELECT user_id FROM usuarios_bloqueados) "
+    "ORDER BY user_id LIMIT ?"
+)
+
+def _destinatarios(conexion, desde, limite):
+    return [user_id for (user_id,) in conexion.execute(SQL_DESTINATARIOS, (desde, limite))]
+
+def _crear(conexion, texto):
+    with transaccion(conexion):
+        return conexion.execute(
+            "INSERT INTO difusiones (texto, creada) VALUES (?, ?)", (texto, time.time())
+        ).lastrowid
+
+def _obtener(conexion, difusion_id):
+    fila = conexion.execute(
+        f"SELECT {', '.join(COLUMNAS)} FROM difusiones WHERE id = ?", (difusion_id,)
+    ).fetchone()
+    if fila is None:
+        return None
+    difusion = dict(zip(COLUMNAS, fila))
+    (difusion["por_reintentar"],) = conexion.execute(
+        "SELECT COUNT(*) FROM difusion_reintentos WHERE difusion_id = ?", (difusion_id,)
+    ).fetchone()
+    return difusion
+
+def _pendientes(conexion):
+    return [i for (i,) in conexion.execute("SELECT id FROM difusiones WHERE terminada IS NULL ORDER BY id")]
+
+def _tomar(conexion, difusion_id, dueno):
+    """True si la difusión queda a cargo de `dueno`: no la tenía nadie, ya era
+    suya o al anterior se le venció el plazo"""
+    ahora = time.time()
+    with transaccion(conexion):
+        return conexion.execute(
+            "UPDATE difusiones SET dueno = ?, vence = ? WHERE id = ? AND terminada IS NULL "
+            "AND (dueno IS NULL OR dueno = ? OR vence < ?)",
+            (dueno, ahora + DIFUSION_PLAZO, difusion_id, dueno, ahora),
+        ).rowcount == 1
+
+def _renovar(conexion, difusion_id, dueno, ahora):
+    """Extender el plazo; False si otro proceso la tomó (ya no hay que seguir)"""
+    return conexion.execute(
+        "UPDATE difusiones SET vence = ? WHERE id = ? AND dueno = ?",
+        (ahora + DIFUSION_PLAZO, difusion_id, dueno),
+    ).rowcount == 1
+
+def _anotar(conexion, difusion_id, ids, resultados, ahora):
+    bloqueados = [(u, ahora) for u, r in zip(ids, resultados) if r == BLOQUEADO]
+    conexion.executemany(
+        "INSERT OR IGNORE INTO usuarios_bloqueados (user_id, desde) VALUES (?, ?)", bloqueados
+    )
+    return resultados.count(ENVIADO), len(bloqueados), resultados.count(FALLIDO)
+
+def _avanzar(conexion, difusion_id, dueno, ids, resultados):
+    """Guardar un lote de la primera pasada: los errores pasajeros quedan para reintentar"""
+    ahora = time.time()
+    with transaccion(conexion):
+        if not _renovar(conexion, difusion_id, dueno, ahora):
+            return False
+        enviados, bloqueados, fallidos = _anotar(conexion, difusion_id, ids, resultados, ahora)
+        conexion.executemany(
+            "INSERT OR IGNORE INTO difusion_reintentos (difusion_id, user_id) VALUES (?, ?)",
+            [(difusion_id, u) for u, r in zip(ids, resultados) if r == PASAJERO],
+        )
+        conexion.execute(
+            "UPDATE difusiones SET ultimo_user_id = ?, enviados = enviados + ?, "
+            "bloqueados = bloqueados + ?, fallidos = fallidos + ? WHERE id = ?",
+            (ids[-1], enviados, bloqueados, fallidos, difusion_id),
+        )
+    return True
+
+def _por_reintentar(conexion, difusion_id, desde, limite):
+    return [user_id for (user_id,) in conexion.execute(
+        "SELECT user_id FROM difusion_reintentos WHERE difusion_id = ? AND user_id > ? "
+        "ORDER BY user_id LIMIT ?",
+        (difusion_id, desde, limite),
+    )]
+
+def _reintentado(conexion, difusion_id, dueno, ids, resultados, ultima_vuelta):
+    """Guardar un lote de reintentos: salen los que ya se resolvieron y, en
+    la última vuelta, también los que siguen fallando (cuentan como fallidos)"""
+    ahora = time.time()
+    with transaccion(conexion):
+        if not _renovar(conexion, difusion_id, dueno, ahora):
+            return False
+        enviados, bloqueados, _ = _anotar(conexion, difusion_id, ids, resultados, ahora)
+        resueltos = [u for u, r in zip(ids, resultados) if r != PASAJERO or ultima_vuelta]
+        conexion.executemany(
+            "DELETE FROM difusion_reintentos WHERE difusion_id = ? AND user_id = ?",
+            [(difusion_id, u) for u in resueltos],
+        )
+        conexion.execute(
+            "UPDATE difusiones SET enviados = enviados + ?, bloqueados = bloqueados + ?, "
+            "fallidos = fallidos + ? WHERE id = ?",
+            (enviados, bloqueados, len(resueltos) - enviados - bloqueados, difusion_id),
+        )
+    return True
+
+def _terminar(conexion, difusion_id, dueno):
+    with transaccion(conexion):
+        conexion.execute(
+            "UPDATE difusiones SET terminada = ?, dueno = NULL, vence = NULL WHERE id = ? AND dueno = ?",
+            (time.time(), difusion_id, dueno),
+        )
+
+class Difusion:
+    def __init__(self, bot, base=None, lote=DIFUSION_LOTE,
+                 concurrencia=DIFUSION_CONCURRENCIA, pagada=DIFUSION_PAGADA,
+                 reintentos=DIFUSION_REINTENTOS, espera_reintento=DIFUSION_ESPERA_REINTENTO, dueno=PROCESO):
+        self.bot = bot
+        self.base = base or obtener_base()
+        self.base.conexion.executescript(ESQUEMA + ESQUEMA_USUARIOS)
+        _migrar(self.base.conexion)
+        _adoptar_usuarios(self.base.conexion)
+        self.lote = lote
+        self.concurrencia = concurrencia
+        self.pagada = pagada
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.dueno = dueno
+        self.en_curso = set()
+
+    async def crear(self, texto):
+        return await self.base.ejecutar(_crear, texto)
+
+    async def obtener(self, difusion_id):
+        return await self.base.ejecutar(_obtener, difusion_id)
+
+    async def pendientes(self):
+        return await self.base.ejecutar(_pendientes)
+
+    async def _enviar(self, user_id, texto, semaforo):
+        extra = {"allow_paid_broadcast": True} if self.pagada else {}
+        async with semaforo:
+            try:
+                await self.bot.send_message(user_id, texto, **extra)
+            except Forbidden:
+                # Bloqueó al bot o borró su cuenta
+                return BLOQUEADO
+            except BadRequest as e:
+                # Otro intento daría el mismo error
+                return BLOQUEADO if "chat not found" in str(e).lower() else FALLIDO
+            except TelegramError:
+                return PASAJERO
+        return ENVIADO
+
+    async def _enviar_lote(self, ids, texto, semaforo):
+        return list(await asyncio.gather(*(self._enviar(user_id, texto, semaforo) for user_id in ids)))
+
+    async def tomar(self, difusion_id):
+        """True si este proceso puede enviar la difusión ahora: no la está
+        enviando ya y ningún otro la tiene (ver _tomar)"""
+        if difusion_id in self.en_curso:
+            return False
+        return await self.base.ejecutar(_tomar, difusion_id, self.dueno)
+
+    async def ejecutar(self, difusion_id):
+        """Enviar (o seguir enviando) una difusión; devuelve sus estadísticas,
+        o None si la está enviando otro proceso"""
+        if not await self.tomar(difusion_id):
+            return None
+        self.en_curso.add(difusion_id)
+        try:
+            return await self._ejecutar(difusion_id)
+        finally:
+            self.en_curso.discard(difusion_id)
+
+    async def _ejecutar(self, difusion_id):
+        difusion = await self.obtener(difusion_id)
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        texto = difusion["texto"]
+
+        desde = difusion["ultimo_user_id"]
+        while True:
+            ids = await self.base.ejecutar(_destinatarios, desde, self.lote)
+            if not ids:
+                break
+            resultados = await self._enviar_lote(ids, texto, semaforo)
+            if not await self.base.ejecutar(_avanzar, difusion_id, self.dueno, ids, resultados):
+                return None
+            desde = ids[-1]
+
+        for vuelta in range(1, self.reintentos + 1):
+            if not await self.base.ejecutar(_por_reintentar, difusion_id, 0, 1):
+                break
+            await asyncio.sleep(self.espera_reintento * vuelta)
+            desde = 0
+            while True:
+                ids = await self.base.ejecutar(_por_reintentar, difusion_id, desde, self.lote)
+                if not ids:
+                    break
+                resultados = await self._enviar_lote(ids, texto, semaforo)
+                if not await self.base.ejecutar(
+                    _reintentado, difusion_id, self.dueno, ids, resultados, vuelta == self.reintentos
+                ):
+                    return None
+                desde = ids[-1]
+
+        await self.base.ejecutar(_terminar, difusion_id, self.dueno)
+        return await self.obtener(difusion_id)
+
+def resumen(difusion):
+    fin = difusion["terminada"] or time.time()
+    duracion = max(fin - difusion["creada"], 1e-9)
+    estado = "terminada" if difusion["terminada"] else "en curso"
+    reintentos = f"🔁 Por reintentar: {difusion['por_reintentar']}\n" if difusion["por_reintentar"] else ""
+    return (
+        f"📣 Difusión #{difusion['id']} ({estado})\n"
+        f"✅ Enviados: {difusion['enviados']}\n"
+        f"🚫 Bloqueados: {difusion['bloqueados']}\n"
+        f"⚠️ Fallidos: {difusion['fallidos']}\n"
+        f"{reintentos}"
+        f"⏱️ {duracion:.0f} s, {difusion['enviados'] / duracion:.1f} mensajes/s"
+    )
+
+_difusion = None
+
+def obtener_difusion(bot):
+    global _difusion
+    if _difusion is None:
+        _difusion = Difusion(bot)
+    return _difusion
+
+async def _correr(difusion, difusion_id, admin_id=None):
+    estadisticas = await difusion.ejecutar(difusion_id)
+    if estadisticas is None:
+        print(f"📣 Difusión #{difusion_id}: la envía otro proceso")
+        return
+    print(resumen(estadisticas))
+    if admin_id is not None:
+        await difusion.bot.send_message(admin_id, resumen(estadisticas))
+
+async def difundir(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/difundir <texto>: enviar una promoción a todos los usuarios (solo administradores)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    texto = update.message.text.partition(" ")[2].strip()
+    if not texto:
+        await update.message.reply_text("Uso: /difundir <texto de la promoción>")
+        return
+
+    difusion = obtener_difusion(context.bot)
+    difusion_id = await difusion.crear(texto)
+    context.application.create_task(_correr(difusion, difusion_id, update.effective_user.id))
+    await update.message.reply_text(f"📣 Difusión #{difusion_id} en marcha. Consulta con /difusion {difusion_id}")
+
+async def estado_difusion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/difusion <id>: avance de una difusión"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Uso: /difusion <id>")
+        return
+    difusion = await obtener_difusion(context.bot).obtener(int(context.args[0]))
+    if difusion is None:
+        await update.message.reply_text("❌ No existe esa difusión")
+        return
+    await update.message.reply_text(resumen(difusion))
+
+async def reanudar_pendientes(context: ContextTypes.DEFAULT_TYPE):
+    """Seguir las difusiones que quedaron a medias y que ningún otro proceso
+    está enviando"""
+    difusion = obtener_difusion(context.bot)
+    for difusion_id in await difusion.pendientes():
+        if await difusion.tomar(difusion_id):
+            print(f"📣 Reanudando difusión #{difusion_id}")
+            context.application.create_task(_correr(difusion, difusion_id))
+
+def registrar_difusion(application):
+    application.add_handler(CommandHandler("difundir", difundir))
+    application.add_handler(CommandHandler("difusion", estado_difusion))
+    application.job_queue.run_repeating(reanudar_pendientes, interval=DIFUSION_PLAZO, first=1)
@@ -0,0 +1,191 @@
+import os
+import ssl
+import time
+import asyncio
+import httpx
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from telegram.request import HTTPXRequest
+
+from metricas import PeticionMedida
+import respuesta_directa
+
+# Salida hacia el Bot API:
+# - un pool de conexiones keep-alive por Application, con tamaño, HTTP/2 y
+#   timeouts configurables
+# - un limitador que respeta los límites de Telegram (global y por chat)
+#   haciendo esperar a los envíos en vez de dejarlos chocar con 429. La
+#   espera pasa dentro del handler que envía; en polling y en los webhooks
+#   los chats se procesan en paralelo (cola.py), así solo espera ese chat
+BOT_POOL = int(os.getenv("BOT_POOL", 256))
+BOT_KEEPALIVE = float(os.getenv("BOT_KEEPALIVE", 60))
+# HTTP/2 requiere python-telegram-bot[http2]
+BOT_HTTP2 = os.getenv("BOT_HTTP2", "0") == "1"
+BOT_TIMEOUT_CONEXION = float(os.getenv("BOT_TIMEOUT_CONEXION", 5))
+BOT_TIMEOUT_LECTURA = float(os.getenv("BOT_TIMEOUT_LECTURA", 5))
+BOT_TIMEOUT_ESCRITURA = float(os.getenv("BOT_TIMEOUT_ESCRITURA", 5))
+BOT_TIMEOUT_POOL = float(os.getenv("BOT_TIMEOUT_POOL", 3))
+
+# Límites de Telegram: ~30 mensajes/s en total, ~1/s por chat privado (con
+# ráfagas cortas) y 20/min por grupo
+ENVIOS_LIMITADOR = os.getenv("ENVIOS_LIMITADOR", "1") == "1"
+ENVIOS_POR_SEGUNDO = float(os.getenv("ENVIOS_POR_SEGUNDO", 30))
+ENVIOS_POR_CHAT = float(os.getenv("ENVIOS_POR_CHAT", 1))
+RAFAGA_CHAT = int(os.getenv("RAFAGA_CHAT", 3))
+ENVIOS_POR_GRUPO = 20 / 60
+# Envíos con allow_paid_broadcast (difusiones pagadas): hasta 1000/s
+ENVIOS_PAGADOS_POR_SEGUNDO = float(os.getenv("ENVIOS_PAGADOS_POR_SEGUNDO", 1000))
+ENVIOS_REINTENTOS = int(os.getenv("ENVIOS_REINTENTOS", 2))
+# Cada cuántos envíos se descartan las cubetas de chats inactivos
+LIMPIEZA_CUBETAS = 1000
+
+_contexto_tls = None
+
+def contexto_tls():
+    """Contexto TLS compartido por todos los clientes del Bot API.
+
+    httpx arma uno por cliente y cargar los certificados (certifi) cuesta
+    decenas de ms de CPU en cada arranque en frío.
+    """
+    global _contexto_tls
+    if _contexto_tls is None:
+        import certifi
+        _contexto_tls = ssl.create_default_context(cafile=certifi.where())
+    return _contexto_tls
+
+class PeticionBot(PeticionMedida):
+    """Pool medido que además puede contestar dentro del webhook (ver respuesta_directa.py)"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        captura = respuesta_directa.actual()
+        if captura is not None:
+            return await captura.enviar(super().do_request, url, method, request_data, kwargs)
+        return await super().do_request(url, method, request_data, **kwargs)
+
+def crear_peticion(pool=BOT_POOL, http2=BOT_HTTP2):
+    """Cliente HTTP para los métodos del Bot API (no getUpdates)"""
+    limites = httpx.Limits(
+        max_connections=pool,
+        max_keepalive_connections=pool,
+        keepalive_expiry=BOT_KEEPALIVE,
+    )
+    return PeticionBot(
+        connection_pool_size=pool,
+        http_version="2" if http2 else "1.1",
+        connect_timeout=BOT_TIMEOUT_CONEXION,
+        read_timeout=BOT_TIMEOUT_LECTURA,
+        write_timeout=BOT_TIMEOUT_ESCRITURA,
+        pool_timeout=BOT_TIMEOUT_POOL,
+        httpx_kwargs={"limits": limites, "verify": contexto_tls()},
+    )
+
+def crear_peticion_updates():
+    """Cliente para getUpdates (solo se usa con polling; los webhooks ni lo abren)"""
+    return HTTPXRequest(connection_pool_size=1, httpx_kwargs={"verify": contexto_tls()})
+
+class Cubeta:
+    """Token bucket como GCRA: cada envío reserva su turno al llegar"""
+
+    __slots__ = ("intervalo", "tolerancia", "turno")
+
+    def __init__(self, por_segundo, rafaga=1):
+        self.intervalo = 1 / por_segundo
+        self.tolerancia = (rafaga - 1) * self.intervalo
+        self.turno = 0.0  # instante teórico del próximo envío
+
+    def reservar(self, ahora):
+        """Segundos a esperar antes de enviar (el turno queda tomado)"""
+        turno = max(self.turno, ahora)
+        self.turno = turno + self.intervalo
+        return max(0.0, turno - self.tolerancia - ahora)
+
+    def tomar(self, ahora):
+        """Tomar el turno solo si no hay que esperar; False si la cubeta está vacía"""
+        turno = max(self.turno, ahora)
+        # (con margen para el error de redondeo de sumar intervalos)
+        if turno - self.tolerancia > ahora + 1e-9:
+            return False
+        self.turno = turno + self.intervalo
+        return True
+
+    def pausar(self, hasta):
+        self.turno = max(self.turno, hasta)
+
+class LimitadorEnvios(BaseRateLimiter):
+    """Encola los envíos para no pasar los límites de Telegram.
+
+    Si aun así llega un 429 (otro proceso con el mismo token, límites más
+    bajos de lo esperado) se pausa la cubeta global el tiempo pedido, así
+    los demás envíos esperan en vez de reintentar todos a la vez.
+    """
+
+    def __init__(self, por_segundo=ENVIOS_POR_SEGUNDO, por_chat=ENVIOS_POR_CHAT,
+                 rafaga_chat=RAFAGA_CHAT, reintentos=ENVIOS_REINTENTOS):
+        self.por_chat = por_chat
+        self.rafaga_chat = rafaga_chat
+        self.reintentos = reintentos
+        self._global = Cubeta(por_segundo)
+        self._pagados = Cubeta(ENVIOS_PAGADOS_POR_SEGUNDO)
+        self._chats = {}
+        self._envios = 0
+
+        # Métricas
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.reintentados = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    def _cubeta_chat(self, chat_id):
+        cubeta = self._chats.get(chat_id)
+        if cubeta is None:
+            # Grupos y canales: id negativo o @usuario
+            grupo = isinstance(chat_id, str) or chat_id < 0
+            cubeta = self._chats[chat_id] = (
+                Cubeta(ENVIOS_POR_GRUPO) if grupo else Cubeta(self.por_chat, self.rafaga_chat)
+            )
+        return cubeta
+
+    def _limpiar(self, ahora):
+        vencidas = [c for c, cubeta in self._chats.items() if cubeta.turno < ahora]
+        for chat_id in vencidas:
+            del self._chats[chat_id]
+
+    def _turno(self, chat_id, pagado=False):
+        ahora = time.monotonic()
+        self._envios += 1
+        if self._envios % LIMPIEZA_CUBETAS == 0:
+            self._limpiar(ahora)
+        espera = (self._pagados if pagado else self._global).reservar(ahora)
+        if chat_id is not None:
+            espera = max(espera, self._cubeta_chat(chat_id).reservar(ahora))
+        return espera
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        pagado = bool(data.get("allow_paid_broadcast"))
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+
+        intento = 0
+        while True:
+            espera = self._turno(chat_id, pagado)
+            if espera > 0:
+                self.esperas += 1
+                self.espera_total += espera
+                await asyncio.sleep(espera)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if intento >= self.reintentos:
+                    raise
+                intento += 1
+                self.reintentados += 1
+                segundos = e.retry_after
+                if not isinstance(segundos, (int, float)):
+                    segundos = segundos.total_seconds()
+                self._global.pausar(time.monotonic() + segundos)
@@ -0,0 +1,74 @@
+import os
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from repositorio_pedidos import obtener_repositorio
+from generador_ids import normalizar as normalizar_id_pedido
+
+# Ciclo de vida de un pedido. Cada cambio de estado se avisa al cliente por
+# su chat (JobQueue), así no necesita consultar "📦 Estado de Pedido" a cada rato.
+ESTADOS = ("pendiente", "preparación", "en ruta", "entregado")
+SIGUIENTE = dict(zip(ESTADOS, ESTADOS[1:]))
+
+AVISOS = {
+    "preparación": "👨‍🍳 Estamos preparando tu pedido #{id}.",
+    "en ruta": "🚚 ¡Tu pedido #{id} va en camino!",
+    "entregado": "✅ Tu pedido #{id} fue entregado. ¡Gracias por tu compra! 😊",
+}
+
+# Usuarios que pueden cambiar estados con /avanzar (ids separados por coma)
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip()}
+
+class TransicionInvalida(Exception):
+    pass
+
+async def cambiar_estado(application, pedido_id, hacia=None):
+    """Pasar el pedido a `hacia` (por defecto, el estado siguiente) y avisar al cliente.
+
+    Devuelve el pedido tal como estaba antes del cambio.
+    """
+    repositorio = obtener_repositorio()
+    pedido = await repositorio.obtener(pedido_id)
+    if pedido is None:
+        raise TransicionInvalida(f"No existe el pedido #{pedido_id}")
+
+    desde = pedido["estado"]
+    hacia = hacia or SIGUIENTE.get(desde)
+    if hacia is None or SIGUIENTE.get(desde) != hacia:
+        raise TransicionInvalida(f"El pedido #{pedido_id} no puede pasar de '{desde}' a '{hacia}'")
+    if not await repositorio.actualizar_estado(pedido_id, desde, hacia):
+        raise TransicionInvalida(f"El pedido #{pedido_id} cambió mientras tanto, intenta de nuevo")
+
+    application.job_queue.run_once(
+        avisar_cliente, 0, chat_id=pedido["user_id"],
+        data={"id": pedido_id, "estado": hacia}, name=f"aviso-{pedido_id}"
+    )
+    return pedido
+
+async def avisar_cliente(context: ContextTypes.DEFAULT_TYPE):
+    datos = context.job.data
+    await context.bot.send_message(context.job.chat_id, AVISOS[datos["estado"]].format(id=datos["id"]))
+
+async def avanzar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/avanzar <pedido> [estado]: solo administradores"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    if not context.args:
+        await update.message.reply_text(
+            "Uso: /avanzar <pedido> [estado]\nEstados: " + " → ".join(ESTADOS)
+        )
+        return
+
+    pedido_id = normalizar_id_pedido(context.args[0].lstrip('#'))
+    hacia = " ".join(context.args[1:]).lower() or None
+    try:
+        pedido = await cambiar_estado(context.application, pedido_id, hacia)
+    except TransicionInvalida as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    await update.message.reply_text(
+        f"✅ Pedido #{pedido_id}: {pedido['estado']} → {hacia or SIGUIENTE[pedido['estado']]}"
+    )
+
+def registrar_estados(application):
+    application.add_handler(CommandHandler("avanzar", avanzar))
@@ -0,0 +1,63 @@
+from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters
+
+import intenciones as it
+from metricas import medir
+
+# Flujo de la conversación declarado como datos: cada estado dice qué
+# intenciones atiende y con qué handler, y qué handler recibe el resto del
+# texto. compilar() lo convierte una sola vez en el ConversationHandler que
+# usan polling y webhooks.
+# - un único MessageHandler por estado: ConversationHandler lo ubica por su
+#   estado (dict) y el despachador elige la ruta recorriendo las intenciones
+#   del estado en orden, sin probar filtros de otros handlers
+# - en los estados de texto libre (dirección, número de pedido, mensaje
+#   para un agente) las intenciones solo cuentan si el mensaje no trae nada
+#   más: "Calle Principal #123" es una dirección, no "volver al menú"
+# - solo mensajes nuevos: editar un mensaje viejo no vuelve a correr su paso
+#   (update.message es None en una edición)
+
+class Paso:
+    """Un estado de la conversación"""
+
+    __slots__ = ("manejar", "rutas", "texto_libre")
+
+    def __init__(self, manejar, rutas=(), texto_libre=False):
+        self.manejar = manejar          # handler del texto que no es una ruta
+        self.rutas = tuple(rutas)       # (intención, handler) en orden de prioridad
+        self.texto_libre = texto_libre
+
+def _despachador(estado, paso, nombres):
+    rutas = tuple((intencion, medir(handler, estado, nombres)) for intencion, handler in paso.rutas)
+    manejar = medir(paso.manejar, estado, nombres)
+    detectar = it.intenciones_estrictas if paso.texto_libre else it.intenciones
+
+    async def despachar(update, context):
+        if rutas:
+            encontradas = detectar(update.message.text)
+            for intencion, handler in rutas:
+                if intencion in encontradas:
+                    return await handler(update, context)
+        return await manejar(update, context)
+
+    despachar.__name__ = f"despachar_{nombres.get(estado, estado)}"
+    return despachar
+
+def compilar(flujo, nombres, inicio, cancelar, **opciones):
+    """ConversationHandler para `flujo` ({estado: Paso}).
+
+    `inicio` y `cancelar` son los handlers de /start y /cancel; `nombres`
+    traduce los estados a las etiquetas de /metrics. El resto de las
+    opciones pasan tal cual a ConversationHandler.
+    """
+    nombres = {ConversationHandler.END: "END", **nombres}
+    nuevos = filters.UpdateType.MESSAGE
+    texto = nuevos & filters.TEXT & ~filters.COMMAND
+    return ConversationHandler(
+        entry_points=[CommandHandler("start", medir(inicio, "inicio", nombres), filters=nuevos)],
+        states={
+            estado: [MessageHandler(texto, _despachador(estado, paso, nombres))]
+            for estado, paso in flujo.items()
+        },
+        fallbacks=[CommandHandler("cancel", medir(cancelar, "fallback", nombres), filters=nuevos)],
+        **opciones,
+    )
@@ -0,0 +1,137 @@
+import os
+import time
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+# IDs de pedido estilo Snowflake: 64 bits ordenados por tiempo
+#   41 bits  milisegundos desde EPOCA (alcanza ~69 años)
+#   10 bits  nodo (proceso); único por máquina o fijado con NODO_ID
+#   12 bits  secuencia dentro del mismo milisegundo (4096 por ms y nodo)
+# Se muestran en base32 Crockford de ancho fijo con prefijo "P", así el orden
+# alfabético coincide con el cronológico (sirve para consultas por rango).
+
+EPOCA_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+BITS_NODO = 10
+BITS_SECUENCIA = 12
+MAX_NODO = (1 << BITS_NODO) - 1
+MAX_SECUENCIA = (1 << BITS_SECUENCIA) - 1
+
+ALFABETO = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+VALORES = {c: i for i, c in enumerate(ALFABETO)}
+# Confusiones típicas al teclear el número de pedido
+VALORES.update({"O": 0, "I": 1, "L": 1})
+ANCHO = 13  # 64 bits en base32
+PREFIJO = "P"
+
+def codificar(numero):
+    chars = []
+    for _ in range(ANCHO):
+        numero, resto = divmod(numero, 32)
+        chars.append(ALFABETO[resto])
+    return PREFIJO + "".join(reversed(chars))
+
+def decodificar(texto):
+    """Número de un ID; ValueError si no tiene el formato esperado"""
+    texto = texto.strip().upper()
+    if texto.startswith(PREFIJO):
+        texto = texto[len(PREFIJO):]
+    if len(texto) != ANCHO:
+        raise ValueError(f"ID de pedido inválido: {texto!r}")
+    numero = 0
+    for c in texto:
+        if c not in VALORES:
+            raise ValueError(f"ID de pedido inválido: {texto!r}")
+        numero = numero * 32 + VALORES[c]
+    return numero
+
+def normalizar(texto):
+    """Forma canónica de un ID tecleado por el usuario (o el texto tal cual)"""
+    try:
+        return codificar(decodificar(texto))
+    except ValueError:
+        return texto.strip().upper()
+
+def fecha_de_id(texto):
+    ms = (decodificar(texto) >> (BITS_NODO + BITS_SECUENCIA)) + EPOCA_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+def id_minimo(fecha):
+    """Menor ID posible en `fecha`: límite para consultas por rango de IDs"""
+    ms = int(fecha.timestamp() * 1000) - EPOCA_MS
+    return codificar(max(ms, 0) << (BITS_NODO + BITS_SECUENCIA))
+
+# --- NODO ---
+def _reservar_nodo():
+    """Reservar un número de nodo libre en esta máquina.
+
+    Cada proceso bloquea un archivo nodo-N.lock; el sistema libera el bloqueo
+    al terminar el proceso, así que los workers reutilizan números sin chocar.
+    """
+    if os.getenv("NODO_ID"):
+        return int(os.getenv("NODO_ID")) & MAX_NODO, None
+
+    try:
+        import fcntl
+    except ImportError:  # Windows: sin flock, usamos el pid
+        return os.getpid() & MAX_NODO, None
+
+    directorio = os.getenv("NODO_LOCK_DIR", tempfile.gettempdir())
+    for nodo in range(MAX_NODO + 1):
+        archivo = open(os.path.join(directorio, f"aguas-nodo-{nodo}.lock"), "w")
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            continue
+        return nodo, archivo
+    raise RuntimeError("No hay números de nodo libres")
+
+class GeneradorIds:
+    def __init__(self, nodo=None):
+        self._lock = threading.Lock()
+        self._nodo_fijo = nodo
+        self._pid = None
+        self._candado = None
+        self.nodo = None
+        self._ultimo_ms = -1
+        self._secuencia = 0
+
+    def _preparar(self):
+        # También tras un fork: el hijo necesita su propio nodo
+        self._pid = os.getpid()
+        if self._nodo_fijo is not None:
+            self.nodo = self._nodo_fijo & MAX_NODO
+        else:
+            self.nodo, self._candado = _reservar_nodo()
+
+    def siguiente(self):
+        """Nuevo ID numérico, estrictamente creciente en este proceso"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._preparar()
+
+            ahora = time.time_ns() // 1_000_000 - EPOCA_MS
+            if ahora > self._ultimo_ms:
+                self._ultimo_ms = ahora
+                self._secuencia = 0
+            else:
+                # Mismo milisegundo o reloj atrasado: seguimos desde el último
+                self._secuencia += 1
+                if self._secuencia > MAX_SECUENCIA:
+                    self._ultimo_ms += 1
+                    self._secuencia = 0
+
+            return (
+                (self._ultimo_ms << (BITS_NODO + BITS_SECUENCIA))
+                | (self.nodo << BITS_SECUENCIA)
+                | self._secuencia
+            )
+
+    def nuevo_id(self):
+        return codificar(self.siguiente())
+
+_generador = GeneradorIds()
+
+def nuevo_id_pedido():
+    return _generador.nuevo_id()
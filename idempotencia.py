@@ -0,0 +1,160 @@
+import os
+
+from basedatos import obtener_base
+
+# Idempotencia del webhook: si no respondemos a tiempo Telegram reintenta la
+# entrega y el mismo update (mismo update_id) llega dos veces; procesarlo de
+# nuevo podría confirmar dos veces el mismo pedido. Los repetidos se
+# descartan en el webhook, antes de encolarlos y de armar el Update.
+# - los update_id de un bot son consecutivos: se recuerdan los últimos
+#   VISTOS_VENTANA en un bitmap circular, un bit por id (128 KiB para 2^20
+#   ids, contra ~100 B por id en un set de ints)
+# - los que llegan desordenados dentro de la ventana se distinguen bien; uno
+#   más viejo que la ventana se toma como repetido (ningún reintento llega
+#   tan tarde)
+# - tras una semana sin updates Telegram empieza una secuencia al azar: un
+#   salto de más de dos ventanas reinicia el bitmap
+# - si la cola está llena (503) el id se olvida: Telegram lo va a reintentar
+# - con VISTOS_COMPARTIDOS=1 además se registran en la base (tabla
+#   updates_vistos) para varios procesos detrás del mismo webhook
+VISTOS_VENTANA = int(os.getenv("VISTOS_VENTANA", 1 << 20))
+VISTOS_COMPARTIDOS = os.getenv("VISTOS_COMPARTIDOS", "0") == "1"
+
+# Cada cuántos ids se borran de la tabla compartida los que salieron de la ventana
+PODA_CADA = 1024
+
+class UpdatesVistos:
+    """Los últimos `ventana` update_id recibidos, un bit por id"""
+
+    __slots__ = ("ventana", "bits", "maximo", "repetidos")
+
+    def __init__(self, ventana=VISTOS_VENTANA):
+        self.ventana = max(8, (ventana + 7) // 8 * 8)
+        self.bits = bytearray(self.ventana // 8)
+        self.maximo = None      # mayor update_id recibido
+        self.repetidos = 0
+
+    def registrar(self, update_id):
+        """True si el update_id es nuevo (y queda registrado), False si es repetido"""
+        posicion = update_id % self.ventana
+        bit = 1 << (posicion & 7)
+        posicion >>= 3
+        maximo = self.maximo
+        if maximo is not None:
+            diferencia = update_id - maximo
+            if diferencia == 1:
+                # Lo común: el siguiente de la secuencia
+                self.bits[posicion] |= bit
+                self.maximo = update_id
+                return True
+            if -self.ventana < diferencia <= 0:
+                if self.bits[posicion] & bit:
+                    self.repetidos += 1
+                    return False
+                self.bits[posicion] |= bit
+                return True
+            if -2 * self.ventana <= diferencia <= 0:
+                # Más viejo que la ventana
+                self.repetidos += 1
+                return False
+            if 0 < diferencia <= 2 * self.ventana:
+                # Los ids salteados entran a la ventana: sus posiciones
+                # tienen bits de ids que ya salieron
+                self._limpiar(maximo + 1, update_id - 1)
+                self.bits[posicion] |= bit
+                self.maximo = update_id
+                return True
+        # Primero o secuencia nueva
+        self.bits[:] = bytes(len(self.bits))
+        self.bits[posicion] |= bit
+        self.maximo = update_id
+        return True
+
+    def olvidar(self, update_id):
+        """Quitar un update_id registrado (no se pudo encolar: Telegram lo reintentará)"""
+        if self.maximo is not None and 0 <= self.maximo - update_id < self.ventana:
+            posicion = update_id % self.ventana
+            self.bits[posicion >> 3] &= ~(1 << (posicion & 7))
+
+    async def es_nuevo(self, update_id):
+        return self.registrar(update_id)
+
+    async def descartar(self, update_id):
+        self.olvidar(update_id)
+
+    def _limpiar(self, desde, hasta):
+        """Borrar los bits de los ids desde..hasta (inclusive)"""
+        cantidad = hasta - desde + 1
+        if cantidad >= self.ventana:
+            self.bits[:] = bytes(len(self.bits))
+            return
+        inicio = desde % self.ventana
+        fin = inicio + cantidad
+        if fin <= self.ventana:
+            self._limpiar_posiciones(inicio, fin)
+        else:
+            self._limpiar_posiciones(inicio, self.ventana)
+            self._limpiar_posiciones(0, fin - self.ventana)
+
+    def _limpiar_posiciones(self, inicio, fin):
+        # Bits sueltos en las puntas, bytes enteros en el medio
+        bits = self.bits
+        while inicio < fin and inicio & 7:
+            bits[inicio >> 3] &= ~(1 << (inicio & 7))
+            inicio += 1
+        while fin > inicio and fin & 7:
+            fin -= 1
+            bits[fin >> 3] &= ~(1 << (fin & 7))
+        bits[inicio >> 3:fin >> 3] = bytes((fin - inicio) >> 3)
+
+def _insertar(conexion, update_id, ventana):
+    nuevo = conexion.execute(
+        "INSERT OR IGNORE INTO updates_vistos (update_id) VALUES (?)", (update_id,)
+    ).rowcount == 1
+    if nuevo and update_id % PODA_CADA == 0:
+        conexion.execute(
+            "DELETE FROM updates_vistos WHERE update_id NOT BETWEEN ? AND ?",
+            (update_id - ventana, update_id + ventana),
+        )
+    return nuevo
+
+def _borrar(conexion, update_id):
+    conexion.execute("DELETE FROM updates_vistos WHERE update_id = ?", (update_id,))
+
+class UpdatesVistosCompartidos:
+    """UpdatesVistos en memoria más la tabla updates_vistos de la base.
+
+    El bitmap descarta sin ir a la base los repetidos que ya pasaron por este
+    proceso; la tabla, los que recibió otro.
+    """
+
+    def __init__(self, base=None, ventana=VISTOS_VENTANA):
+        self.base = base or obtener_base()
+        self.base.conexion.execute(
+            "CREATE TABLE IF NOT EXISTS updates_vistos (update_id INTEGER PRIMARY KEY)"
+        )
+        self.locales = UpdatesVistos(ventana)
+
+    @property
+    def repetidos(self):
+        return self.locales.repetidos
+
+    async def es_nuevo(self, update_id):
+        if not self.locales.registrar(update_id):
+            return False
+        if await self.base.ejecutar(_insertar, update_id, self.locales.ventana):
+            return True
+        self.locales.repetidos += 1
+        return False
+
+    async def descartar(self, update_id):
+        self.locales.olvidar(update_id)
+        await self.base.ejecutar(_borrar, update_id)
+
+_vistos = None
+
+def obtener_vistos():
+    global _vistos
+    if _vistos is None:
+        _vistos = UpdatesVistosCompartidos() if VISTOS_COMPARTIDOS else UpdatesVistos()
+    return _vistos
@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+
+# Detección de intenciones en texto libre. Todas las palabras clave van en una
+# sola expresión regular compilada al importar, así cada mensaje se recorre
+# una vez sin importar cuántas intenciones se consulten después.
+# Igual que antes, basta con que la palabra aparezca dentro del texto
+# ("🔙 Menú Principal" -> volver, "💧 Comprar Agua" -> comprar).
+
+VOLVER = "volver"
+COMPRAR = "comprar"
+ESTADO = "estado"
+HORARIOS = "horarios"
+PREGUNTAS = "preguntas"
+CONTACTO = "contacto"
+CONFIGURACION = "configuracion"
+PROMOCIONES = "promociones"
+PAGAR = "pagar"
+ATRAS = "atras"
+CONFIRMAR = "confirmar"
+NEGAR = "negar"
+
+PALABRAS = {
+    VOLVER: [
+        "menu", "menú", "principal", "volver", "atrás", "atras",
+        "inicio", "home", "regresar", "back", "cancelar"
+    ],
+    COMPRAR: ["comprar"],
+    ESTADO: ["estado"],
+    HORARIOS: ["horarios"],
+    PREGUNTAS: ["preguntas"],
+    CONTACTO: ["contacto"],
+    CONFIGURACION: ["configuración", "configuracion"],
+    PROMOCIONES: ["promociones"],
+    PAGAR: ["pagar"],
+    ATRAS: ["atrás"],
+    CONFIRMAR: ["sí", "confirmar"],
+    NEGAR: ["no", "cancelar"],
+}
+
+# Orden de prioridad de las opciones del menú principal
+OPCIONES_MENU = (
+    COMPRAR, ESTADO, HORARIOS, PREGUNTAS, CONTACTO, CONFIGURACION, PROMOCIONES
+)
+
+_INTENCIONES_POR_PALABRA = {}
+for _intencion, _palabras in PALABRAS.items():
+    for _palabra in _palabras:
+        _INTENCIONES_POR_PALABRA.setdefault(_palabra, set()).add(_intencion)
+_INTENCIONES_POR_PALABRA = {p: frozenset(i) for p, i in _INTENCIONES_POR_PALABRA.items()}
+
+# Las palabras más largas primero. Ninguna contiene a otra; solo podrían
+# solaparse si vinieran pegadas sin espacio ("horariosí"), caso que se ignora.
+_PATRON = re.compile(
+    "|".join(re.escape(p) for p in sorted(_INTENCIONES_POR_PALABRA, key=len, reverse=True))
+)
+
+@lru_cache(maxsize=4096)
+def intenciones(texto):
+    """Conjunto de intenciones presentes en el texto"""
+    encontradas = frozenset()
+    for palabra in _PATRON.findall(texto.lower()):
+        encontradas |= _INTENCIONES_POR_PALABRA[palabra]
+    return encontradas
+
+# Palabras que pueden acompañar a las palabras clave en intenciones_estrictas
+_CONECTORES = frozenset(("a", "al", "el", "la", "de", "del", "quiero", "por", "favor"))
+_PALABRA = re.compile(r"\w+")
+
+@lru_cache(maxsize=4096)
+def intenciones_estrictas(texto):
+    """Intenciones del texto solo si no trae nada más que las palabras clave
+    (y emojis, signos o conectores): "🔙 Menú Principal" y "volver al menu"
+    sí, "Calle Principal #123" no"""
+    for palabra in _PALABRA.findall(_PATRON.sub(" ", texto.lower())):
+        if palabra not in _CONECTORES:
+            return frozenset()
+    return intenciones(texto)
+
+def intencion_menu(texto):
+    """Opción del menú principal pedida en el texto, o None"""
+    encontradas = intenciones(texto)
+    for opcion in OPCIONES_MENU:
+        if opcion in encontradas:
+            return opcion
+    return None
@@ -0,0 +1,180 @@
+import os
+import time
+
+from basedatos import obtener_base, transaccion
+from catalogo import obtener_catalogo
+
+# Inventario con reservas:
+# - al agregar al carrito se descuenta de `disponible` y se anota la reserva
+# - al confirmar el pedido la reserva se elimina (la venta queda hecha)
+# - al cancelar, o si la reserva vence, las unidades vuelven a `disponible`
+# Cada operación es una transacción SQLite (BEGIN IMMEDIATE), así que es
+# segura entre tareas asyncio y entre procesos que comparten la base.
+# El stock vivo está en la base (las ventas lo descuentan); el `stock` de
+# productos.json es el conteo que se carga a mano: cuando cambia para un
+# producto (al arrancar o al recargar el catálogo) pasa a ser su stock, menos
+# lo que esté reservado en carritos en ese momento. Reponer = editar el
+# archivo; si el número no cambió, reiniciar no toca lo vendido.
+RESERVA_TTL = float(os.getenv("RESERVA_TTL", 30 * 60))
+BARRIDO_INTERVALO = 60
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS inventario (
+    producto_id TEXT PRIMARY KEY,
+    disponible INTEGER NOT NULL CHECK (disponible >= 0),
+    catalogo INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS reservas (
+    user_id INTEGER NOT NULL,
+    producto_id TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    expira REAL NOT NULL,
+    PRIMARY KEY (user_id, producto_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_reservas_expira ON reservas (expira);
+"""
+
+SQL_DESCONTAR = "UPDATE inventario SET disponible = disponible - ? WHERE producto_id = ? AND disponible >= ?"
+SQL_DEVOLVER = "UPDATE inventario SET disponible = disponible + ? WHERE producto_id = ?"
+SQL_DISPONIBLE = "SELECT disponible FROM inventario WHERE producto_id = ?"
+SQL_RESERVAR = """
+INSERT INTO reservas (user_id, producto_id, cantidad, expira) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, producto_id)
+DO UPDATE SET cantidad = cantidad + excluded.cantidad, expira = excluded.expira
+"""
+SQL_RESERVAS_USUARIO = "SELECT producto_id, cantidad FROM reservas WHERE user_id = ?"
+SQL_BORRAR_RESERVAS = "DELETE FROM reservas WHERE user_id = ?"
+SQL_RENOVAR = "UPDATE reservas SET expira = ? WHERE user_id = ?"
+SQL_VENCIDAS = "SELECT user_id, producto_id, cantidad FROM reservas WHERE expira < ?"
+SQL_BORRAR_VENCIDAS = "DELETE FROM reservas WHERE expira < ?"
+# `catalogo` es el último stock del catálogo aplicado; NULL = fila anterior a
+# esta columna, se adopta el valor sin tocar lo disponible
+SQL_SEMBRAR = """
+INSERT INTO inventario (producto_id, disponible, catalogo) VALUES (?1, ?2, ?2)
+ON CONFLICT (producto_id) DO UPDATE SET
+    disponible = CASE WHEN catalogo IS NULL THEN disponible ELSE max(0, excluded.catalogo - (
+        SELECT COALESCE(SUM(cantidad), 0) FROM reservas WHERE reservas.producto_id = excluded.producto_id
+    )) END,
+    catalogo = excluded.catalogo
+WHERE catalogo IS NOT excluded.catalogo
+"""
+
+def _disponible(conexion, producto_id):
+    fila = conexion.execute(SQL_DISPONIBLE, (producto_id,)).fetchone()
+    return fila[0] if fila else 0
+
+def _reservar(conexion, user_id, producto_id, cantidad, expira):
+    with transaccion(conexion):
+        if conexion.execute(SQL_DESCONTAR, (cantidad, producto_id, cantidad)).rowcount == 0:
+            return False, _disponible(conexion, producto_id)
+        conexion.execute(SQL_RESERVAR, (user_id, producto_id, cantidad, expira))
+        # Renovar todo el carrito: sigue activo
+        conexion.execute(SQL_RENOVAR, (expira, user_id))
+        return True, _disponible(conexion, producto_id)
+
+def _devolver(conexion, reservas):
+    for producto_id, cantidad in reservas:
+        conexion.execute(SQL_DEVOLVER, (cantidad, producto_id))
+
+def _liberar(conexion, user_id):
+    with transaccion(conexion):
+        reservas = conexion.execute(SQL_RESERVAS_USUARIO, (user_id,)).fetchall()
+        _devolver(conexion, reservas)
+        conexion.execute(SQL_BORRAR_RESERVAS, (user_id,))
+        return reservas
+
+class StockInsuficiente(Exception):
+    pass
+
+def _confirmar(conexion, user_id, cantidades):
+    # Ajustar lo reservado a lo que realmente lleva el carrito (la reserva
+    # pudo vencer o el carrito cambiar); si algo ya no alcanza, no se vende nada.
+    try:
+        with transaccion(conexion):
+            reservadas = dict(conexion.execute(SQL_RESERVAS_USUARIO, (user_id,)).fetchall())
+            for producto_id in set(reservadas) | set(cantidades):
+                diferencia = cantidades.get(producto_id, 0) - reservadas.get(producto_id, 0)
+                if diferencia > 0:
+                    if conexion.execute(SQL_DESCONTAR, (diferencia, producto_id, diferencia)).rowcount == 0:
+                        raise StockInsuficiente(producto_id)
+                elif diferencia < 0:
+                    conexion.execute(SQL_DEVOLVER, (-diferencia, producto_id))
+            conexion.execute(SQL_BORRAR_RESERVAS, (user_id,))
+    except StockInsuficiente as e:
+        return e.args[0]
+    return None
+
+def _liberar_vencidas(conexion, ahora):
+    with transaccion(conexion):
+        vencidas = conexion.execute(SQL_VENCIDAS, (ahora,)).fetchall()
+        _devolver(conexion, [(p, c) for _, p, c in vencidas])
+        conexion.execute(SQL_BORRAR_VENCIDAS, (ahora,))
+        return sorted({u for u, _, _ in vencidas})
+
+def _sembrar(conexion, stock):
+    """Dar de alta productos nuevos y aplicar los stocks que cambiaron en el catálogo"""
+    with transaccion(conexion):
+        conexion.executemany(SQL_SEMBRAR, stock)
+
+def _migrar(conexion):
+    columnas = {c[1] for c in conexion.execute("PRAGMA table_info(inventario)")}
+    if "catalogo" not in columnas:
+        conexion.execute("ALTER TABLE inventario ADD COLUMN catalogo INTEGER")
+
+class Inventario:
+    def __init__(self, base=None, ttl=RESERVA_TTL):
+        self.base = base or obtener_base()
+        self.base.conexion.executescript(ESQUEMA)
+        _migrar(self.base.conexion)
+        self.ttl = ttl
+        self._ultimo_barrido = 0.0
+        self._sembrado = None
+
+    async def _preparar(self):
+        # Productos agregados o con otro stock en el catálogo (también tras una recarga)
+        productos = obtener_catalogo().productos
+        if productos is not self._sembrado:
+            stock = [(p["id"], p["stock"]) for p in productos.values()]
+            await self.base.ejecutar(_sembrar, stock)
+            self._sembrado = productos
+
+        ahora = time.time()
+        if ahora - self._ultimo_barrido >= BARRIDO_INTERVALO:
+            self._ultimo_barrido = ahora
+            await self.liberar_vencidas(ahora)
+
+    async def disponible(self, producto_id):
+        await self._preparar()
+        return await self.base.ejecutar(_disponible, producto_id)
+
+    async def reservar(self, user_id, producto_id, cantidad):
+        """Apartar unidades para el carrito; devuelve (reservado, disponible)"""
+        await self._preparar()
+        return await self.base.ejecutar(
+            _reservar, user_id, producto_id, cantidad, time.time() + self.ttl
+        )
+
+    async def confirmar(self, user_id, cantidades):
+        """Vender lo del carrito ({producto_id: cantidad}) usando lo reservado.
+
+        Devuelve None si todo se vendió o el producto_id que ya no alcanza
+        (en ese caso no se vende nada y la reserva queda como estaba).
+        """
+        await self._preparar()
+        return await self.base.ejecutar(_confirmar, user_id, cantidades)
+
+    async def liberar(self, user_id):
+        """Devolver al inventario todo lo reservado por el usuario"""
+        return await self.base.ejecutar(_liberar, user_id)
+
+    async def liberar_vencidas(self, ahora=None):
+        """Devolver reservas vencidas; devuelve los user_id afectados"""
+        return await self.base.ejecutar(_liberar_vencidas, ahora or time.time())
+
+_inventario = None
+
+def obtener_inventario():
+    global _inventario
+    if _inventario is None:
+        _inventario = Inventario()
+    return _inventario
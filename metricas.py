@@ -0,0 +1,133 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from telegram.request import HTTPXRequest
+
+# Instrumentación del bot en formato Prometheus (ruta /metrics):
+# - latencia de cada handler de la conversación, por estado
+# - transiciones entre estados y errores por estado
+# - duración de cada llamada al Bot API, por método
+# - updates frenados por el control de flood, por motivo
+# Todo en memoria del proceso; registrar una medición son un par de sumas y
+# una búsqueda binaria, sin locks (un solo event loop).
+
+# Límites de los buckets en segundos
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    __slots__ = ("conteos", "suma", "total")
+
+    def __init__(self):
+        self.conteos = [0] * (len(BUCKETS) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.conteos[bisect_left(BUCKETS, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self):
+        """Conteo por límite `le`, acumulado como lo espera Prometheus"""
+        acumulado = 0
+        for limite, conteo in zip(BUCKETS, self.conteos):
+            acumulado += conteo
+            yield limite, acumulado
+        yield "+Inf", self.total
+
+class Metricas:
+    def __init__(self):
+        self.handlers = {}      # (estado, handler) -> Histograma
+        self.transiciones = {}  # (desde, hacia) -> conteo
+        self.errores = {}       # estado -> conteo
+        self.bot_api = {}       # método -> Histograma
+        self.bot_api_errores = {}  # (método, código HTTP o "red") -> conteo
+        self.frenados = {}      # motivo -> updates frenados por antiflood.py
+
+    def histograma(self, tabla, clave):
+        histograma = tabla.get(clave)
+        if histograma is None:
+            histograma = tabla[clave] = Histograma()
+        return histograma
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus"""
+        lineas = []
+
+        def histogramas(nombre, ayuda, tabla, etiquetas):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} histogram")
+            for clave, histograma in tabla.items():
+                base = ",".join(f'{e}="{v}"' for e, v in zip(etiquetas, clave))
+                for limite, acumulado in histograma.acumulados():
+                    lineas.append(f'{nombre}_bucket{{{base},le="{limite}"}} {acumulado}')
+                lineas.append(f"{nombre}_sum{{{base}}} {histograma.suma}")
+                lineas.append(f"{nombre}_count{{{base}}} {histograma.total}")
+
+        def contadores(nombre, ayuda, tabla, etiquetas):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} counter")
+            for clave, conteo in tabla.items():
+                if not isinstance(clave, tuple):
+                    clave = (clave,)
+                base = ",".join(f'{e}="{v}"' for e, v in zip(etiquetas, clave))
+                lineas.append(f"{nombre}{{{base}}} {conteo}")
+
+        histogramas("aguas_handler_segundos", "Duración de los handlers de la conversación",
+                    self.handlers, ("estado", "handler"))
+        contadores("aguas_transiciones_total", "Cambios de estado de la conversación",
+                   self.transiciones, ("desde", "hacia"))
+        contadores("aguas_errores_total", "Excepciones en handlers, por estado",
+                   self.errores, ("estado",))
+        histogramas("aguas_bot_api_segundos", "Duración de las llamadas al Bot API",
+                    self.bot_api, ("metodo",))
+        contadores("aguas_bot_api_errores_total", "Respuestas no exitosas del Bot API",
+                   self.bot_api_errores, ("metodo", "codigo"))
+        contadores("aguas_updates_frenados_total", "Updates descartados por el control de flood",
+                   self.frenados, ("motivo",))
+        return "\n".join(lineas) + "\n"
+
+metricas = Metricas()
+
+# Content-Type de la ruta /metrics
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+def medir(callback, estado, nombres):
+    """Envolver un handler para medir su duración y las transiciones desde `estado`"""
+    desde = nombres.get(estado, str(estado))
+    histograma = metricas.histograma(metricas.handlers, (desde, callback.__name__))
+    transiciones = metricas.transiciones
+
+    @wraps(callback)
+    async def medido(update, context):
+        inicio = time.perf_counter()
+        try:
+            nuevo = await callback(update, context)
+        except Exception:
+            metricas.errores[desde] = metricas.errores.get(desde, 0) + 1
+            raise
+        finally:
+            histograma.observar(time.perf_counter() - inicio)
+        # None = se queda en el mismo estado
+        if nuevo is not None:
+            clave = (desde, nombres.get(nuevo, str(nuevo)))
+            transiciones[clave] = transiciones.get(clave, 0) + 1
+        return nuevo
+
+    return medido
+
+class PeticionMedida(HTTPXRequest):
+    """HTTPXRequest que registra la duración de cada llamada al Bot API"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        metodo = url.rsplit("/", 1)[-1]
+        inicio = time.perf_counter()
+        codigo = "red"
+        try:
+            codigo, cuerpo = await super().do_request(url, method, *args, **kwargs)
+            return codigo, cuerpo
+        finally:
+            metricas.histograma(metricas.bot_api, (metodo,)).observar(time.perf_counter() - inicio)
+            if codigo == "red" or codigo >= 400:
+                clave = (metodo, codigo)
+                metricas.bot_api_errores[clave] = metricas.bot_api_errores.get(clave, 0) + 1
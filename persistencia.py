@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict, defaultdict
+from telegram import Update
+from telegram.ext import BasePersistence, PersistenceInput, TypeHandler
+
+from basedatos import obtener_base, transaccion
+from carrito import Carrito
+
+# Persistencia del estado de conversación, context.user_data/chat_data y
+# carritos en la base local (basedatos.DB_PATH):
+# - un reinicio retoma la compra donde se quedó
+# - las escrituras se acumulan y se vuelcan juntas en una sola transacción
+# - con PERSISTENCIA_COMPARTIDA=1 cada update relee y vuelca su estado, de
+#   modo que varios workers/réplicas pueden atender al mismo usuario
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", 5))
+PERSISTENCIA_COMPARTIDA = os.getenv("PERSISTENCIA_COMPARTIDA", "0") == "1"
+# Carritos que se mantienen en memoria; el resto se lee de la base al usarse
+CARRITOS_EN_MEMORIA = int(os.getenv("SESIONES_EN_MEMORIA", 5000))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS datos_usuario (
+    user_id INTEGER PRIMARY KEY,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS datos_chat (
+    chat_id INTEGER PRIMARY KEY,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS datos_bot (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversaciones (
+    nombre TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    PRIMARY KEY (nombre, clave)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS carritos (
+    user_id INTEGER PRIMARY KEY,
+    datos TEXT NOT NULL,
+    actualizado REAL NOT NULL DEFAULT 0
+);
+"""
+
+# None como datos = borrar la fila; el carrito lleva además la hora de escritura
+SQL_ESCRITURA = {
+    "usuario": (
+        "INSERT OR REPLACE INTO datos_usuario (user_id, datos) VALUES (?, ?)",
+        "DELETE FROM datos_usuario WHERE user_id = ?",
+    ),
+    "chat": (
+        "INSERT OR REPLACE INTO datos_chat (chat_id, datos) VALUES (?, ?)",
+        "DELETE FROM datos_chat WHERE chat_id = ?",
+    ),
+    "bot": (
+        "INSERT OR REPLACE INTO datos_bot (id, datos) VALUES (?, ?)",
+        "DELETE FROM datos_bot WHERE id = ?",
+    ),
+    "carrito": (
+        "INSERT OR REPLACE INTO carritos (user_id, datos, actualizado) VALUES (?, ?, ?)",
+        "DELETE FROM carritos WHERE user_id = ?",
+    ),
+}
+SQL_CONVERSACION = "INSERT OR REPLACE INTO conversaciones (nombre, clave, estado) VALUES (?, ?, ?)"
+SQL_FIN_CONVERSACION = "DELETE FROM conversaciones WHERE nombre = ? AND clave = ?"
+
+def _escribir_lote(conexion, pendientes, conversaciones):
+    if not pendientes and not conversaciones:
+        return
+    ahora = time.time()
+    with transaccion(conexion):
+        for (tipo, clave), datos in pendientes.items():
+            guardar, borrar = SQL_ESCRITURA[tipo]
+            if datos is None:
+                conexion.execute(borrar, (clave,))
+            elif tipo == "carrito":
+                conexion.execute(guardar, (clave, datos, ahora))
+            else:
+                conexion.execute(guardar, (clave, datos))
+        for (nombre, clave), estado in conversaciones.items():
+            if estado is None:
+                conexion.execute(SQL_FIN_CONVERSACION, (nombre, clave))
+            else:
+                conexion.execute(SQL_CONVERSACION, (nombre, clave, estado))
+
+def _carritos_vencidos(conexion, limite):
+    with transaccion(conexion):
+        usuarios = [u for (u,) in conexion.execute(
+            "SELECT user_id FROM carritos WHERE actualizado < ?", (limite,)
+        )]
+        conexion.execute("DELETE FROM carritos WHERE actualizado < ?", (limite,))
+    return usuarios
+
+def _migrar(conexion):
+    columnas = {c[1] for c in conexion.execute("PRAGMA table_info(carritos)")}
+    if "actualizado" not in columnas:
+        conexion.execute("ALTER TABLE carritos ADD COLUMN actualizado REAL NOT NULL DEFAULT 0")
+
+def _leer_todo(conexion, sql, parametros=()):
+    return conexion.execute(sql, parametros).fetchall()
+
+def _leer_uno(conexion, sql, parametros):
+    fila = conexion.execute(sql, parametros).fetchone()
+    return fila[0] if fila else None
+
+class PersistenciaSQLite(BasePersistence):
+    def __init__(self, base=None, update_interval=PERSISTENCIA_INTERVALO, compartida=PERSISTENCIA_COMPARTIDA):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.base = base or obtener_base()
+        self.base.conexion.executescript(ESQUEMA)
+        _migrar(self.base.conexion)
+        self.compartida = compartida
+
+        # user_data/chat_data se cargan al primer uso, no todos al arrancar
+        self._residentes = {"usuario": set(), "chat": set()}
+
+        # Escrituras acumuladas hasta el próximo volcado
+        self._pendientes = {}         # (tipo, clave) -> JSON | None
+        self._conversaciones = {}     # (nombre, clave) -> JSON | None
+        self._escritura = None
+
+        self.carritos = AlmacenCarritos(self)
+
+    # --- Volcado agrupado ---
+    def programar_escritura(self):
+        """Agrupar en una sola transacción todo lo que llegue en esta vuelta del loop"""
+        if self._escritura is None:
+            self._escritura = asyncio.ensure_future(self._escribir_pronto())
+        return self._escritura
+
+    async def _escribir_pronto(self):
+        await asyncio.sleep(0)
+        self._escritura = None
+        await self.escribir()
+
+    async def escribir(self):
+        """Volcar lo pendiente (también espera a los volcados en curso)"""
+        pendientes, self._pendientes = self._pendientes, {}
+        conversaciones, self._conversaciones = self._conversaciones, {}
+        await self.base.ejecutar(_escribir_lote, pendientes, conversaciones)
+
+    def _pendiente(self, tipo, clave, datos):
+        self._pendientes[(tipo, clave)] = None if datos is None else json.dumps(datos)
+
+    def tiene_pendiente(self, tipo, clave):
+        return (tipo, clave) in self._pendientes
+
+    async def leer(self, tipo, clave):
+        tabla, columna = {
+            "usuario": ("datos_usuario", "user_id"),
+            "chat": ("datos_chat", "chat_id"),
+            "carrito": ("carritos", "user_id"),
+        }[tipo]
+        datos = await self.base.ejecutar(
+            _leer_uno, f"SELECT datos FROM {tabla} WHERE {columna} = ?", (clave,)
+        )
+        return None if datos is None else json.loads(datos)
+
+    # --- Lectura inicial ---
+    # user_data y chat_data arrancan vacíos y se completan en refresh_*_data
+    # la primera vez que el usuario escribe: la memoria depende de los
+    # usuarios activos, no de todos los que alguna vez usaron el bot.
+    async def get_user_data(self):
+        return defaultdict(dict)
+
+    async def get_chat_data(self):
+        return defaultdict(dict)
+
+    async def get_bot_data(self):
+        datos = await self.base.ejecutar(_leer_uno, "SELECT datos FROM datos_bot WHERE id = ?", (0,))
+        return json.loads(datos) if datos else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        filas = await self.base.ejecutar(
+            _leer_todo, "SELECT clave, estado FROM conversaciones WHERE nombre = ?", (name,)
+        )
+        return {tuple(json.loads(clave)): json.loads(estado) for clave, estado in filas}
+
+    async def leer_conversacion(self, nombre, clave):
+        estado = await self.base.ejecutar(
+            _leer_uno,
+            "SELECT estado FROM conversaciones WHERE nombre = ? AND clave = ?",
+            (nombre, json.dumps(list(clave))),
+        )
+        return None if estado is None else json.loads(estado)
+
+    # --- Escrituras (las llama la Application en cada update_persistence) ---
+    async def update_conversation(self, name, key, new_state):
+        estado = None if new_state is None else json.dumps(new_state)
+        self._conversaciones[(name, json.dumps(list(key)))] = estado
+        await self.programar_escritura()
+
+    async def update_user_data(self, user_id, data):
+        self._pendiente("usuario", user_id, data)
+        await self.programar_escritura()
+
+    async def update_chat_data(self, chat_id, data):
+        self._pendiente("chat", chat_id, data)
+        await self.programar_escritura()
+
+    async def update_bot_data(self, data):
+        self._pendiente("bot", 0, data)
+        await self.programar_escritura()
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._pendiente("usuario", user_id, None)
+        await self.programar_escritura()
+
+    async def drop_chat_data(self, chat_id):
+        self._pendiente("chat", chat_id, None)
+        await self.programar_escritura()
+
+    # --- Carga antes de cada update (siempre en modo compartido) ---
+    async def _refrescar(self, tipo, clave, datos_actuales):
+        residentes = self._residentes[tipo]
+        if self.tiene_pendiente(tipo, clave):
+            residentes.add(clave)
+            return
+        if self.compartida or clave not in residentes:
+            datos = await self.leer(tipo, clave)
+            datos_actuales.clear()
+            datos_actuales.update(datos or {})
+            residentes.add(clave)
+
+    async def refresh_user_data(self, user_id, user_data):
+        await self._refrescar("usuario", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        await self._refrescar("chat", chat_id, chat_data)
+
+    def desalojar(self, tipo, clave):
+        """Olvidar que `clave` está en memoria (se releerá al volver a usarse)"""
+        self._residentes[tipo].discard(clave)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        await self.escribir()
+
+class AlmacenCarritos:
+    """Carritos en memoria con escritura diferida a la base"""
+
+    def __init__(self, persistencia, maximo=CARRITOS_EN_MEMORIA):
+        self.persistencia = persistencia
+        self.maximo = maximo
+        self.carritos = OrderedDict()   # LRU: el menos usado primero
+
+    async def obtener(self, user_id):
+        p = self.persistencia
+        if user_id in self.carritos and (not p.compartida or p.tiene_pendiente("carrito", user_id)):
+            self.carritos.move_to_end(user_id)
+            return self.carritos[user_id]
+
+        pendiente = p._pendientes.get(("carrito", user_id))
+        if pendiente is not None:
+            datos = json.loads(pendiente)
+        else:
+            datos = await p.leer("carrito", user_id)
+        if datos is None:
+            return Carrito()
+        carrito = Carrito.desde_dict(datos)
+        self._recordar(user_id, carrito)
+        return carrito
+
+    def _recordar(self, user_id, carrito):
+        self.carritos[user_id] = carrito
+        self.carritos.move_to_end(user_id)
+        # Lo que sale de memoria ya está en la base o en la escritura pendiente
+        while len(self.carritos) > self.maximo:
+            self.carritos.popitem(last=False)
+
+    def desalojar(self, user_id):
+        self.carritos.pop(user_id, None)
+
+    async def vencidos(self, limite):
+        """Borrar los carritos sin cambios desde `limite` (epoch); devuelve sus user_id"""
+        await self.persistencia.escribir()
+        usuarios = await self.persistencia.base.ejecutar(_carritos_vencidos, limite)
+        for user_id in usuarios:
+            self.desalojar(user_id)
+        return usuarios
+
+    async def guardar(self, user_id, carrito):
+        self._recordar(user_id, carrito)
+        self.persistencia._pendiente("carrito", user_id, carrito.a_dict())
+        self.persistencia.programar_escritura()
+
+    async def limpiar(self, user_id):
+        await self.guardar(user_id, Carrito())
+
+# --- Modo compartido entre procesos ---
+def sincronizar_conversacion(application, conversacion, persistencia):
+    """Releer el estado de la conversación antes de cada update y volcarlo al
+    terminar, para que cualquier worker pueda continuar la compra.
+
+    No hace nada si la persistencia no es compartida.
+    """
+    if not persistencia.compartida:
+        return
+
+    async def cargar_estado(update: Update, context):
+        if not (update.effective_chat and update.effective_user):
+            return
+        clave = (update.effective_chat.id, update.effective_user.id)
+        estado = await persistencia.leer_conversacion(conversacion.name, clave)
+        estados = conversacion._conversations
+        if estado is None:
+            estados.data.pop(clave, None)
+        else:
+            estados.update_no_track({clave: estado})
+
+    async def volcar_estado(update: Update, context):
+        # La Application marca los datos de este update recién al terminar
+        # todos los grupos; lo adelantamos para volcarlos ya.
+        context.application.mark_data_for_update_persistence(
+            chat_ids=update.effective_chat.id if update.effective_chat else None,
+            user_ids=update.effective_user.id if update.effective_user else None,
+        )
+        await context.application.update_persistence()
+        await persistencia.escribir()
+
+    application.add_handler(TypeHandler(Update, cargar_estado), group=-1)
+    application.add_handler(TypeHandler(Update, volcar_estado), group=99)
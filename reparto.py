@@ -0,0 +1,331 @@
+import os
+import re
+import math
+import time
+import heapq
+import unicodedata
+from datetime import datetime
+from itertools import groupby
+
+from basedatos import obtener_base, transaccion
+
+# Reparto: de la dirección en texto libre a lotes por zona y una hora de
+# entrega estimada según la cola real, en vez de "2-3 horas" para todos.
+# - al confirmar, datos_envio se separa en nombre, dirección, colonia,
+#   código postal y teléfono (parsear_envio); la zona es el código postal o,
+#   si no hay, la colonia
+# - los pedidos sin lote se parten por zona en lotes de hasta
+#   REPARTO_CAPACIDAD, del más viejo al más nuevo; un lote puede salir
+#   lleno o cuando su primer pedido esperó REPARTO_ESPERA
+# - cada REPARTO_INTERVALO segundos (JobQueue) sale el lote listo con el
+#   pedido más viejo si alguno de los REPARTO_VEHICULOS está de vuelta antes
+#   de terminar de cargar (REPARTO_PREPARACION); si no, el lote sigue
+#   sumando pedidos de su zona, así con más demanda salen lotes más llenos
+# - un lote tarda REPARTO_TRAYECTO en llegar a la zona y REPARTO_PARADA por
+#   entrega; cada tick corre esa cuenta sobre todos los lotes que esperan y
+#   guarda la hora estimada de cada pedido; al confirmar se estima con lo
+#   que dejó el último tick, sin recorrer la cola
+REPARTO_INTERVALO = float(os.getenv("REPARTO_INTERVALO", 2 * 60))
+REPARTO_CAPACIDAD = int(os.getenv("REPARTO_CAPACIDAD", 15))
+REPARTO_ESPERA = float(os.getenv("REPARTO_ESPERA", 20 * 60))
+REPARTO_VEHICULOS = int(os.getenv("REPARTO_VEHICULOS", 3))
+REPARTO_PREPARACION = float(os.getenv("REPARTO_PREPARACION", 15 * 60))
+REPARTO_TRAYECTO = float(os.getenv("REPARTO_TRAYECTO", 20 * 60))
+REPARTO_PARADA = float(os.getenv("REPARTO_PARADA", 6 * 60))
+
+# Zona horaria de los clientes para la hora de entrega que ven (el
+# servidor puede estar en UTC); se carga con el primer pedido, no al arrancar
+REPARTO_ZONA_HORARIA = os.getenv("REPARTO_ZONA_HORARIA", "America/Mexico_City")
+
+# Lotes y entregas que ya volvieron se borran después de un día
+REPARTO_HISTORIA = 24 * 60 * 60
+
+SIN_ZONA = "sin zona"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entregas (
+    pedido_id TEXT PRIMARY KEY,
+    zona TEXT NOT NULL,
+    nombre TEXT,
+    direccion TEXT,
+    colonia TEXT,
+    codigo_postal TEXT,
+    telefono TEXT,
+    creada REAL NOT NULL,
+    lote INTEGER,
+    eta REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entregas_sin_lote ON entregas (zona, creada) WHERE lote IS NULL;
+CREATE INDEX IF NOT EXISTS idx_entregas_eta ON entregas (eta);
+CREATE TABLE IF NOT EXISTS lotes (
+    id INTEGER PRIMARY KEY,
+    zona TEXT NOT NULL,
+    pedidos INTEGER NOT NULL,
+    salida REAL NOT NULL,
+    regreso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lotes_regreso ON lotes (regreso);
+"""
+
+# --- Dirección ---
+
+_TELEFONO = re.compile(
+    r"(?:\b(?:tel[eé]fono|tel|cel(?:ular)?)\.?\s*:?\s*)?"
+    r"(?<!\d)(?:\+?52[ .-]?)?\(?\d{2,3}\)?[ .-]?\d{3,4}[ .-]?\d{4}(?!\d)",
+    re.IGNORECASE,
+)
+_CODIGO_POSTAL = re.compile(r"\bc\.?\s?p\.?\s*:?\s*(\d{5})\b", re.IGNORECASE)
+_CINCO_DIGITOS = re.compile(r"(?<![\d#-])\d{5}(?![\d-])")
+_COLONIA = re.compile(r"\bcol(?:onia|\.)?\s+([^\n,;#]+)", re.IGNORECASE)
+_FIN_COLONIA = re.compile(r"\s*(?:\bc\.?\s?p\.?\s*:?\s*\d.*|\d.*)$", re.IGNORECASE)
+_SEPARADORES = re.compile(r"\s*[,;\n]+\s*")
+
+def _sin_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+def parsear_envio(texto):
+    """Campos de los datos de envío escritos a mano ("Nombre\\nCalle 123, Col.
+    Centro, C.P. 78000\\n444-123-4567"); los que no aparecen quedan en None"""
+    telefono = None
+    encontrado = _TELEFONO.search(texto)
+    if encontrado:
+        telefono = re.sub(r"\D", "", encontrado.group())
+        texto = texto[:encontrado.start()] + texto[encontrado.end():]
+
+    # El marcado con "C.P."; si no, el último número de cinco cifras (el
+    # código postal va al final de la dirección, el número de casa antes)
+    codigo_postal = None
+    encontrado = _CODIGO_POSTAL.search(texto)
+    if encontrado:
+        codigo_postal = encontrado.group(1)
+    else:
+        sueltos = _CINCO_DIGITOS.findall(texto)
+        if sueltos:
+            codigo_postal = sueltos[-1]
+
+    colonia = None
+    encontrado = _COLONIA.search(texto)
+    if encontrado:
+        colonia = _FIN_COLONIA.sub("", encontrado.group(1)).strip(" .") or None
+
+    lineas = [l.strip() for l in texto.strip().splitlines() if l.strip(" -.,")]
+    nombre = None
+    # El nombre va primero y sin números
+    if len(lineas) > 1 and not any(c.isdigit() for c in lineas[0]):
+        nombre = lineas.pop(0)
+    direccion = _SEPARADORES.sub(", ", ", ".join(lineas)).strip(" ,") or None
+    return {
+        "nombre": nombre,
+        "direccion": direccion,
+        "colonia": colonia,
+        "codigo_postal": codigo_postal,
+        "telefono": telefono,
+    }
+
+def zona(envio):
+    """Código postal, o la colonia sin mayúsculas ni acentos"""
+    if envio["codigo_postal"]:
+        return envio["codigo_postal"]
+    if envio["colonia"]:
+        return "col " + " ".join(_sin_acentos(envio["colonia"]).lower().split())
+    return SIN_ZONA
+
+# --- Cola de reparto ---
+
+class Parametros:
+    """Capacidad y tiempos del reparto (ver arriba)"""
+
+    def __init__(self, capacidad=REPARTO_CAPACIDAD, espera=REPARTO_ESPERA, vehiculos=REPARTO_VEHICULOS,
+                 preparacion=REPARTO_PREPARACION, trayecto=REPARTO_TRAYECTO, parada=REPARTO_PARADA,
+                 intervalo=REPARTO_INTERVALO):
+        self.capacidad = capacidad
+        self.espera = espera
+        self.vehiculos = vehiculos
+        self.preparacion = preparacion
+        self.trayecto = trayecto
+        self.parada = parada
+        self.intervalo = intervalo
+
+    def duracion(self, paradas):
+        """Ida, entregas y vuelta de un lote"""
+        return 2 * self.trayecto + self.parada * paradas
+
+def _vehiculos(conexion, ahora, parametros):
+    """Cuándo queda libre cada vehículo (heap)"""
+    ocupados = [r for (r,) in conexion.execute(
+        "SELECT regreso FROM lotes WHERE regreso > ? ORDER BY regreso DESC LIMIT ?",
+        (ahora, parametros.vehiculos),
+    )]
+    libres = ocupados + [ahora] * (parametros.vehiculos - len(ocupados))
+    heapq.heapify(libres)
+    return libres
+
+def _lotes(conexion, ahora, parametros):
+    """Los pedidos sin lote partidos por zona en lotes de hasta `capacidad`,
+    en el orden en que saldrían: [(listo, lote)] donde `listo` es cuándo
+    puede salir (ya si está lleno, si no cuando su primer pedido cumple la
+    espera) y `lote` es [(zona, pedido_id, creada)] del más viejo al más nuevo"""
+    capacidad = parametros.capacidad
+    pendientes = conexion.execute(
+        "SELECT zona, pedido_id, creada FROM entregas WHERE lote IS NULL ORDER BY zona, creada"
+    ).fetchall()
+    lotes = []
+    for _, entregas in groupby(pendientes, key=lambda e: e[0]):
+        entregas = list(entregas)
+        for i in range(0, len(entregas), capacidad):
+            lote = entregas[i:i + capacidad]
+            listo = ahora if len(lote) == capacidad else max(ahora, lote[0][2] + parametros.espera)
+            lotes.append((listo, lote))
+    # Entre los que ya pueden salir, primero el del pedido más viejo
+    lotes.sort(key=lambda l: (l[0], l[1][0][2]))
+    return lotes
+
+def _salidas(lotes, libres, ahora, parametros):
+    """(lote, salida) de cada lote: toma el primer vehículo que se libere"""
+    for listo, lote in lotes:
+        if listo > ahora:
+            # Lo arma el tick siguiente a que esté listo
+            listo += parametros.intervalo
+        salida = max(heapq.heappop(libres), listo + parametros.preparacion)
+        heapq.heappush(libres, salida + parametros.duracion(len(lote)))
+        yield lote, salida
+
+def _eta_parada(salida, parada, parametros):
+    return salida + parametros.trayecto + parametros.parada * (parada + 1)
+
+def _cola(conexion, ahora, parametros, cola):
+    """Deja en `cola` cuándo queda libre cada vehículo después de todos los
+    lotes que esperan (heap)"""
+    libres = _vehiculos(conexion, ahora, parametros)
+    for _ in _salidas(_lotes(conexion, ahora, parametros), libres, ahora, parametros):
+        pass
+    cola[:] = libres
+
+def _registrar(conexion, pedido_id, envio, ahora, parametros, cola):
+    """Sin volver a recorrer todos los pendientes: el pedido se suma al último
+    lote de su zona si no está lleno (la hora estimada es la del pedido más
+    nuevo de ese lote más una parada) o abre uno que sale detrás de todos los
+    que esperan, con los vehículos de `cola`; el próximo tick recalcula todo"""
+    zona_pedido = zona(envio)
+    with transaccion(conexion):
+        if not cola:
+            _cola(conexion, ahora, parametros, cola)
+        (en_zona,) = conexion.execute(
+            "SELECT COUNT(*) FROM entregas WHERE lote IS NULL AND zona = ?", (zona_pedido,)
+        ).fetchone()
+        if en_zona % parametros.capacidad:
+            # El lote abierto es el del pedido más nuevo de la zona (los
+            # anteriores están llenos y salen antes)
+            (ultima,) = conexion.execute(
+                "SELECT eta FROM entregas WHERE lote IS NULL AND zona = ? ORDER BY creada DESC LIMIT 1",
+                (zona_pedido,),
+            ).fetchone()
+            eta = ultima + parametros.parada
+        else:
+            listo = ahora if parametros.capacidad == 1 else ahora + parametros.espera
+            salida = max(heapq.heappop(cola), listo + parametros.intervalo + parametros.preparacion)
+            heapq.heappush(cola, salida + parametros.duracion(1))
+            eta = _eta_parada(salida, 0, parametros)
+        conexion.execute(
+            "INSERT OR REPLACE INTO entregas (pedido_id, zona, nombre, direccion, colonia, codigo_postal, "
+            "telefono, creada, eta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (pedido_id, zona_pedido, envio["nombre"], envio["direccion"], envio["colonia"],
+             envio["codigo_postal"], envio["telefono"], ahora, eta),
+        )
+    return eta
+
+def _eta(conexion, pedido_id):
+    fila = conexion.execute("SELECT eta FROM entregas WHERE pedido_id = ?", (pedido_id,)).fetchone()
+    return fila[0] if fila else None
+
+def _agrupar(conexion, ahora, parametros, cola):
+    """Armar los lotes que salen ahora y volver a estimar los que esperan;
+    devuelve (lotes, pedidos) armados"""
+    with transaccion(conexion):
+        libres = _vehiculos(conexion, ahora, parametros)
+        armados = 0
+        etas = []
+        asignadas = []
+        for lote, salida in _salidas(_lotes(conexion, ahora, parametros), libres, ahora, parametros):
+            lote_id = None
+            # Sale ahora si está listo y hay un vehículo de vuelta antes de terminar de cargar;
+            # si no, sigue sumando pedidos de su zona hasta el próximo tick
+            if salida <= ahora + parametros.preparacion:
+                lote_id = conexion.execute(
+                    "INSERT INTO lotes (zona, pedidos, salida, regreso) VALUES (?, ?, ?, ?)",
+                    (lote[0][0], len(lote), salida, salida + parametros.duracion(len(lote))),
+                ).lastrowid
+                armados += 1
+            for parada, (_, pedido_id, _) in enumerate(lote):
+                eta = _eta_parada(salida, parada, parametros)
+                if lote_id is None:
+                    etas.append((eta, pedido_id))
+                else:
+                    asignadas.append((lote_id, eta, pedido_id))
+        conexion.executemany("UPDATE entregas SET lote = ?, eta = ? WHERE pedido_id = ?", asignadas)
+        conexion.executemany("UPDATE entregas SET eta = ? WHERE pedido_id = ?", etas)
+        cola[:] = libres
+
+        # Historia vieja
+        limite = ahora - REPARTO_HISTORIA
+        conexion.execute("DELETE FROM entregas WHERE lote IS NOT NULL AND eta < ?", (limite,))
+        conexion.execute("DELETE FROM lotes WHERE regreso < ?", (limite,))
+    return armados, len(asignadas)
+
+class Reparto:
+    def __init__(self, base=None, parametros=None):
+        self.base = base or obtener_base()
+        self.base.conexion.executescript(ESQUEMA)
+        self.parametros = parametros or Parametros()
+        # Vehículos libres después de los lotes que esperan; vacía hasta el primer uso
+        self.cola = []
+
+    async def registrar(self, pedido, ahora=None):
+        """Anotar el pedido en la cola de reparto; devuelve la hora estimada de entrega (epoch)"""
+        envio = parsear_envio(pedido.get("datos_envio") or "")
+        return await self.base.ejecutar(
+            _registrar, pedido["id"], envio, ahora or time.time(), self.parametros, self.cola
+        )
+
+    async def eta(self, pedido_id):
+        """Hora estimada de entrega, o None si el pedido no pasó por el reparto"""
+        return await self.base.ejecutar(_eta, pedido_id)
+
+    async def agrupar(self, ahora=None):
+        return await self.base.ejecutar(_agrupar, ahora or time.time(), self.parametros, self.cola)
+
+_zona_horaria = None
+
+def zona_horaria():
+    global _zona_horaria
+    if _zona_horaria is None:
+        from zoneinfo import ZoneInfo
+        _zona_horaria = ZoneInfo(REPARTO_ZONA_HORARIA)
+    return _zona_horaria
+
+def describir_eta(eta, ahora=None):
+    """'~45 min (hacia las 14:30)'"""
+    faltan = eta - (ahora or time.time())
+    if faltan <= 0:
+        return "en cualquier momento"
+    minutos = math.ceil(faltan / 60)
+    hora = datetime.fromtimestamp(eta, tz=zona_horaria()).strftime("%H:%M")
+    if minutos < 60:
+        return f"~{minutos} min (hacia las {hora})"
+    return f"~{minutos // 60} h {minutos % 60:02d} min (hacia las {hora})"
+
+_reparto = None
+
+def obtener_reparto():
+    global _reparto
+    if _reparto is None:
+        _reparto = Reparto()
+    return _reparto
+
+async def agrupar_lotes(context):
+    lotes, pedidos = await obtener_reparto().agrupar()
+    if lotes:
+        print(f"🚚 Reparto: {lotes} lotes nuevos con {pedidos} pedidos")
+
+def registrar_reparto(application):
+    application.job_queue.run_repeating(agrupar_lotes, interval=REPARTO_INTERVALO, first=REPARTO_INTERVALO)
@@ -0,0 +1,269 @@
+import os
+import asyncio
+from datetime import datetime
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from carrito import formato
+from estados_pedido import ADMIN_IDS
+from repositorio_pedidos import DESDE_SIEMPRE, HASTA_SIEMPRE, obtener_repositorio
+
+# Reporte de ventas y exportación de pedidos, por comando (/ventas,
+# /exportar, solo administradores) o por consola (python reportes.py):
+# - los pedidos se leen de a PEDIDOS_LOTE (RepositorioPedidos.recorrer) y
+#   cada lote se suma y se escribe antes de pedir el siguiente: la memoria
+#   depende de cuántos días, productos y métodos de pago hay, no de cuántos
+#   pedidos
+# - una sola pasada para todo: ingresos por día, unidades e ingresos por
+#   producto_id y mezcla de métodos de pago, y si se pide el archivo
+# - importes en centavos enteros (como el carrito): la suma de millones de
+#   pedidos no acumula error de redondeo
+# - el archivo tiene una fila por línea de pedido con columnas planas:
+#   .csv, .csv.gz o .parquet (con pyarrow instalado, un row group por lote)
+# - csv, gzip, tempfile y argparse se importan al usarse: el bot importa
+#   este módulo al arrancar y casi nunca exporta
+# - lo de cada producto es su subtotal menos el descuento de su promoción,
+#   así la suma por producto coincide con el total de los pedidos (los
+#   pedidos de antes de las promociones no traen descuento: 0)
+
+# Columnas del archivo exportado
+COLUMNAS = (
+    "pedido_id", "fecha", "user_id", "estado", "metodo_pago", "total_pedido",
+    "producto_id", "nombre", "cantidad", "precio_unitario", "subtotal", "descuento",
+)
+
+# Días que muestra /ventas (el archivo los tiene todos)
+DIAS_RESUMEN = 14
+PRODUCTOS_RESUMEN = 10
+
+class Ventas:
+    """Agregados de un recorrido de pedidos (importes en centavos)"""
+
+    def __init__(self, desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE):
+        self.desde = desde
+        self.hasta = hasta
+        self.pedidos = 0
+        self.ingresos = 0
+        self.por_dia = {}        # "AAAA-MM-DD" -> [pedidos, centavos]
+        self.por_producto = {}   # producto_id -> [unidades, centavos, nombre]
+        self.por_metodo = {}     # metodo_pago -> [pedidos, centavos]
+
+    def agregar(self, pedidos):
+        por_dia, por_producto, por_metodo = self.por_dia, self.por_producto, self.por_metodo
+        ingresos = 0
+        for pedido in pedidos:
+            centavos = round(pedido["total"] * 100)
+            ingresos += centavos
+
+            dia = pedido["fecha"][:10]
+            acumulado = por_dia.get(dia)
+            if acumulado is None:
+                acumulado = por_dia[dia] = [0, 0]
+            acumulado[0] += 1
+            acumulado[1] += centavos
+
+            metodo = pedido.get("metodo_pago") or "(sin método)"
+            acumulado = por_metodo.get(metodo)
+            if acumulado is None:
+                acumulado = por_metodo[metodo] = [0, 0]
+            acumulado[0] += 1
+            acumulado[1] += centavos
+
+            for linea in pedido["productos"]:
+                acumulado = por_producto.get(linea["producto_id"])
+                if acumulado is None:
+                    acumulado = por_producto[linea["producto_id"]] = [0, 0, linea["nombre"]]
+                acumulado[0] += linea["cantidad"]
+                acumulado[1] += round(linea["subtotal"] * 100) - round(linea.get("descuento", 0) * 100)
+        self.pedidos += len(pedidos)
+        self.ingresos += ingresos
+
+    def resumen(self):
+        """Texto para /ventas y la consola"""
+        desde = "…" if self.desde == DESDE_SIEMPRE else self.desde
+        hasta = "…" if self.hasta == HASTA_SIEMPRE else self.hasta
+        if not self.pedidos:
+            return f"📊 Sin pedidos entre {desde} y {hasta}"
+        lineas = [
+            f"📊 **VENTAS {desde} → {hasta}**",
+            f"🧾 Pedidos: {self.pedidos}",
+            f"💰 Ingresos: {formato(self.ingresos)}",
+            f"🎟️ Ticket promedio: {formato(self.ingresos // self.pedidos)}",
+            "",
+            f"📅 Por día (últimos {min(DIAS_RESUMEN, len(self.por_dia))}):",
+        ]
+        for dia in sorted(self.por_dia)[-DIAS_RESUMEN:]:
+            pedidos, centavos = self.por_dia[dia]
+            lineas.append(f"• {dia}: {pedidos} pedidos, {formato(centavos)}")
+
+        lineas += ["", "💧 Productos (unidades):"]
+        mas_vendidos = sorted(self.por_producto.items(), key=lambda p: p[1][0], reverse=True)
+        for producto_id, (unidades, centavos, nombre) in mas_vendidos[:PRODUCTOS_RESUMEN]:
+            lineas.append(f"• {nombre} (#{producto_id}): {unidades} u., {formato(centavos)}")
+
+        lineas += ["", "💳 Métodos de pago:"]
+        for metodo, (pedidos, centavos) in sorted(self.por_metodo.items(), key=lambda m: m[1][1], reverse=True):
+            lineas.append(f"• {metodo}: {pedidos} ({pedidos * 100 / self.pedidos:.1f}%), {formato(centavos)}")
+        return "\n".join(lineas)
+
+# --- Exportación ---
+
+def _filas(pedidos):
+    for pedido in pedidos:
+        inicio = (pedido["id"], pedido["fecha"], pedido["user_id"], pedido["estado"],
+                  pedido.get("metodo_pago"), pedido["total"])
+        for linea in pedido["productos"]:
+            yield inicio + (linea["producto_id"], linea["nombre"], linea["cantidad"],
+                            linea["precio_unitario"], linea["subtotal"], linea.get("descuento", 0.0))
+
+class EscritorCSV:
+    def __init__(self, ruta):
+        import csv
+        if ruta.endswith(".gz"):
+            import gzip
+            # Nivel 6: casi el mismo tamaño que 9 y bastante más rápido
+            self.archivo = gzip.open(ruta, "wt", compresslevel=6, newline="", encoding="utf-8")
+        else:
+            self.archivo = open(ruta, "w", newline="", encoding="utf-8")
+        self.csv = csv.writer(self.archivo)
+        self.csv.writerow(COLUMNAS)
+
+    def escribir(self, pedidos):
+        self.csv.writerows(_filas(pedidos))
+
+    def cerrar(self):
+        self.archivo.close()
+
+class EscritorParquet:
+    """Un row group por lote de pedidos (requiere pyarrow)"""
+
+    def __init__(self, ruta):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Para exportar a .parquet hay que instalar pyarrow") from None
+        self.pa = pyarrow
+        self.esquema = pyarrow.schema([
+            ("pedido_id", pyarrow.string()), ("fecha", pyarrow.string()),
+            ("user_id", pyarrow.int64()), ("estado", pyarrow.string()),
+            ("metodo_pago", pyarrow.string()), ("total_pedido", pyarrow.float64()),
+            ("producto_id", pyarrow.string()), ("nombre", pyarrow.string()),
+            ("cantidad", pyarrow.int64()), ("precio_unitario", pyarrow.float64()),
+            ("subtotal", pyarrow.float64()), ("descuento", pyarrow.float64()),
+        ])
+        self.escritor = pyarrow.parquet.ParquetWriter(ruta, self.esquema, compression="zstd")
+
+    def escribir(self, pedidos):
+        filas = list(_filas(pedidos))
+        if not filas:
+            return
+        columnas = [list(columna) for columna in zip(*filas)]
+        self.escritor.write_table(self.pa.Table.from_arrays(columnas, schema=self.esquema))
+
+    def cerrar(self):
+        self.escritor.close()
+
+def crear_escritor(ruta):
+    """Escritor según la extensión; ValueError si no es una conocida"""
+    if ruta.endswith((".csv", ".csv.gz")):
+        return EscritorCSV(ruta)
+    if ruta.endswith(".parquet"):
+        return EscritorParquet(ruta)
+    raise ValueError(f"Formato no soportado: {ruta} (.csv, .csv.gz o .parquet)")
+
+# --- Recorrido ---
+
+def _procesar(ventas, escritor, pedidos):
+    ventas.agregar(pedidos)
+    if escritor is not None:
+        escritor.escribir(pedidos)
+
+async def calcular_ventas(desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE, ruta=None, repositorio=None):
+    """Ventas del día `desde` al `hasta` y, si se da `ruta`, el archivo con sus pedidos.
+
+    Cada lote se suma y se escribe en un hilo aparte: el event loop sigue
+    atendiendo mensajes mientras tanto.
+    """
+    repositorio = repositorio or obtener_repositorio()
+    ventas = Ventas(desde, hasta)
+    escritor = crear_escritor(ruta) if ruta else None
+    try:
+        async for pedidos in repositorio.recorrer(desde, hasta):
+            await asyncio.to_thread(_procesar, ventas, escritor, pedidos)
+    finally:
+        if escritor is not None:
+            escritor.cerrar()
+    return ventas
+
+def validar_fecha(texto):
+    """AAAA-MM-DD; ValueError si no es una fecha válida"""
+    return datetime.strptime(texto, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+def _rango(args):
+    fechas = [validar_fecha(a) for a in args[:2]]
+    desde = fechas[0] if fechas else DESDE_SIEMPRE
+    hasta = fechas[1] if len(fechas) > 1 else HASTA_SIEMPRE
+    return desde, hasta
+
+# --- Comandos ---
+
+async def ventas(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/ventas [desde] [hasta]: resumen de ventas (solo administradores)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    try:
+        desde, hasta = _rango(context.args)
+    except ValueError:
+        await update.message.reply_text("Uso: /ventas [AAAA-MM-DD] [AAAA-MM-DD]")
+        return
+    await update.message.reply_text((await calcular_ventas(desde, hasta)).resumen())
+
+async def exportar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/exportar [desde] [hasta]: pedidos en un .csv.gz (solo administradores)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    try:
+        desde, hasta = _rango(context.args)
+    except ValueError:
+        await update.message.reply_text("Uso: /exportar [AAAA-MM-DD] [AAAA-MM-DD]")
+        return
+    import tempfile
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "pedidos.csv.gz")
+        resultado = await calcular_ventas(desde, hasta, ruta)
+        nombre = "pedidos.csv.gz" if desde == DESDE_SIEMPRE and hasta == HASTA_SIEMPRE \
+            else f"pedidos_{desde}_{hasta}.csv.gz"
+        with open(ruta, "rb") as archivo:
+            await update.message.reply_document(
+                archivo, filename=nombre, caption=f"📦 {resultado.pedidos} pedidos, {formato(resultado.ingresos)}"
+            )
+
+def registrar_reportes(application):
+    # block=False: recorrer los pedidos puede tardar y los updates se
+    # procesan de a uno; el resto de los usuarios no espera al reporte
+    application.add_handler(CommandHandler("ventas", ventas, block=False))
+    application.add_handler(CommandHandler("exportar", exportar, block=False))
+
+# --- Consola ---
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Reporte de ventas y exportación de pedidos")
+    parser.add_argument("--desde", type=validar_fecha, help="AAAA-MM-DD (inclusive)")
+    parser.add_argument("--hasta", type=validar_fecha, help="AAAA-MM-DD (inclusive)")
+    parser.add_argument("--exportar", metavar="ARCHIVO", help="pedidos.csv, .csv.gz o .parquet")
+    args = parser.parse_args()
+
+    try:
+        resultado = asyncio.run(calcular_ventas(
+            args.desde or DESDE_SIEMPRE, args.hasta or HASTA_SIEMPRE, args.exportar
+        ))
+    except ValueError as e:
+        parser.error(str(e))
+    print(resultado.resumen().replace("**", ""))
+    if args.exportar:
+        print(f"\n📦 {args.exportar}: {os.path.getsize(args.exportar) / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+from collections import OrderedDict
+
+from basedatos import obtener_base, transaccion
+
+# Almacenamiento de pedidos. El backend se elige con PEDIDOS_BACKEND:
+#   sqlite  (por defecto) -> archivo DB_PATH, persistente entre reinicios
+#   memoria              -> diccionario en el proceso (desarrollo)
+PEDIDOS_BACKEND = os.getenv("PEDIDOS_BACKEND", "sqlite")
+
+# Caché de lecturas por id (consultas de estado). PEDIDOS_CACHE=0 la desactiva.
+# El vencimiento acota cuánto puede tardar en verse un cambio hecho por otro
+# proceso; los cambios de este proceso se ven al instante.
+PEDIDOS_CACHE = int(os.getenv("PEDIDOS_CACHE", 10000))
+PEDIDOS_CACHE_TTL = float(os.getenv("PEDIDOS_CACHE_TTL", 30))
+
+# Pedidos por consulta al recorrer toda la tabla (reportes.py): cada lote es
+# una consulta aparte en el hilo de la base, así las del bot no esperan a que
+# termine el recorrido.
+PEDIDOS_LOTE = int(os.getenv("PEDIDOS_LOTE", 2000))
+
+# Fechas (AAAA-MM-DD, inclusive) que abarcan todos los pedidos
+DESDE_SIEMPRE = "0000-00-00"
+HASTA_SIEMPRE = "9999-99-99"
+
+class RepositorioPedidos:
+    """Interfaz común de los almacenes de pedidos"""
+
+    async def guardar(self, pedido):
+        raise NotImplementedError
+
+    async def guardar_lote(self, pedidos):
+        for pedido in pedidos:
+            await self.guardar(pedido)
+
+    async def obtener(self, pedido_id):
+        raise NotImplementedError
+
+    async def por_usuario(self, user_id, limite=10):
+        raise NotImplementedError
+
+    async def por_estado(self, estado, limite=100):
+        raise NotImplementedError
+
+    async def actualizar_estado(self, pedido_id, desde, hacia):
+        """Pasar el pedido de `desde` a `hacia`; False si ya no estaba en `desde`"""
+        raise NotImplementedError
+
+    def recorrer(self, desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE, lote=PEDIDOS_LOTE):
+        """Generador asíncrono con los pedidos del día `desde` al `hasta` en
+        listas de hasta `lote`, en orden de id; nunca hay más de un lote en memoria"""
+        raise NotImplementedError
+
+class RepositorioMemoria(RepositorioPedidos):
+    def __init__(self):
+        self.pedidos = {}
+
+    async def guardar(self, pedido):
+        self.pedidos[pedido["id"]] = pedido
+
+    async def obtener(self, pedido_id):
+        return self.pedidos.get(pedido_id)
+
+    async def por_usuario(self, user_id, limite=10):
+        encontrados = [p for p in self.pedidos.values() if p["user_id"] == user_id]
+        encontrados.sort(key=lambda p: p["fecha"], reverse=True)
+        return encontrados[:limite]
+
+    async def por_estado(self, estado, limite=100):
+        encontrados = [p for p in self.pedidos.values() if p["estado"] == estado]
+        encontrados.sort(key=lambda p: p["fecha"])
+        return encontrados[:limite]
+
+    async def actualizar_estado(self, pedido_id, desde, hacia):
+        pedido = self.pedidos.get(pedido_id)
+        if pedido is None or pedido["estado"] != desde:
+            return False
+        self.pedidos[pedido_id] = dict(pedido, estado=hacia)
+        return True
+
+    async def recorrer(self, desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE, lote=PEDIDOS_LOTE):
+        encontrados = []
+        for pedido_id in sorted(self.pedidos):
+            pedido = self.pedidos.get(pedido_id)
+            if pedido is None or not desde <= pedido["fecha"][:10] <= hasta:
+                continue
+            encontrados.append(pedido)
+            if len(encontrados) == lote:
+                yield encontrados
+                encontrados = []
+        if encontrados:
+            yield encontrados
+
+# --- SQLITE ---
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    estado TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    total REAL NOT NULL,
+    metodo_pago TEXT,
+    datos_envio TEXT,
+    tiempo_entrega TEXT,
+    productos TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_pedidos_usuario ON pedidos (user_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos (estado, fecha);
+"""
+
+COLUMNAS = (
+    "id", "user_id", "estado", "fecha", "total",
+    "metodo_pago", "datos_envio", "tiempo_entrega", "productos",
+)
+SELECT = f"SELECT {', '.join(COLUMNAS)} FROM pedidos"
+SQL_INSERTAR = f"INSERT OR REPLACE INTO pedidos ({', '.join(COLUMNAS)}) VALUES ({', '.join('?' * len(COLUMNAS))})"
+SQL_OBTENER = f"{SELECT} WHERE id = ?"
+SQL_POR_USUARIO = f"{SELECT} WHERE user_id = ? ORDER BY fecha DESC LIMIT ?"
+SQL_POR_ESTADO = f"{SELECT} WHERE estado = ? ORDER BY fecha LIMIT ?"
+SQL_ACTUALIZAR_ESTADO = "UPDATE pedidos SET estado = ? WHERE id = ? AND estado = ?"
+# Paginación por clave: cada lote sigue desde el último id del anterior
+SQL_RECORRER = f"{SELECT} WHERE id > ? AND substr(fecha, 1, 10) BETWEEN ? AND ? ORDER BY id LIMIT ?"
+
+def _a_fila(pedido):
+    return (
+        pedido["id"], pedido["user_id"], pedido["estado"], pedido["fecha"],
+        pedido["total"], pedido.get("metodo_pago"), pedido.get("datos_envio"),
+        pedido.get("tiempo_entrega"), json.dumps(pedido["productos"]),
+    )
+
+def _a_pedido(fila):
+    pedido = dict(zip(COLUMNAS, fila))
+    pedido["productos"] = json.loads(pedido["productos"])
+    return pedido
+
+def _insertar(conexion, filas):
+    with transaccion(conexion):
+        conexion.executemany(SQL_INSERTAR, filas)
+
+def _consultar(conexion, sql, parametros):
+    return [_a_pedido(f) for f in conexion.execute(sql, parametros)]
+
+def _actualizar_estado(conexion, pedido_id, desde, hacia):
+    with transaccion(conexion):
+        return conexion.execute(SQL_ACTUALIZAR_ESTADO, (hacia, pedido_id, desde)).rowcount == 1
+
+class RepositorioSQLite(RepositorioPedidos):
+    def __init__(self, base=None):
+        self.base = base or obtener_base()
+        self.base.conexion.executescript(ESQUEMA)
+
+    async def guardar(self, pedido):
+        await self.base.ejecutar(_insertar, [_a_fila(pedido)])
+
+    async def guardar_lote(self, pedidos):
+        await self.base.ejecutar(_insertar, [_a_fila(p) for p in pedidos])
+
+    async def obtener(self, pedido_id):
+        encontrados = await self.base.ejecutar(_consultar, SQL_OBTENER, (pedido_id,))
+        return encontrados[0] if encontrados else None
+
+    async def por_usuario(self, user_id, limite=10):
+        return await self.base.ejecutar(_consultar, SQL_POR_USUARIO, (user_id, limite))
+
+    async def por_estado(self, estado, limite=100):
+        return await self.base.ejecutar(_consultar, SQL_POR_ESTADO, (estado, limite))
+
+    async def actualizar_estado(self, pedido_id, desde, hacia):
+        return await self.base.ejecutar(_actualizar_estado, pedido_id, desde, hacia)
+
+    async def recorrer(self, desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE, lote=PEDIDOS_LOTE):
+        ultimo = ""
+        while True:
+            encontrados = await self.base.ejecutar(_consultar, SQL_RECORRER, (ultimo, desde, hasta, lote))
+            if encontrados:
+                yield encontrados
+            if len(encontrados) < lote:
+                return
+            ultimo = encontrados[-1]["id"]
+
+class RepositorioCacheado(RepositorioPedidos):
+    """Lecturas por id desde memoria (LRU con vencimiento) delante de otro repositorio.
+
+    Los pedidos devueltos son compartidos: no modificarlos.
+    """
+
+    def __init__(self, repositorio, maximo=PEDIDOS_CACHE, ttl=PEDIDOS_CACHE_TTL):
+        self.repositorio = repositorio
+        self.maximo = maximo
+        self.ttl = ttl
+        self._cache = OrderedDict()  # pedido_id -> (vence, pedido)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _recordar(self, pedido):
+        self._cache[pedido["id"]] = (time.monotonic() + self.ttl, pedido)
+        self._cache.move_to_end(pedido["id"])
+        if len(self._cache) > self.maximo:
+            self._cache.popitem(last=False)
+
+    async def guardar(self, pedido):
+        await self.repositorio.guardar(pedido)
+        self._recordar(pedido)
+
+    async def guardar_lote(self, pedidos):
+        await self.repositorio.guardar_lote(pedidos)
+        for pedido in pedidos:
+            self._cache.pop(pedido["id"], None)
+
+    async def obtener(self, pedido_id):
+        entrada = self._cache.get(pedido_id)
+        if entrada is not None and entrada[0] > time.monotonic():
+            self._cache.move_to_end(pedido_id)
+            self.aciertos += 1
+            return entrada[1]
+
+        self.fallos += 1
+        pedido = await self.repositorio.obtener(pedido_id)
+        if pedido is not None:
+            self._recordar(pedido)
+        return pedido
+
+    async def por_usuario(self, user_id, limite=10):
+        return await self.repositorio.por_usuario(user_id, limite)
+
+    async def por_estado(self, estado, limite=100):
+        return await self.repositorio.por_estado(estado, limite)
+
+    async def actualizar_estado(self, pedido_id, desde, hacia):
+        cambiado = await self.repositorio.actualizar_estado(pedido_id, desde, hacia)
+        self._cache.pop(pedido_id, None)
+        return cambiado
+
+    def recorrer(self, desde=DESDE_SIEMPRE, hasta=HASTA_SIEMPRE, lote=PEDIDOS_LOTE):
+        # Sin pasar por la caché: se leen todos una vez
+        return self.repositorio.recorrer(desde, hasta, lote)
+
+BACKENDS = {
+    "sqlite": RepositorioSQLite,
+    "memoria": RepositorioMemoria,
+}
+
+_repositorio = None
+
+def obtener_repositorio():
+    """Repositorio de pedidos configurado (se crea la primera vez)"""
+    global _repositorio
+    if _repositorio is None:
+        _repositorio = BACKENDS[PEDIDOS_BACKEND]()
+        if PEDIDOS_CACHE > 0:
+            _repositorio = RepositorioCacheado(_repositorio)
+    return _repositorio
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Respuesta directa en el webhook: Telegram acepta que la respuesta HTTP al
+# webhook sea una llamada al Bot API. Con WEBHOOK_RESPUESTA_DIRECTA=1 el
+# webhook espera a que se procese el update y devuelve ahí el primer
+# sendMessage, ahorrando una petición saliente por update.
+# - solo se captura el primer sendMessage sin archivos; si el handler hace
+#   otra llamada, lo capturado se envía antes por la vía normal (conserva
+#   el orden)
+# - el handler recibe un Message simulado (message_id 0): no se sabe si
+#   Telegram lo entregó
+# - si el update tarda más de RESPUESTA_DIRECTA_ESPERA, el webhook responde
+#   sin cuerpo y el mensaje sale por la vía normal
+WEBHOOK_RESPUESTA_DIRECTA = os.getenv("WEBHOOK_RESPUESTA_DIRECTA", "0") == "1"
+RESPUESTA_DIRECTA_ESPERA = float(os.getenv("RESPUESTA_DIRECTA_ESPERA", 10))
+
+_captura = ContextVar("captura_respuesta", default=None)
+
+def actual():
+    """Captura activa en el update que se está procesando, o None"""
+    return _captura.get()
+
+@contextmanager
+def capturando(captura):
+    token = _captura.set(captura)
+    try:
+        yield captura
+    finally:
+        _captura.reset(token)
+
+def _simulado(parametros):
+    mensaje = {
+        "message_id": 0,
+        "date": int(time.time()),
+        "chat": {"id": parametros.get("chat_id"), "type": "private"},
+        "text": parametros.get("text", ""),
+    }
+    return 200, json.dumps({"ok": True, "result": mensaje}).encode()
+
+class Captura:
+    """Primer sendMessage de un update, pendiente de ir en la respuesta del webhook"""
+
+    def __init__(self):
+        self.parametros = None
+        self.cerrada = False
+        self.abandonada = False
+        self.listo = asyncio.get_running_loop().create_future()
+        self._pendiente = None
+
+    async def enviar(self, enviar, url, method, request_data, kwargs):
+        """Llamado desde la capa de peticiones en vez de hacer el request"""
+        if (
+            not self.cerrada and self.parametros is None
+            and url.endswith("/sendMessage")
+            and request_data is not None and not request_data.contains_files
+        ):
+            self.parametros = request_data.parameters
+            self._pendiente = (enviar, url, method, request_data, kwargs)
+            return _simulado(self.parametros)
+
+        # Otra llamada en el mismo update: lo capturado sale primero
+        await self._soltar()
+        return await enviar(url, method, request_data, **kwargs)
+
+    async def _soltar(self):
+        self.cerrada = True
+        if self._pendiente is not None:
+            enviar, url, method, request_data, kwargs = self._pendiente
+            self._pendiente = None
+            self.parametros = None
+            await enviar(url, method, request_data, **kwargs)
+
+    async def terminar(self):
+        """Fin del update: lo capturado queda para el webhook (o se envía si ya no espera)"""
+        self.cerrada = True
+        try:
+            if self.abandonada:
+                await self._soltar()
+        except Exception as e:
+            print(f"Error enviando respuesta directa: {e!r}")
+        finally:
+            if not self.listo.done():
+                self.listo.set_result(None)
+
+    def abandonar(self):
+        """El webhook respondió sin esperar más: lo capturado se enviará normal"""
+        self.abandonada = True
+
+    def cuerpo(self):
+        """Cuerpo JSON para la respuesta del webhook, o None"""
+        if self.parametros is None:
+            return None
+        self._pendiente = None
+        return {"method": "sendMessage", **self.parametros}
+
+async def esperar(captura):
+    """Esperar el fin del update y devolver el cuerpo de la respuesta, o None"""
+    try:
+        await asyncio.wait_for(asyncio.shield(captura.listo), RESPUESTA_DIRECTA_ESPERA)
+    except asyncio.TimeoutError:
+        if not captura.listo.done():
+            captura.abandonar()
+            return None
+    return captura.cuerpo()
@@ -1,79 +1,140 @@
 import os
 import asyncio
 import threading
-from flask import Flask, request
-from telegram import Update
-from telegram.ext import (
-    Application, CommandHandler, MessageHandler,
-    ConversationHandler, filters
-)
 
 # Importa tus funciones del bot
-from bot import (
-    start, handle_menu, handle_seleccion_producto, handle_cantidad,
-    handle_datos_envio, handle_metodo_pago, handle_confirmacion,
-    handle_estado_pedido, handle_contacto, handle_configuracion,
-    cancel, error_handler, handle_pagar
-)
-
-# Estados de conversación
-(
-    MENU, COMPRA, SELECCION_PRODUCTO, CANTIDAD,
-    DATOS_ENVIO, METODO_PAGO, CONFIRMACION,
-    ESTADO_PEDIDO, CONTACTO, CONFIGURACION
-) = range(10)
+from bot import construir_aplicacion, registrar_handlers, iniciar_aplicacion
+from cola import ColaActualizaciones
+from idempotencia import obtener_vistos
+from antiflood import AVISO, GLOBAL, aviso, avisar, obtener_freno, revisar_entrante
+from metricas import metricas, TIPO_CONTENIDO
+import respuesta_directa
+from decodificador import decodificar
 
-# Flask app
-app = Flask(__name__)
 TOKEN = os.getenv("BOT_TOKEN")
 
 # Crea la aplicación de Telegram
-application = Application.builder().token(TOKEN).build()
-
-# ----- Handlers -----
-conv_handler = ConversationHandler(
-    entry_points=[CommandHandler("start", start)],
-    states={
-        MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu)],
-        SELECCION_PRODUCTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_seleccion_producto)],
-        CANTIDAD: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cantidad)],
-        DATOS_ENVIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_datos_envio)],
-        METODO_PAGO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_metodo_pago)],
-        CONFIRMACION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_confirmacion)],
-        ESTADO_PEDIDO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_estado_pedido)],
-        CONTACTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_contacto)],
-        CONFIGURACION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_configuracion)],
-    },
-    fallbacks=[CommandHandler("cancel", cancel)],
-)
-
-application.add_handler(conv_handler)
-application.add_handler(MessageHandler(filters.Regex(r"(?i)pagar"), handle_pagar))
-application.add_error_handler(error_handler)
+application = construir_aplicacion()
+
+# ----- Handlers (los mismos que en polling, ver bot.registrar_handlers) -----
+registrar_handlers(application)
+
+# Cola acotada entre el webhook y la Application
+cola = ColaActualizaciones(application)
+# update_id ya recibidos (reintentos de Telegram); se consultan en el loop,
+# no en los threads de Flask
+vistos = obtener_vistos()
+# Control de flood antes de encolar (ver antiflood.py)
+freno = obtener_freno()
 
 # ----- Loop global en thread -----
+# Arranca antes de cargar Flask: los updates que lleguen antes de que la
+# Application esté lista esperan en la cola
 loop = asyncio.new_event_loop()
 
 def run_loop():
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(application.initialize())
-    loop.run_until_complete(application.start())
+    loop.run_until_complete(iniciar_aplicacion(application))
+    loop.run_until_complete(cola.iniciar())
     loop.run_forever()
 
 threading.Thread(target=run_loop, daemon=True).start()
 
+# Flask se importa recién ahora: su carga (unos 100 ms de CPU) se solapa con
+# el getMe a Telegram que hace el thread
+from flask import Flask, request, jsonify  # noqa: E402
+
+# Flask app
+app = Flask(__name__)
+
 # ----- Rutas de Flask -----
 @app.route(f"/{TOKEN}", methods=["POST"])
 def webhook():
-    update = Update.de_json(request.get_json(force=True), application.bot)
-    asyncio.run_coroutine_threadsafe(application.process_update(update), loop)
+    try:
+        entrante = decodificar(request.get_data())
+    except ValueError:
+        return "JSON inválido", 400
+    if entrante is None:
+        # Un tipo de update que el bot no atiende: se confirma sin procesarlo
+        loop.call_soon_threadsafe(cola.descartar)
+        return "OK", 200
+
+    datos, chat_id, texto = entrante
+    if respuesta_directa.WEBHOOK_RESPUESTA_DIRECTA:
+        rechazo, cuerpo = asyncio.run_coroutine_threadsafe(
+            _procesar_directo(datos, chat_id, texto), loop
+        ).result()
+        if rechazo:
+            return rechazo, 503, {"Retry-After": "1"}
+        # El primer sendMessage va en la respuesta (ver respuesta_directa.py)
+        return jsonify(cuerpo) if cuerpo else ("OK", 200)
+    rechazo = asyncio.run_coroutine_threadsafe(_encolar(datos, chat_id, texto), loop).result()
+    if rechazo:
+        return rechazo, 503, {"Retry-After": "1"}
     return "OK", 200
 
+async def _repetido(datos):
+    """Reintento de Telegram de un update que ya está encolado o procesado"""
+    if await vistos.es_nuevo(datos["update_id"]):
+        return False
+    cola.repetida()
+    return True
+
+def _frenado(datos, texto):
+    """Motivo por el que el control de flood descarta el update, o None"""
+    if freno is None:
+        return None
+    return revisar_entrante(freno, datos, texto)
+
+async def _rechazar(datos, motivo):
+    """Que Telegram vuelva a entregar el update: devuelve el texto del 503"""
+    await vistos.descartar(datos["update_id"])
+    return motivo
+
+async def _encolar(datos, chat_id, texto):
+    """None si el update queda atendido; si no, el texto del 503"""
+    if await _repetido(datos):
+        return None
+    motivo = _frenado(datos, texto)
+    if motivo == GLOBAL:
+        return await _rechazar(datos, "Demasiados mensajes")
+    if motivo is not None:
+        if motivo == AVISO:
+            avisar(application.bot, chat_id)
+        return None
+    if cola.encolar(datos, chat_id=chat_id):
+        return None
+    return await _rechazar(datos, "Cola llena")
+
+async def _procesar_directo(datos, chat_id, texto):
+    """(texto del 503 o None, cuerpo de la respuesta directa o None)"""
+    if await _repetido(datos):
+        return None, None
+    motivo = _frenado(datos, texto)
+    if motivo == GLOBAL:
+        return await _rechazar(datos, "Demasiados mensajes"), None
+    if motivo is not None:
+        return None, aviso(chat_id) if motivo == AVISO else None
+    captura = respuesta_directa.Captura()
+    if not cola.encolar(datos, captura, chat_id):
+        return await _rechazar(datos, "Cola llena"), None
+    return None, await respuesta_directa.esperar(captura)
+
+@app.route("/cola", methods=["GET"])
+def estado_cola():
+    return jsonify(cola.metricas())
+
 @app.route("/", methods=["GET"])
 def index():
     return "Bot de Aguas de Lourdes corriendo en Render 🚀", 200
 
-# Arranque
+@app.route("/metrics", methods=["GET"])
+def exportar_metricas():
+    return metricas.exportar(), 200, {"Content-Type": TIPO_CONTENIDO}
+
+# Arranque. En Render conviene precompilar en el build: los .pyc que se
+# escriben al importar se pierden cada vez que el servicio se duerme
+#   pip install -r requirements.txt && python -m compileall -q .
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
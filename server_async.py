@@ -0,0 +1,133 @@
+import os
+import asyncio
+from tornado.web import Application as TornadoApp, RequestHandler
+from tornado.httpserver import HTTPServer
+
+# Importa tus funciones del bot
+from bot import construir_aplicacion, registrar_handlers, iniciar_aplicacion
+from cola import ColaActualizaciones
+from idempotencia import obtener_vistos
+from antiflood import AVISO, GLOBAL, aviso, avisar, obtener_freno, revisar_entrante
+from metricas import metricas, TIPO_CONTENIDO
+import respuesta_directa
+from decodificador import decodificar
+
+# Servidor webhook nativo: Tornado corre sobre el mismo event loop que la
+# Application, sin Flask ni thread intermedio.
+TOKEN = os.getenv("BOT_TOKEN")
+
+# Crea la aplicación de Telegram
+application = construir_aplicacion()
+
+# ----- Handlers (los mismos que en polling, ver bot.registrar_handlers) -----
+registrar_handlers(application)
+
+# Cola acotada entre el webhook y la Application
+cola = ColaActualizaciones(application)
+# update_id ya recibidos (reintentos de Telegram)
+vistos = obtener_vistos()
+# Control de flood antes de encolar (ver antiflood.py)
+freno = obtener_freno()
+
+# ----- Rutas -----
+class WebhookHandler(RequestHandler):
+    async def post(self):
+        try:
+            entrante = decodificar(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            self.write("JSON inválido")
+            return
+        if entrante is None:
+            # Un tipo de update que el bot no atiende: se confirma sin procesarlo
+            cola.descartar()
+            self.write("OK")
+            return
+
+        datos, chat_id, texto = entrante
+        if not await vistos.es_nuevo(datos["update_id"]):
+            # Reintento de Telegram de un update que ya está encolado o procesado
+            cola.repetida()
+            self.write("OK")
+            return
+        if freno is not None:
+            motivo = revisar_entrante(freno, datos, texto)
+            if motivo == GLOBAL:
+                # Tráfico legítimo: que Telegram lo vuelva a entregar
+                await self.rechazar(datos, "Demasiados mensajes")
+                return
+            if motivo is not None:
+                if motivo == AVISO:
+                    if respuesta_directa.WEBHOOK_RESPUESTA_DIRECTA:
+                        self.write(aviso(chat_id))
+                        return
+                    avisar(application.bot, chat_id)
+                self.write("OK")
+                return
+        captura = respuesta_directa.Captura() if respuesta_directa.WEBHOOK_RESPUESTA_DIRECTA else None
+        if not cola.encolar(datos, captura, chat_id):
+            await self.rechazar(datos, "Cola llena")
+            return
+        if captura is not None:
+            # El primer sendMessage va en la respuesta (ver respuesta_directa.py)
+            cuerpo = await respuesta_directa.esperar(captura)
+            if cuerpo:
+                self.write(cuerpo)
+                return
+        self.write("OK")
+
+    async def rechazar(self, datos, motivo):
+        """503 sin marcar el update como visto: Telegram lo vuelve a entregar"""
+        await vistos.descartar(datos["update_id"])
+        self.set_status(503)
+        self.set_header("Retry-After", "1")
+        self.write(motivo)
+
+class ColaHandler(RequestHandler):
+    def get(self):
+        self.write(cola.metricas())
+
+class IndexHandler(RequestHandler):
+    def get(self):
+        self.write("Bot de Aguas de Lourdes corriendo en Render 🚀")
+
+class MetricasHandler(RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", TIPO_CONTENIDO)
+        self.write(metricas.exportar())
+
+def crear_servidor():
+    return TornadoApp([
+        (f"/{TOKEN}", WebhookHandler),
+        (r"/", IndexHandler),
+        (r"/cola", ColaHandler),
+        (r"/metrics", MetricasHandler),
+    ])
+
+async def main():
+    port = int(os.environ.get("PORT", 5000))
+
+    # Escuchar antes de inicializar: en un arranque en frío el update que
+    # despertó al servicio se recibe y se encola mientras se hace el getMe,
+    # y se procesa apenas la Application está lista
+    server = HTTPServer(crear_servidor())
+    server.listen(port, address="0.0.0.0")
+    print(f"✅ Webhook escuchando en el puerto {port}")
+
+    await iniciar_aplicacion(application)
+    await cola.iniciar()
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        await cola.detener()
+        await application.stop()
+        await application.shutdown()
+
+# Arranque
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
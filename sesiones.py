@@ -0,0 +1,112 @@
+import os
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from basedatos import obtener_base, transaccion
+from inventario import obtener_inventario, RESERVA_TTL
+
+# Limpieza periódica (JobQueue) para que la memoria dependa de los usuarios
+# activos y no de todos los que alguna vez escribieron:
+# - carritos abandonados más de CARRITO_TTL: se borran y su stock se libera
+# - user_data de usuarios inactivos más de SESION_TTL: se borra
+# - si hay más de SESIONES_EN_MEMORIA usuarios residentes, los menos
+#   recientes se vuelcan a la base y salen de memoria (se releen al volver)
+SESION_TTL = float(os.getenv("SESION_TTL", 2 * 60 * 60))
+CARRITO_TTL = float(os.getenv("CARRITO_TTL", RESERVA_TTL))
+SESIONES_EN_MEMORIA = int(os.getenv("SESIONES_EN_MEMORIA", 5000))
+LIMPIEZA_INTERVALO = float(os.getenv("LIMPIEZA_INTERVALO", 5 * 60))
+
+# Todo usuario que escribió alguna vez; la limpieza no lo toca (de aquí salen
+# los destinatarios de las difusiones, ver difusion.py)
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    user_id INTEGER PRIMARY KEY,
+    desde REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+def _conocer(conexion, user_id, ahora):
+    with transaccion(conexion):
+        conexion.execute("INSERT OR IGNORE INTO usuarios (user_id, desde) VALUES (?, ?)", (user_id, ahora))
+
+class Sesiones:
+    """Última actividad de cada usuario, de la más antigua a la más reciente"""
+
+    def __init__(self):
+        self.actividad = OrderedDict()
+
+    def tocar(self, user_id, ahora=None):
+        self.actividad[user_id] = ahora or time.time()
+        self.actividad.move_to_end(user_id)
+
+    def olvidar(self, user_id):
+        self.actividad.pop(user_id, None)
+
+    def inactivos(self, limite):
+        """Usuarios sin actividad desde `limite` (epoch)"""
+        encontrados = []
+        for user_id, visto in self.actividad.items():
+            if visto >= limite:
+                break
+            encontrados.append(user_id)
+        return encontrados
+
+    def excedentes(self, maximo):
+        """Los usuarios menos recientes que sobran para quedar en `maximo`"""
+        sobran = len(self.actividad) - maximo
+        if sobran <= 0:
+            return []
+        return [user_id for user_id, _ in zip(self.actividad, range(sobran))]
+
+sesiones = Sesiones()
+
+async def registrar_actividad(update: Update, context):
+    if update.effective_user:
+        user_id = update.effective_user.id
+        # Solo al entrar a memoria (primer mensaje o de vuelta tras la
+        # limpieza), no en cada update
+        if user_id not in sesiones.actividad:
+            await obtener_base().ejecutar(_conocer, user_id, time.time())
+        sesiones.tocar(user_id)
+
+async def limpiar_sesiones(context):
+    app = context.application
+    persistencia = app.persistence
+    inventario = obtener_inventario()
+    ahora = time.time()
+
+    await inventario.liberar_vencidas(ahora)
+    for user_id in await persistencia.carritos.vencidos(ahora - CARRITO_TTL):
+        await inventario.liberar(user_id)
+
+    inactivos = sesiones.inactivos(ahora - SESION_TTL)
+    for user_id in inactivos:
+        app.drop_user_data(user_id)
+        persistencia.desalojar("usuario", user_id)
+        sesiones.olvidar(user_id)
+
+    excedentes = sesiones.excedentes(SESIONES_EN_MEMORIA)
+    if excedentes:
+        # Primero a la base, después fuera de memoria
+        await app.update_persistence()
+        await persistencia.escribir()
+        for user_id in excedentes:
+            # La Application no expone cómo soltar user_data sin borrarlo
+            # también de la persistencia
+            app._user_data.pop(user_id, None)
+            persistencia.desalojar("usuario", user_id)
+            persistencia.carritos.desalojar(user_id)
+            sesiones.olvidar(user_id)
+
+    if inactivos or excedentes:
+        print(f"🧹 Sesiones: {len(inactivos)} vencidas, {len(excedentes)} a la base, "
+              f"{len(sesiones.actividad)} en memoria")
+
+def registrar_limpieza(application):
+    obtener_base().conexion.executescript(ESQUEMA)
+    application.add_handler(TypeHandler(Update, registrar_actividad), group=-2)
+    application.job_queue.run_repeating(
+        limpiar_sesiones, interval=LIMPIEZA_INTERVALO, first=LIMPIEZA_INTERVALO
+    )
@@ -0,0 +1,45 @@
+import json
+from functools import wraps
+from telegram import ReplyKeyboardMarkup
+
+# Registro de teclados: cada teclado se construye y serializa una sola vez y
+# todos los handlers reutilizan el mismo objeto. Los objetos de Telegram son
+# inmutables, así que compartirlos es seguro.
+
+class TecladoCacheado(ReplyKeyboardMarkup):
+    """ReplyKeyboardMarkup que guarda su dict y su JSON ya calculados"""
+
+    __slots__ = ("_dict", "_json")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._dict = super().to_dict()
+            self._json = json.dumps(self._dict)
+
+    def to_dict(self, recursive=True):
+        return self._dict
+
+    def to_json(self):
+        return self._json
+
+_teclados = {}
+
+def cacheado(nombre):
+    """Decorador: la función construye el teclado solo la primera vez"""
+    def decorador(construir):
+        @wraps(construir)
+        def obtener():
+            teclado = _teclados.get(nombre)
+            if teclado is None:
+                teclado = _teclados[nombre] = construir()
+            return teclado
+        return obtener
+    return decorador
+
+def invalidar(nombre=None):
+    """Descartar un teclado (o todos) para que se reconstruya en el próximo uso"""
+    if nombre is None:
+        _teclados.clear()
+    else:
+        _teclados.pop(nombre, None)